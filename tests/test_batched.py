@@ -0,0 +1,32 @@
+import numpy as np
+from tetris_ai.envs import BatchedTetrisEnv, TetrisEnv
+
+
+def test_batched_env_steps_like_tetris_env():
+    nb_envs = 4
+    batched = BatchedTetrisEnv(nb_envs)
+    batched.seed(10)
+    batched.reset()
+    envs = [TetrisEnv() for _ in range(nb_envs)]
+    for i, env in enumerate(envs):
+        env.seed(10 + i)
+        env.reset()
+    rng = np.random.RandomState(0)
+    nb_episodes = 0
+    for _ in range(1500):
+        actions = rng.randint(len(TetrisEnv.ACTIONS), size=nb_envs)
+        observations, rewards, dones, info = batched.step(actions)
+        for i, (env, action) in enumerate(zip(envs, actions)):
+            observation, reward, done, _ = env.step(action)
+            assert rewards[i] == reward
+            assert dones[i] == done
+            if done:
+                terminal = info["terminal_observation"][
+                    list(np.flatnonzero(dones)).index(i)
+                ]
+                assert (terminal == observation).all()
+                env.reset()
+                nb_episodes += 1
+            else:
+                assert (observations[i] == observation).all()
+    assert nb_episodes > 0
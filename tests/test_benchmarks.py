@@ -0,0 +1,39 @@
+from tetris_ai.benchmarks.throughput import best_of, compare, load_state, record_states
+from tetris_ai.envs.tetris import ENGINES
+
+
+def test_best_of_keeps_the_best_run():
+    runs = [
+        {"a": {"ops_per_sec": 10.0, "peak_memory_kb": 50.0}},
+        {"a": {"ops_per_sec": 12.0, "peak_memory_kb": 70.0}},
+    ]
+    assert best_of(runs) == {"a": {"ops_per_sec": 12.0, "peak_memory_kb": 50.0}}
+
+
+def test_compare_flags_regressions_past_the_threshold():
+    baseline = {
+        "results": {
+            "slower": {"ops_per_sec": 100.0},
+            "noise": {"ops_per_sec": 100.0},
+            "bigger": {"ops_per_sec": 100.0, "peak_memory_kb": 100.0},
+            "gone": {"ops_per_sec": 100.0},
+        }
+    }
+    results = {
+        "slower": {"ops_per_sec": 80.0},
+        "noise": {"ops_per_sec": 95.0},
+        "bigger": {"ops_per_sec": 100.0, "peak_memory_kb": 150.0},
+    }
+    regressions = compare(results, baseline, 0.1)
+    assert [line.split(":")[0] for line in regressions] == ["slower", "bigger"]
+
+
+def test_recorded_states_load_in_every_engine():
+    states = record_states(20)
+    for engine in ENGINES.values():
+        game = engine(20, 10)
+        for state in states:
+            load_state(game, state)
+            field, _ = state
+            assert [[int(cell) for cell in row] for row in game.field] == field
+            assert not game.intersects()
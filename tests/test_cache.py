@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from tetris_ai.cache import LRUCache, board_hashes
+from tetris_ai.envs.tetris import TetrisEnv
+
+
+def test_least_recently_used_entry_goes_first():
+    cache = LRUCache(max_entries=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+    # reading "a" makes "b" the least recently used
+    assert cache.get("a") == "A"
+    cache.put("d", "D")
+    assert list(cache.entries) == ["c", "a", "d"]
+    assert cache.get("b") is None
+    # putting a key again counts as using it
+    cache.put("c", "C")
+    cache.put("e", "E")
+    assert list(cache.entries) == ["d", "c", "e"]
+    assert len(cache) == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 3)
+    assert stats["hit_rate"] == 0.5
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_board_hashes_match_the_game(engine):
+    env = TetrisEnv(engine=engine)
+    env.seed(0)
+    env.reset()
+    boards = []
+    hashes = []
+    rng = np.random.RandomState(0)
+    for _ in range(300):
+        _, _, done, _ = env.step(rng.randint(env.action_space.n))
+        if done:
+            break
+        boards.append(np.array(env.game.field))
+        hashes.append(env.game.board_hash)
+    assert (board_hashes(np.array(boards)) == np.array(hashes, dtype=np.uint64)).all()
+    assert len(set(hashes)) > 10
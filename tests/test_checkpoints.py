@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+from tetris_ai import checkpoints
+from tetris_ai.checkpoints import (
+    CheckpointWriter,
+    checkpoint_path,
+    latest_checkpoint,
+    list_checkpoints,
+    load_checkpoint,
+    save_checkpoint,
+)
+
+
+def arrays(step):
+    return {"weights": [np.full((2, 3), step, dtype=np.float32), np.arange(step)]}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "agent-000000010.npz")
+    save_checkpoint(path, arrays(10), {"step": 10})
+    loaded, meta = load_checkpoint(path)
+    assert meta == {"step": 10}
+    for value, expected in zip(loaded["weights"], arrays(10)["weights"]):
+        assert (value == expected).all() and value.dtype == expected.dtype
+
+
+@pytest.mark.parametrize("keep", [1, 2, 3])
+def test_writer_keeps_the_newest(tmp_path, keep):
+    writer = CheckpointWriter(str(tmp_path), "agent", keep)
+    for step in range(10, 60, 10):
+        writer.save(step, arrays(step))
+    writer.wait()
+    writer.close()
+    steps = [step for step, _ in list_checkpoints(str(tmp_path), "agent")]
+    assert steps == list(range(10, 60, 10))[-keep:]
+    _, meta = latest_checkpoint(str(tmp_path), "agent")
+    assert meta["step"] == 50
+
+
+def test_nothing_kept_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        CheckpointWriter(str(tmp_path), "agent", keep=0)
+
+
+def test_interrupted_write_leaves_no_checkpoint(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    save_checkpoint(checkpoint_path(directory, "agent", 10), arrays(10), {"step": 10})
+
+    def savez(output, **payload):
+        output.write(b"PK\x03\x04 half a zip")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(checkpoints.np, "savez", savez)
+    with pytest.raises(KeyboardInterrupt):
+        save_checkpoint(checkpoint_path(directory, "agent", 20), arrays(20), {})
+    assert os.listdir(directory) == ["agent-000000010.npz"]
+    _, meta = latest_checkpoint(directory, "agent")
+    assert meta["step"] == 10
+
+
+def test_unreadable_checkpoint_is_skipped(tmp_path):
+    directory = str(tmp_path)
+    save_checkpoint(checkpoint_path(directory, "agent", 10), arrays(10), {"step": 10})
+    with open(checkpoint_path(directory, "agent", 20), "wb") as output:
+        output.write(b"not a zip")
+    _, meta = latest_checkpoint(directory, "agent")
+    assert meta["step"] == 10
+    assert latest_checkpoint(directory, "other") is None
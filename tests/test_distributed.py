@@ -0,0 +1,71 @@
+import time
+import numpy as np
+from tetris_ai.distributed import ActorClient, LearnerServer
+from tetris_ai.metrics import metrics
+
+SHAPE = (20, 10)
+
+
+def episode(rng, nb_steps):
+    observations = rng.randint(0, 2, (nb_steps + 1,) + SHAPE)
+    actions = rng.randint(0, 8, nb_steps)
+    rewards = rng.uniform(-1, 1, nb_steps).astype(np.float32)
+    return observations, actions, rewards
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+
+def test_loopback():
+    server = LearnerServer(SHAPE)
+    weights = [np.arange(6, dtype=np.float32).reshape(2, 3), np.ones(3)]
+    server.broadcast_weights(weights, 7)
+    client = ActorClient(server.address, actor_id=3, batch_frames=8)
+    received, version = client.latest_weights(wait=True)
+    assert version == 7
+    assert all((a == b).all() for a, b in zip(received, weights))
+
+    rng = np.random.RandomState(0)
+    observations, actions, rewards = episode(rng, 20)
+    for i in range(20):
+        client.append(observations[i], actions[i], rewards[i], i == 19)
+    client.end_episode(observations[20])
+    client.flush()
+    episodes = []
+    while not episodes:
+        actor_id, batch = server.receive(timeout=5.0)
+        assert actor_id == 3
+        episodes.extend(batch)
+    ((transitions, terminal),) = episodes
+    assert len(transitions) == 20
+    for i, (observation, action, reward, done) in enumerate(transitions):
+        assert (observation == observations[i]).all()
+        assert (action, done) == (actions[i], i == 19)
+        assert reward == rewards[i]
+    assert (terminal == observations[20]).all()
+
+    readers = list(server.readers)
+    server.close()
+    assert not server.thread.is_alive()
+    assert server.listener.fileno() == -1
+    for connection, reader in readers:
+        assert not reader.is_alive()
+        assert connection.sock.fileno() == -1
+
+    # the actor hears the learner stopped, what it still plays is dropped
+    wait_for(client.stopped.is_set)
+    metrics.drain()
+    for i in range(5):
+        client.append(observations[i], actions[i], rewards[i], False)
+    client.close()
+    assert client.dropped == 5
+    dropped = [
+        record
+        for record in metrics.drain()
+        if record["component"] == "distributed" and record["name"] == "frames_dropped"
+    ]
+    assert len(dropped) == 1 and dropped[0]["fields"]["frames"] == 5
@@ -0,0 +1,147 @@
+import random
+import pytest
+from tetris_ai.bitboard_game import BitboardTetris
+from tetris_ai.game import (
+    FIGURES,
+    GEOMETRY,
+    ActionApplier,
+    Actions,
+    Figure,
+    Tetris,
+    row_features,
+)
+from tetris_ai.numpy_game import NumpyTetris
+
+ENGINES = [NumpyTetris, BitboardTetris]
+MOVES = [Actions.ROTATE, Actions.LEFT, Actions.RIGHT, Actions.DOWN, Actions.SPACE]
+
+
+def load(game, field):
+    if hasattr(game, "load_field"):
+        game.load_field(field)
+    else:
+        for i, row in enumerate(field):
+            for j, cell in enumerate(row):
+                game.field[i][j] = cell
+
+
+def garbage(seed, height=20, width=10, rows=8):
+    """Board with `rows` bottom rows full but for a hole"""
+    rng = random.Random(seed)
+    field = [[0] * width for _ in range(height)]
+    for i in range(height - rows, height):
+        gap = rng.randrange(width)
+        field[i] = [0 if j == gap else rng.randint(1, 6) for j in range(width)]
+    return field
+
+
+def state(game):
+    figure = game.figure
+    if figure is not None:
+        figure = (figure.type, figure.rotation, figure.x, figure.y, figure.color)
+    field = [[int(cell) for cell in row] for row in game.field]
+    return game.score, game.state, figure, field
+
+
+def play(engine, seed, nb_steps=2000):
+    """States of a game with random moves, hard drops included, the way
+    TetrisEnv steps it
+    """
+    # the figures are drawn from the random module
+    random.seed(seed)
+    game = engine(20, 10)
+    load(game, garbage(seed))
+    applier = ActionApplier()
+    rng = random.Random(seed)
+    states = []
+    for _ in range(nb_steps):
+        if game.figure is None:
+            game.new_figure()
+        game.go_down()
+        if game.is_done():
+            # moving the figure stuck over the board is nothing to compare
+            break
+        applier.apply_actions([rng.choice(MOVES)], game)
+        states.append(state(game))
+        if game.is_done():
+            break
+    return states
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", range(20))
+def test_engine_plays_like_tetris(engine, seed):
+    assert play(engine, seed) == play(Tetris, seed)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_break_lines_like_tetris(engine):
+    rng = random.Random(0)
+    for _ in range(200):
+        field = [
+            [rng.randint(1, 6) if full or rng.random() < 0.5 else 0 for _ in range(10)]
+            for full in (rng.random() < 0.3 for _ in range(20))
+        ]
+        reference = Tetris(20, 10)
+        load(reference, field)
+        game = engine(20, 10)
+        load(game, field)
+        reference.break_lines()
+        game.break_lines()
+        assert state(game)[0::3] == state(reference)[0::3]
+
+
+@pytest.mark.parametrize("engine", [Tetris] + ENGINES)
+@pytest.mark.parametrize("seed", range(5))
+def test_row_features_follow_the_board(engine, seed):
+    random.seed(seed)
+    game = engine(20, 10)
+    load(game, garbage(seed))
+    game._update_rows(range(game.height))
+    rng = random.Random(seed)
+    while not game.is_done():
+        if game.figure is None:
+            game.new_figure()
+        game.go_down()
+        if not game.is_done():
+            ActionApplier().apply_actions([rng.choice(MOVES)], game)
+        field = [[int(cell) for cell in row] for row in game.field]
+        features = [row_features(row) for row in field]
+        assert game.row_counts == [count for count, _ in features]
+        assert game.row_segments == [segment for _, segment in features]
+        assert game.upper_tier_occupied == sum(game.row_counts[:7])
+        assert game.lower_tier_occupied == sum(game.row_counts[14:])
+
+
+def test_geometry_is_the_figure_images():
+    for figure_type, rotations in enumerate(FIGURES):
+        for rotation, image in enumerate(rotations):
+            figure = Figure(3, 0, figure_type, 1)
+            figure.rotation = rotation
+            cells = set(figure.cells())
+            assert cells == {(p // 4, p % 4) for p in image}
+            geometry = GEOMETRY[figure_type][rotation]
+            for dx, bottom in geometry.bottoms:
+                assert bottom == max(dy for dy, x in cells if x == dx)
+
+
+@pytest.mark.parametrize("engine", [Tetris] + ENGINES)
+@pytest.mark.parametrize("seed", range(5))
+def test_drop_distance_is_stepping_down(engine, seed):
+    rng = random.Random(seed)
+    game = engine(20, 10)
+    for _ in range(200):
+        load(game, garbage(rng.randrange(1000), rows=rng.randrange(4, 14)))
+        game.new_figure()
+        figure = game.figure
+        figure.rotation = rng.randrange(len(FIGURES[figure.type]))
+        if game.intersects():
+            continue
+        distance = 0
+        while True:
+            figure.y += 1
+            if game.intersects():
+                break
+            distance += 1
+        figure.y -= distance + 1
+        assert game.drop_distance() == distance
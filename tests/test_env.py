@@ -0,0 +1,71 @@
+import random
+import numpy as np
+import pytest
+from tetris_ai.envs.tetris import TetrisEnv
+
+
+def observations(engine, observation_mode, nb_steps=300):
+    """Copies of the observations of a seeded game and its boards"""
+    env = TetrisEnv(engine=engine, observation_mode=observation_mode)
+    env.seed(0)
+    steps = [(env.reset().copy(), np.array(env.game.field) != 0)]
+    rng = random.Random(1)
+    for _ in range(nb_steps):
+        observation, _, done, _ = env.step(rng.randrange(env.action_space.n))
+        steps.append((observation.copy(), np.array(env.game.field) != 0))
+        if done:
+            break
+    return steps
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_observation_modes(engine):
+    boards = observations(engine, "board")
+    planes = observations(engine, "planes")
+    merged = observations(engine, "merged")
+    assert len(boards) == len(planes) == len(merged)
+    for i, ((board, field), (plane, _), (merge, _)) in enumerate(
+        zip(boards, planes, merged)
+    ):
+        assert board.shape == (20, 10) and plane.shape == (2, 20, 10)
+        assert (board == field).all()
+        assert (plane[0] == field).all()
+        # the falling figure, once there is one, never overlaps the board
+        # until the game is over
+        assert plane[1].sum() in (0, 4)
+        if i < len(planes) - 1:
+            assert not (plane[0] & plane[1]).any()
+        assert (merge == plane[0] | plane[1]).all()
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+@pytest.mark.parametrize("action_mode,action_repeat", [("move", 3), ("lock", 1)])
+def test_repeated_moves_add_up_single_steps(engine, action_mode, action_repeat):
+    repeated = TetrisEnv(
+        engine=engine, action_mode=action_mode, action_repeat=action_repeat
+    )
+    single = TetrisEnv(engine=engine)
+    for env in (repeated, single):
+        env.seed(2)
+        env.reset()
+    rng = random.Random(3)
+    for _ in range(100):
+        action = rng.randrange(repeated.action_space.n)
+        observation, reward, done, _ = repeated.step(action)
+        total = 0.0
+        for tick in range(1, 1000):
+            figure = single.game.figure
+            expected, tick_reward, expected_done, _ = single.step(action)
+            total += tick_reward
+            if expected_done:
+                break
+            if action_mode == "lock":
+                if figure is not None and single.game.figure is not figure:
+                    break
+            elif tick == action_repeat:
+                break
+        assert (observation == expected).all()
+        assert reward == pytest.approx(total)
+        assert done == expected_done
+        if done:
+            break
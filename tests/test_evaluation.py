@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from tetris_ai.evaluation import STATS, bootstrap_mean, evaluate, summarize
+from tests.test_inference import Model, server
+
+
+def run(nb_clients, rows_per_client, nb_episodes=6, **kwargs):
+    inference = server(Model(), nb_clients, rows_per_client=rows_per_client)
+    try:
+        stats, _ = evaluate(inference, nb_episodes, seed=5, **kwargs)
+    finally:
+        inference.close()
+    return stats
+
+
+def test_episodes_do_not_depend_on_the_workers():
+    stats = run(1, 1)
+    assert len(stats["length"]) == 6 and not stats["truncated"].any()
+    spread = run(3, 2)
+    for name in STATS + ("truncated",):
+        assert (stats[name] == spread[name]).all()
+
+
+def test_long_games_are_cut_short():
+    stats = run(2, 2, nb_episodes=4, max_steps=5)
+    assert (stats["length"] == 5).all() and stats["truncated"].all()
+
+
+def test_worker_errors_are_raised():
+    with pytest.raises(RuntimeError, match="unknown action mode"):
+        run(2, 1, env_kwargs={"action_mode": "nope"})
+
+
+def test_summary():
+    rng = np.random.default_rng(0)
+    values = rng.normal(10.0, 1.0, 400)
+    low, high = bootstrap_mean(values)
+    assert low < values.mean() < high and high - low < 0.5
+    summary = summarize(values + 1.0, baseline=values)
+    assert summary["delta"] == pytest.approx(1.0)
+    assert summary["delta_ci_low"] == pytest.approx(1.0)
+    assert summary["p50"] == pytest.approx(np.median(values) + 1.0)
@@ -0,0 +1,49 @@
+import gym
+import numpy as np
+import pytest
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.frames import FrameRenderer, VideoWriter, read_video
+
+
+def test_frame_shape_and_dtype():
+    env = TetrisEnv()
+    env.seed(0)
+    env.reset()
+    frame = env.render(mode="rgb_array")
+    assert frame.shape == (20 * 20, 10 * 20, 3) and frame.dtype == np.uint8
+    frame = FrameRenderer(20, 10, zoom=5).render(env.game)
+    assert frame.shape == (100, 50, 3) and frame.dtype == np.uint8
+
+
+def test_render_before_reset():
+    with pytest.raises(gym.error.ResetNeeded):
+        TetrisEnv().render(mode="rgb_array")
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_frames_follow_the_game(engine):
+    env = TetrisEnv(engine=engine)
+    env.seed(1)
+    env.reset()
+    rng = np.random.RandomState(1)
+    for _ in range(300):
+        frame = env.render(mode="rgb_array")
+        # a fresh renderer draws the whole board
+        assert (frame == FrameRenderer(20, 10).render(env.game)).all()
+        _, _, done, _ = env.step(rng.randint(env.action_space.n))
+        if done:
+            env.reset()
+
+
+def test_video_round_trip(tmp_path):
+    rng = np.random.RandomState(0)
+    frames = rng.randint(0, 256, (12, 8, 6, 3)).astype(np.uint8)
+    writer = VideoWriter(tmp_path / "video.gz", frames.shape[1:], fps=10)
+    for frame in frames:
+        writer.write(frame)
+    with pytest.raises(ValueError):
+        writer.write(frames[0, :4])
+    writer.close()
+    read, fps = read_video(tmp_path / "video.gz")
+    assert fps == 10 and writer.nb_frames == len(frames)
+    assert (read == frames).all()
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+
+
+def test_game_and_env_run_without_pygame():
+    code = (
+        "import sys\n"
+        "from tetris_ai.envs.tetris import TetrisEnv\n"
+        "env = TetrisEnv()\n"
+        "env.reset()\n"
+        "for _ in range(100):\n"
+        "    env.step(0)\n"
+        "env.close()\n"
+        "assert 'pygame' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
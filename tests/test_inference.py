@@ -0,0 +1,71 @@
+import threading
+import numpy as np
+import pytest
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.inference import InferenceServer, run_actors
+
+ENV = TetrisEnv()
+OBSERVATION_SHAPE = ENV.observation_space.shape
+NB_ACTIONS = ENV.action_space.n
+
+
+class Model(object):
+    """Q-values favouring one action, remembering the batch sizes"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, observations):
+        self.batch_sizes.append(len(observations))
+        q_values = np.zeros((len(observations), NB_ACTIONS), dtype=np.float32)
+        q_values[:, 3] = observations.reshape(len(observations), -1).sum(axis=1)
+        return q_values
+
+
+def server(model, nb_clients, **kwargs):
+    return InferenceServer(
+        model, OBSERVATION_SHAPE, NB_ACTIONS, nb_clients, **kwargs
+    ).start()
+
+
+def test_batches_hold_at_most_max_batch_size_rows():
+    model = Model()
+    inference = server(model, 4, rows_per_client=3, max_batch_size=4, max_wait=0.05)
+    rng = np.random.default_rng(0)
+    answers = {}
+
+    def ask(client):
+        observations = rng.integers(0, 2, (3,) + OBSERVATION_SHAPE)
+        q_values = client.predict(observations.astype(np.float32))
+        answers[client.start] = (q_values[:, 3], observations.sum(axis=(1, 2)))
+
+    threads = [threading.Thread(target=ask, args=(c,)) for c in inference.clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    inference.close()
+    assert len(answers) == 4
+    for q_values, expected in answers.values():
+        assert (q_values == expected).all()
+    assert max(model.batch_sizes) <= 4 and sum(model.batch_sizes) == 12
+
+
+def test_run_actors_plays_every_env():
+    inference = server(Model(), 2, rows_per_client=2)
+    try:
+        actions, duration, scores = run_actors(inference, 300, greedy=True)
+    finally:
+        inference.close()
+    assert actions == 2 * 2 * 300 and duration > 0
+    # always the same move ends games quickly
+    assert scores
+
+
+def test_run_actors_raises_a_worker_error():
+    inference = server(Model(), 2)
+    try:
+        with pytest.raises(RuntimeError, match="unknown action mode"):
+            run_actors(inference, 10, env_kwargs={"action_mode": "nope"})
+    finally:
+        inference.close()
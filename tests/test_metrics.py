@@ -0,0 +1,126 @@
+import io
+import json
+from tetris_ai.metrics import (
+    ConsoleSink,
+    Events,
+    Histogram,
+    JsonlSink,
+    Metrics,
+    MetricsFlusher,
+)
+
+
+class ListSink(object):
+    def __init__(self):
+        self.records = []
+        self.closed = False
+
+    def write(self, records):
+        self.records.extend(records)
+
+    def close(self):
+        self.closed = True
+
+
+def test_histogram_keeps_the_last_samples():
+    histogram = Histogram("h", 4)
+    assert histogram.drain() is None
+    for value in range(10):
+        histogram.record(float(value))
+    record = histogram.drain()
+    assert record["count"] == 4
+    assert (record["min"], record["max"]) == (6.0, 9.0)
+    assert record["mean"] == 7.5
+    histogram.record(1.0)
+    assert histogram.drain()["count"] == 1
+    assert histogram.drain() is None
+
+
+def test_events_keep_the_last_ones_in_order():
+    events = Events(3)
+    for i in range(5):
+        events.record("e", {"i": i})
+    assert [record["fields"]["i"] for record in events.drain()] == [2, 3, 4]
+    assert events.drain() == []
+
+
+def test_counters_and_levels():
+    metrics = Metrics(capacity=8)
+    component = metrics.component("c", sample_every=3)
+    component.counter("n").inc(2)
+    component.counter("n").inc()
+    assert [component.sampled() for _ in range(6)] == [False, False, True] * 2
+    component.event("debug", level=10)
+    component.event("info")
+    records = metrics.drain()
+    assert {r["name"]: r["type"] for r in records} == {"n": "counter", "info": "event"}
+    assert [r["value"] for r in records if r["name"] == "n"] == [3]
+    metrics.configure("c", level="off")
+    component.event("info")
+    assert not component.sampled(3)
+    assert [r for r in metrics.drain() if r["type"] == "event"] == []
+
+
+def test_muted_suppresses_recording_and_restores_the_level():
+    metrics = Metrics()
+    game = metrics.component("game", level=10)
+    other = metrics.component("other")
+    with metrics.muted("game"):
+        game.event("lines_cleared", lines=4)
+        other.event("kept")
+        assert not game.sampled(1)
+    assert game.level == 10
+    game.event("lines_cleared", lines=1)
+    events = [r for r in metrics.drain() if r["type"] == "event"]
+    assert sorted((r["name"], r["fields"].get("lines")) for r in events) == [
+        ("kept", None),
+        ("lines_cleared", 1),
+    ]
+
+
+def test_muted_restores_the_level_on_errors():
+    metrics = Metrics()
+    component = metrics.component("game")
+    try:
+        with metrics.muted("game"):
+            raise KeyError
+    except KeyError:
+        pass
+    assert component.enabled()
+
+
+def test_flusher_thread_drains_and_stops():
+    metrics = Metrics()
+    sink = ListSink()
+    flusher = MetricsFlusher(metrics, sink, interval=0.01)
+    flusher.start()
+    metrics.component("c").event("first")
+    for _ in range(500):
+        if sink.records:
+            break
+        flusher.stopped.wait(0.01)
+    assert [r["name"] for r in sink.records] == ["first"]
+    metrics.component("c").event("last")
+    flusher.close()
+    assert not flusher.is_alive()
+    assert sink.closed
+    # whatever was recorded before close() is flushed
+    assert [r["name"] for r in sink.records] == ["first", "last"]
+
+
+def test_sinks(tmp_path):
+    metrics = Metrics()
+    metrics.component("c").event("e", x=1)
+    metrics.component("c").histogram("h").record(0.5)
+    records = metrics.drain()
+    path = tmp_path / "metrics.jsonl"
+    sink = JsonlSink(str(path))
+    sink.write(records)
+    sink.close()
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == [
+        "h",
+        "e",
+    ]
+    output = io.StringIO()
+    ConsoleSink(output).write(records)
+    assert "c.e x=1" in output.getvalue()
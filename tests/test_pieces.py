@@ -0,0 +1,37 @@
+import pytest
+from tetris_ai.game import Figure
+from tetris_ai.pieces import PieceGenerator
+
+
+def draw(generator, count):
+    return [generator.next() for _ in range(count)]
+
+
+@pytest.mark.parametrize("mode", ["uniform", "bag"])
+def test_same_seed_same_pieces(mode):
+    # small blocks so drawing goes through a few refills
+    pieces = draw(PieceGenerator(5, mode, block_size=10), 100)
+    assert pieces == draw(PieceGenerator(5, mode, block_size=10), 100)
+    assert pieces != draw(PieceGenerator(6, mode, block_size=10), 100)
+
+
+def test_bag_holds_every_type_once():
+    nb_types = len(Figure.figures)
+    generator = PieceGenerator(0, "bag", block_size=nb_types * 3)
+    types = [figure_type for figure_type, _ in draw(generator, nb_types * 10)]
+    for start in range(0, len(types), nb_types):
+        assert sorted(types[start : start + nb_types]) == list(range(nb_types))
+
+
+@pytest.mark.parametrize("mode", ["uniform", "bag"])
+def test_preview_shows_the_next_pieces(mode):
+    generator = PieceGenerator(1, mode, block_size=8)
+    generator.next()
+    preview = list(generator.preview(20))
+    assert preview == [figure_type for figure_type, _ in draw(generator, 20)]
+    assert generator.drawn == 21
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        PieceGenerator(mode="nope")
@@ -0,0 +1,103 @@
+import copy
+import random
+import numpy as np
+import pytest
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.numpy_game import CELLS
+from tetris_ai.placements import afterstates, reachable_placements
+
+
+def placement_env(seed, engine="python"):
+    env = TetrisEnv(engine=engine, action_mode="placement")
+    env.seed(seed)
+    env.reset()
+    return env
+
+
+def copy_game(game):
+    """Copy of `game` on its own board, a deepcopy of NumpyTetris would no
+    longer have its field as a view of its padded board
+    """
+    copied = type(game)(game.height, game.width)
+    field = [[int(cell) for cell in row] for row in game.field]
+    if hasattr(copied, "load_field"):
+        copied.load_field(field)
+    else:
+        for i, row in enumerate(field):
+            copied.field[i][:] = row
+    copied.figure = copy.copy(game.figure)
+    return copied
+
+
+def board(env):
+    return np.array(env.game.field) != 0
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_afterstates_are_the_reachable_placements_locked(engine):
+    env = placement_env(0, engine)
+    rng = random.Random(0)
+    for _ in range(30):
+        placements = reachable_placements(env.game)
+        boards, lines = afterstates(env.game, placements)
+        assert len(placements) == len(boards) == len(lines) > 0
+        for (rotation, x, y), after, nb_lines in zip(placements, boards, lines):
+            game = copy_game(env.game)
+            game.figure.rotation = rotation
+            game.figure.x = x
+            game.figure.y = y
+            assert not game.intersects()
+            game.freeze()
+            assert game.score == nb_lines
+            assert (np.array(game.field) == after).all()
+        _, _, done, _ = env.step(rng.randrange(env.action_space.n))
+        if done:
+            break
+
+
+def test_placement_locks_the_figure_at_its_cells():
+    env = placement_env(1)
+    for rotation, x, y in reachable_placements(env.game):
+        cells = CELLS[env.game.figure.type, rotation] + (y, x)
+        stepped = copy.deepcopy(env)
+        stepped.step(env.placement_action(rotation, x))
+        locked = board(stepped) & ~board(env)
+        assert sorted(zip(*np.nonzero(locked))) == sorted(map(tuple, cells))
+        # the figure lies on the floor of the empty board
+        assert cells[:, 0].max() == 19
+
+
+def test_env_afterstates_match_stepping_their_actions():
+    env = placement_env(2)
+    actions, boards, lines = env.afterstates()
+    assert boards.dtype == env.observation_space.dtype
+    for action, after in zip(actions, boards):
+        stepped = copy.deepcopy(env)
+        stepped.step(action)
+        assert (board(stepped) == after).all()
+
+
+def test_unreachable_placement_falls_back_to_a_reachable_one():
+    env = placement_env(3)
+    _, boards, _ = env.afterstates()
+    # rotations past the figure's wrap around, columns past the wall are
+    # clamped to the closest one
+    for action in [env.action_space.n - 1, 9, 3 * TetrisEnv.BOARD_WIDTH + 9]:
+        stepped = copy.deepcopy(env)
+        _, _, done, _ = stepped.step(action)
+        assert not done
+        assert any((board(stepped) == after).all() for after in boards)
+
+
+def test_placement_without_placements_ends_the_episode():
+    env = placement_env(4)
+    done = False
+    while not done:
+        _, _, done, _ = env.step(0)
+    field = board(env)
+    observation, reward, done, _ = env.step(0)
+    assert done and reward == 0.0
+    assert env.game.is_done()
+    assert (board(env) == field).all()
+    env.game.figure = None
+    assert env.step(5)[2]
@@ -0,0 +1,137 @@
+import time
+import pytest
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.game import Tetris
+from tetris_ai.profiling import PHASES, Profiler
+from tetris_ai.solver import HeuristicActionDecider
+
+
+def play(nb_steps=200, decider=None):
+    env = TetrisEnv()
+    env.seed(0)
+    env.reset()
+    for step in range(nb_steps):
+        action = step % env.action_space.n
+        if decider is not None:
+            action = decider.move_action(env)
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+
+
+def calls(profiler):
+    return {phase: calls for phase, calls, *_ in profiler.summary()}
+
+
+def test_disable_puts_the_methods_back():
+    originals = {
+        (owner, method): vars(owner).get(method) for owner, method, _ in PHASES
+    }
+    profiler = Profiler().enable()
+    assert TetrisEnv.step is not originals[TetrisEnv, "step"]
+    play()
+    profiler.disable()
+    for (owner, method), original in originals.items():
+        assert vars(owner).get(method) is original
+    assert calls(profiler)["env.step"] == 200
+    assert calls(profiler)["game.go_down"] == 200
+    # nothing more is timed
+    play()
+    assert calls(profiler)["env.step"] == 200
+
+
+def test_instance_methods_go_back():
+    class Agent(object):
+        def forward(self):
+            return 1
+
+    agent = Agent()
+    agent.backward = lambda: 2
+    backward = agent.backward
+    profiler = Profiler().enable([(agent, "forward", "f"), (agent, "backward", "b")])
+    assert (agent.forward(), agent.backward()) == (1, 2)
+    profiler.disable()
+    assert "forward" not in vars(agent) and agent.backward is backward
+    assert calls(profiler) == {"f": 1, "b": 1}
+
+
+def test_paused_leaves_calls_out():
+    profiler = Profiler().enable()
+    try:
+        with profiler.paused():
+            play(50)
+        play(50)
+    finally:
+        profiler.disable()
+    assert calls(profiler)["env.step"] == 50
+
+
+def test_move_lookahead_is_not_profiled(monkeypatch):
+    import tetris_ai.solver
+
+    profiler = Profiler()
+    monkeypatch.setattr(tetris_ai.solver, "profiler", profiler)
+    profiler.enable([(Tetris, "go_down", "game.go_down")])
+    try:
+        play(100, HeuristicActionDecider())
+    finally:
+        profiler.disable()
+    # only the env's own go_down, one per step
+    assert calls(profiler)["game.go_down"] == 100
+
+
+def test_profile_callback_times_whole_steps():
+    pytest.importorskip("rl")
+    from rl.callbacks import Callback
+    from tetris_ai.train import ProfileCallback
+
+    class Model(object):
+        def train_on_batch(self, *args):
+            pass
+
+    class Memory(object):
+        def sample(self, batch_size):
+            return []
+
+    class Agent(object):
+        memory = Memory()
+        trainable_model = Model()
+
+        def forward(self, observation):
+            return 0
+
+        def compute_q_values(self, state):
+            return [0.0]
+
+        def compute_batch_q_values(self, states):
+            return [[0.0]]
+
+        def backward(self, reward, terminal):
+            return []
+
+    class Slow(Callback):
+        def on_step_begin(self, step, logs={}):
+            time.sleep(0.01)
+
+    agent = Agent()
+    slow = Slow()
+    profiler = Profiler()
+    callback = ProfileCallback(profiler, [slow])
+    callback.set_model(agent)
+    assert "forward" in vars(agent) and "on_step_begin" in vars(slow)
+    callback.on_train_begin()
+    callback.on_episode_begin(0)
+    for step in range(5):
+        # the order agent.fit calls them in, ProfileCallback last
+        slow.on_step_begin(step)
+        callback.on_step_begin(step)
+        agent.forward(None)
+        agent.backward(0.0, False)
+        callback.on_step_end(step)
+    callback.on_train_end()
+    assert "forward" not in vars(agent) and "on_step_begin" not in vars(slow)
+    rows = {row[0]: row for row in profiler.summary()}
+    assert rows["agent.fit_step"][1] == 5
+    # every step holds the hook of the other callback
+    assert rows["agent.fit_step"][2] >= rows["callbacks.Slow.on_step_begin"][2]
+    assert rows["callbacks.Slow.on_step_begin"][2] >= 0.05
@@ -0,0 +1,70 @@
+import os
+import random
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+pygame = pytest.importorskip("pygame")
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.render import TetrisDrawer
+
+
+def frames(drawer, engine, nb_steps=400):
+    """Screens drawn along a seeded game and the one after it"""
+    env = TetrisEnv(engine=engine)
+    env.seed(0)
+    env.reset()
+    rng = random.Random(1)
+    screens = []
+    for step in range(nb_steps):
+        drawer.render(env.game, f"step {step // 10}")
+        screens.append(pygame.surfarray.array3d(drawer.screen))
+        _, _, done, _ = env.step(rng.randrange(env.action_space.n))
+        if done:
+            # the game over frame, then a new game on the same drawer
+            drawer.render(env.game, "over")
+            screens.append(pygame.surfarray.array3d(drawer.screen))
+            env.reset()
+    return screens
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_incremental_frames_are_full_redraws(engine, monkeypatch):
+    # no frame rate cap
+    monkeypatch.setattr(TetrisDrawer, "FPS", 0)
+    monkeypatch.setattr(TetrisDrawer, "INITIALIZED", None)
+    drawer = TetrisDrawer(incremental=False)
+    try:
+        full = frames(drawer, engine)
+        incremental = frames(TetrisDrawer(incremental=True), engine)
+    finally:
+        # pygame is shared by the drawers
+        drawer.close()
+    assert len(full) == len(incremental)
+    for expected, screen in zip(full, incremental):
+        assert (screen == expected).all()
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_rgb_array_is_the_drawn_grid(engine, monkeypatch):
+    monkeypatch.setattr(TetrisDrawer, "FPS", 0)
+    monkeypatch.setattr(TetrisDrawer, "INITIALIZED", None)
+    env = TetrisEnv(engine=engine)
+    env.seed(0)
+    env.reset()
+    drawer = TetrisDrawer(incremental=False)
+    rng = random.Random(2)
+    try:
+        for _ in range(200):
+            game = env.game
+            drawer.render(game)
+            # surfarray is indexed by x then y
+            screen = pygame.surfarray.array3d(drawer.screen).swapaxes(0, 1)
+            height, width = game.height * game.zoom, game.width * game.zoom
+            grid = screen[game.y : game.y + height, game.x : game.x + width]
+            assert (env.render(mode="rgb_array") == grid).all()
+            _, _, done, _ = env.step(rng.randrange(env.action_space.n))
+            if done:
+                # the game over text is drawn over the grid
+                break
+    finally:
+        drawer.close()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from tetris_ai.replay import PrioritizedReplayBuffer, SumTree
+
+
+@pytest.mark.parametrize("capacity", [1, 5, 64, 1000])
+def test_find_matches_searchsorted(capacity):
+    rng = np.random.default_rng(capacity)
+    tree = SumTree(capacity)
+    priorities = rng.random(capacity) * (rng.random(capacity) < 0.7)
+    priorities[0] = 0.5
+    tree.update(np.arange(capacity), priorities)
+    assert tree.total == pytest.approx(priorities.sum())
+    values = rng.uniform(0, tree.total, 2000)
+    expected = np.searchsorted(np.cumsum(priorities), values, side="right")
+    slots = tree.find(values)
+    # values on a boundary may round either way
+    assert (slots == expected).mean() > 0.999
+    assert (priorities[slots] > 0).all()
+
+
+def test_find_never_lands_on_zero_priority():
+    tree = SumTree(4)
+    tree.update([0, 1, 2, 3], [0.1, 0.2, 0.0, 0.0])
+    assert list(tree.find([0.3, 0.30000000000000004, np.nextafter(0.3, 0)])) == [
+        1,
+        1,
+        1,
+    ]
+
+
+def test_set_matches_update():
+    rng = np.random.default_rng(0)
+    a, b = SumTree(37), SumTree(37)
+    priorities = rng.random(37)
+    for index, priority in enumerate(priorities):
+        a.set(index, priority)
+    b.update(np.arange(37), priorities)
+    assert np.allclose(a.tree, b.tree)
+
+
+def test_sample_skips_episode_ends():
+    buffer = PrioritizedReplayBuffer(16, (2, 3))
+    for i in range(40):
+        buffer.append(np.full((2, 3), i % 2), i % 6, float(i), i % 5 == 4)
+    rng = np.random.RandomState(0)
+    for _ in range(100):
+        slots, weights, (observations, actions, _, next_observations, _) = (
+            buffer.sample(8, rng=rng)
+        )
+        assert np.isfinite(weights).all() and weights.max() == 1
+        assert (buffer.tree[slots] > 0).all()
+        # no transition from the newest frame, nor from the last one of an
+        # episode to the first of the next
+        newest = (buffer.next_index - 1) % 16
+        assert not (slots == newest).any()
+        followed = slots[slots != buffer.next_index]
+        assert not buffer.terminals[(followed - 1) % 16].any()
+        assert (observations[:, 0, 0] != next_observations[:, 0, 0]).all()
+        buffer.update_priorities(slots, rng.randn(8))
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from tetris_ai.envs.tetris import TetrisEnv
+
+ENV_KWARGS = [
+    {},
+    {"observation_mode": "planes", "preview": 2},
+    {"action_mode": "placement", "piece_mode": "bag"},
+]
+
+
+def play(env, actions):
+    steps = []
+    for action in actions:
+        observation, reward, done, _ = env.step(action)
+        steps.append((observation.copy(), reward, done))
+        if done:
+            break
+    return steps
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+@pytest.mark.parametrize("kwargs", ENV_KWARGS)
+def test_restore_state_replays_the_same_steps(engine, kwargs):
+    env = TetrisEnv(engine=engine, **kwargs)
+    env.seed(1)
+    env.reset()
+    rng = np.random.RandomState(2)
+    for step in range(600):
+        if step % 50 == 0:
+            state = env.clone_state()
+            actions = rng.randint(env.action_space.n, size=40)
+            expected = play(env, actions)
+            env.restore_state(state)
+            steps = play(env, actions)
+            assert len(steps) == len(expected)
+            for (observation, reward, done), (o, r, d) in zip(steps, expected):
+                assert (observation == o).all()
+                assert (reward, done) == (r, d)
+            env.restore_state(state)
+        _, _, done, _ = env.step(rng.randint(env.action_space.n))
+        if done:
+            env.reset()
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_game_snapshot_round_trip(engine):
+    env = TetrisEnv(engine=engine)
+    env.seed(0)
+    env.reset()
+    for _ in range(150):
+        env.step(3)
+    game = env.game
+    snapshot = game.snapshot()
+    field = [[int(cell) for cell in row] for row in game.field]
+    for _ in range(50):
+        env.step(0)
+    game.restore(snapshot)
+    assert [[int(cell) for cell in row] for row in game.field] == field
+    assert game.snapshot().board_hash == snapshot.board_hash
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from tetris_ai.bitboard_game import BitboardTetris
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.game import Figure, Tetris
+from tetris_ai.metrics import metrics
+from tetris_ai.numpy_game import NumpyTetris
+from tetris_ai.pieces import PieceGenerator
+from tetris_ai.placements import afterstates, reachable_placements
+from tetris_ai.solver import HeuristicActionDecider, evaluate
+from tests.test_engines import load, state
+
+ENGINES = [Tetris, NumpyTetris, BitboardTetris]
+O_PIECE = 4
+
+
+def near_full_game(engine):
+    """Game where the O piece falling in fits in a 4 wide well but every
+    place it locks in leaves no room for the next O piece
+    """
+    field = [[1] * 10 for _ in range(20)]
+    for row in field:
+        # column 0 stays out of reach so no line is ever full
+        row[0] = 0
+    for row in field[:3]:
+        row[3:7] = [0] * 4
+    seed = next(
+        seed for seed in range(1000) if PieceGenerator(seed).next()[0] == O_PIECE
+    )
+    game = engine(20, 10, PieceGenerator(seed))
+    load(game, field)
+    game.figure = Figure(3, 0, O_PIECE, 1)
+    return game
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_lookahead_ending_every_game_keeps_the_best_board(engine):
+    game = near_full_game(engine)
+    placements = reachable_placements(game)
+    boards, lines = afterstates(game, placements)
+    scores = evaluate(boards, lines)
+    assert len(placements) == 3 and len(set(scores)) > 1
+    decider = HeuristicActionDecider(lookahead=1, beam_width=len(placements))
+    best = decider.best_placement(game)
+    assert scores[placements.index(best)] == scores.max()
+    # the first placement is the worst one here
+    assert best != placements[0]
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy", "bitboard"])
+def test_move_action_leaves_the_env_alone(engine):
+    env = TetrisEnv(engine=engine)
+    env.seed(0)
+    env.reset()
+    decider = HeuristicActionDecider(lookahead=1)
+    for _ in range(100):
+        before = state(env.game), env.pieces.drawn
+        metrics.drain()
+        action = decider.move_action(env)
+        assert (state(env.game), env.pieces.drawn) == before
+        # nothing the lookahead locks shows in the game metrics
+        assert not [r for r in metrics.drain() if r["component"] == "game"]
+        _, _, done, _ = env.step(action)
+        if done:
+            break
+
+
+def test_solver_clears_lines():
+    env = TetrisEnv(engine="numpy", action_mode="placement")
+    env.seed(0)
+    env.reset()
+    decider = HeuristicActionDecider()
+    lines = 0
+    for _ in range(200):
+        rotation, x, _ = decider.best_placement(env.game)
+        _, _, done, _ = env.step(env.placement_action(rotation, x))
+        assert not done
+        # the score is the lines broken by the last lock
+        lines += env.game.score
+    assert lines > 50
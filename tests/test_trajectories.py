@@ -0,0 +1,57 @@
+import numpy as np
+from tetris_ai.trajectories import (
+    FINAL_FRAME,
+    TrajectoryDataset,
+    TrajectoryWriter,
+    pack_observation,
+    unpack_observations,
+)
+
+
+def test_pack_round_trip():
+    rng = np.random.RandomState(0)
+    for shape in [(20, 10), (3, 20, 10), (7, 3)]:
+        observations = rng.randint(0, 2, (5,) + shape)
+        packed = np.array(
+            [np.frombuffer(pack_observation(o), dtype=np.uint8) for o in observations]
+        )
+        assert packed.shape[1] == -(-int(np.prod(shape)) // 8)
+        assert (unpack_observations(packed, shape) == observations).all()
+
+
+def test_dataset_samples_written_transitions(tmp_path):
+    rng = np.random.RandomState(0)
+    writer = TrajectoryWriter(str(tmp_path), (4, 5), chunk_frames=50)
+    transitions = set()
+    nb_frames = 0
+    for _ in range(20):
+        observation = rng.randint(0, 2, (4, 5))
+        for step in range(rng.randint(1, 15)):
+            action = rng.randint(10)
+            reward = np.float32(rng.rand())
+            next_observation = rng.randint(0, 2, (4, 5))
+            done = step == 14 or rng.rand() < 0.1
+            writer.append(observation, action, reward, done)
+            nb_frames += 1
+            transitions.add(
+                (observation.tobytes(), action, reward, next_observation.tobytes())
+            )
+            observation = next_observation
+            if done:
+                break
+        writer.end_episode(observation)
+        nb_frames += 1
+    writer.close()
+    dataset = TrajectoryDataset(str(tmp_path), seed=0)
+    assert dataset.nb_frames == nb_frames
+    observations, actions, rewards, next_observations, _ = dataset.sample(500)
+    assert (actions != FINAL_FRAME).all()
+    for sample in zip(observations, actions, rewards, next_observations):
+        observation, action, reward, next_observation = sample
+        key = (
+            observation.astype(int).tobytes(),
+            int(action),
+            reward,
+            next_observation.astype(int).tobytes(),
+        )
+        assert key in transitions
@@ -0,0 +1,28 @@
+import numpy as np
+from tetris_ai.envs import SubprocTetrisEnv
+
+
+def play(seed, nb_steps=200):
+    env = SubprocTetrisEnv(4, 2, pin_workers=False)
+    try:
+        seeds = env.seed(seed)
+        observations = [env.reset()]
+        rng = np.random.RandomState(0)
+        for _ in range(nb_steps):
+            actions = rng.randint(len(env.ACTIONS), size=env.nb_envs)
+            observations.append(env.step(actions)[0])
+    finally:
+        env.close()
+    return seeds, np.array(observations)
+
+
+def test_seed_replays_the_same_games():
+    seeds, observations = play(5)
+    assert seeds == [5, 6, 7, 8]
+    assert (play(5)[1] == observations).all()
+
+
+def test_no_seed_is_no_fixed_seed():
+    seeds, observations = play(None)
+    assert seeds == [None] * 4
+    assert not (play(None)[1] == observations).all()
@@ -0,0 +1,64 @@
+import argparse
+import os
+from tetris_ai.inference import run_actors
+from tetris_ai.metrics import metrics
+
+SEED = 123
+
+
+def bench(server, nb_steps):
+    """Actions/s of the workers of a started `server` playing on its
+    Q-values, with the batch size and queue depth histograms of the server
+    """
+    try:
+        actions, elapsed, _ = run_actors(server, nb_steps, seed=SEED)
+    finally:
+        server.close()
+    histograms = {
+        record["name"]: record
+        for record in metrics.drain()
+        if record["type"] == "histogram" and record["component"] == "inference"
+    }
+    return actions / elapsed, histograms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="actions/s of env workers sharing one model"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--envs-per-worker", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait", type=float, default=0.002)
+    parser.add_argument("--weights", help="load these weights in the model")
+    args = parser.parse_args()
+
+    # the workers import this module again, keep TensorFlow out of them
+    import gym
+    from tetris_ai.train import get_agent, serve_q_values
+
+    env = gym.make("tetris_ai:tetris_gym-v0")
+    agent, _ = get_agent(env)
+    if args.weights:
+        agent.load_weights(args.weights)
+    # a batch per request is what every worker running the model itself gets
+    for name, max_batch_size in (
+        ("unbatched", args.envs_per_worker),
+        ("batched", args.max_batch_size),
+    ):
+        server = serve_q_values(
+            agent,
+            args.workers,
+            rows_per_client=args.envs_per_worker,
+            max_batch_size=max_batch_size,
+            max_wait=args.max_wait,
+        )
+        actions_per_sec, histograms = bench(server, args.steps)
+        print(f"{name:10} {actions_per_sec:10.0f} actions/s")
+        for histogram in histograms.values():
+            print(
+                f"  {histogram['name']:14} mean={histogram['mean']:.4f} "
+                f"p50={histogram['p50']:.4f} p99={histogram['p99']:.4f} "
+                f"max={histogram['max']:.4f}"
+            )
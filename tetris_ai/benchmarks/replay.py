@@ -0,0 +1,70 @@
+import argparse
+import time
+import gym
+import numpy as np
+from rl.memory import SequentialMemory
+from tetris_ai.train import PrioritizedMemory
+
+SEED = 123
+
+
+def fill(memory, observations, nb_frames, episode_length=200):
+    """Appends/s of `nb_frames` frames, episodes ending like agent.fit ends
+    them
+    """
+    rng = np.random.RandomState(SEED)
+    start = time.perf_counter()
+    for i in range(nb_frames):
+        observation = observations[i % len(observations)]
+        if i % episode_length == episode_length - 1:
+            memory.append(observation, 0, 0.0, False)
+        else:
+            done = i % episode_length == episode_length - 2
+            memory.append(observation, rng.randint(6), rng.rand(), done)
+    return nb_frames / (time.perf_counter() - start)
+
+
+def latency(call, repeat):
+    """p50 and p99 of `call` in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, [50, 99]) * 1e3
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="append/sample/update latency of the replay memories"
+    )
+    parser.add_argument(
+        "--capacity", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    env = gym.make("tetris_ai:tetris_gym-v0")
+    shape = env.observation_space.shape
+    rng = np.random.RandomState(SEED)
+    observations = rng.randint(0, 2, (1000,) + shape).astype(
+        env.observation_space.dtype
+    )
+    for capacity in args.capacity:
+        memories = (
+            ("sequential", SequentialMemory(limit=capacity, window_length=1)),
+            ("prioritized", PrioritizedMemory(capacity, shape)),
+        )
+        for name, memory in memories:
+            appends_per_sec = fill(memory, observations, capacity)
+            sample = latency(lambda: memory.sample(args.batch_size), args.repeat)
+            line = (
+                f"{name:12} {capacity:8d} {appends_per_sec:10.0f} appends/s "
+                f"sample p50={sample[0]:.3f}ms p99={sample[1]:.3f}ms"
+            )
+            if isinstance(memory, PrioritizedMemory):
+                errors = rng.randn(args.batch_size)
+                update = latency(lambda: memory.update_priorities(errors), args.repeat)
+                line += f" update p50={update[0]:.3f}ms p99={update[1]:.3f}ms"
+            print(line)
@@ -0,0 +1,62 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# run in a fresh interpreter so nothing is already imported
+COLD_START = """
+import json, resource, sys, time
+start = time.perf_counter()
+import gym
+env = gym.make("tetris_ai:tetris_gym-v0")
+env.reset()
+seconds = time.perf_counter() - start
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# kilobytes on linux, bytes on macOS
+if sys.platform == "darwin":
+    max_rss //= 1024
+print(json.dumps({
+    "seconds": seconds,
+    "max_rss_kb": max_rss,
+    "pygame_imported": "pygame" in sys.modules,
+    "termcolor_imported": "termcolor" in sys.modules,
+}))
+"""
+
+
+def measure_cold_start(repeat=5):
+    """Time and peak resident memory of importing gym and making the env in
+    `repeat` fresh interpreters
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "repeat": repeat,
+        "seconds_median": statistics.median(run["seconds"] for run in runs),
+        "seconds_min": min(run["seconds"] for run in runs),
+        "max_rss_kb_median": statistics.median(run["max_rss_kb"] for run in runs),
+        "pygame_imported": any(run["pygame_imported"] for run in runs),
+        "termcolor_imported": any(run["termcolor_imported"] for run in runs),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='cold start latency and memory of gym.make("tetris_ai:tetris_gym-v0")'
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this json file")
+    args = parser.parse_args()
+    results = measure_cold_start(args.repeat)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
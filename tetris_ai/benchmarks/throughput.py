@@ -0,0 +1,245 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from tetris_ai.envs.tetris import ENGINES, TetrisEnv
+from tetris_ai.game import ActionApplier, Figure, RandomActionDecider
+from tetris_ai.metrics import metrics
+from tetris_ai.pieces import PieceGenerator
+from tetris_ai.solver import HeuristicActionDecider
+
+SEED = 123
+
+
+def record_states(nb_states=200, seed=SEED):
+    """Board states met while playing seeded random games, as (field, figure)
+    with the figure as (type, rotation, x, y, color)
+    """
+    random.seed(seed)
+    states = []
+    env = TetrisEnv()
+    env.seed(seed)
+    env.reset()
+    step = 0
+    while len(states) < nb_states:
+        _, _, done, _ = env.step(random.randrange(env.action_space.n))
+        step += 1
+        if done:
+            env.reset()
+        elif step % 7 == 0:
+            figure = env.game.figure
+            states.append(
+                (
+                    [list(row) for row in env.game.field],
+                    (figure.type, figure.rotation, figure.x, figure.y, figure.color),
+                )
+            )
+    return states
+
+
+def load_state(game, state):
+    field, (figure_type, rotation, x, y, color) = state
+    game.load_field(field)
+    game.figure = Figure(x, y)
+    game.figure.type = figure_type
+    game.figure.rotation = rotation
+    game.figure.color = color
+
+
+def bench_env_step(engine, nb_steps=20000):
+    """TetrisEnv.step with actions drawn uniformly from TetrisEnv.ACTIONS"""
+    random.seed(SEED)
+    env = TetrisEnv(engine=engine)
+    env.seed(SEED)
+    env.reset()
+    actions = [random.randrange(env.action_space.n) for _ in range(nb_steps)]
+    start = time.perf_counter()
+    for action in actions:
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    return nb_steps, time.perf_counter() - start
+
+
+def bench_game_random_decider(engine, nb_steps=20000):
+    """The game loop of TetrisEnv driven by RandomActionDecider"""
+    random.seed(SEED)
+    decider = RandomActionDecider()
+    applier = ActionApplier()
+    pieces = PieceGenerator(SEED)
+    game = ENGINES[engine](TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH, pieces)
+    start = time.perf_counter()
+    for _ in range(nb_steps):
+        if game.figure is None:
+            game.new_figure()
+        game.go_down()
+        applier.apply_actions(decider.get_action(game), game)
+        if game.is_done():
+            game = ENGINES[engine](
+                TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH, pieces
+            )
+    return nb_steps, time.perf_counter() - start
+
+
+def bench_episodes(engine, nb_episodes=50):
+    random.seed(SEED)
+    env = TetrisEnv(engine=engine)
+    env.seed(SEED)
+    start = time.perf_counter()
+    for _ in range(nb_episodes):
+        env.reset()
+        done = False
+        while not done:
+            _, _, done, _ = env.step(random.randrange(env.action_space.n))
+    return nb_episodes, time.perf_counter() - start
+
+
+def _bench_on_states(engine, states, operation, repeat=10):
+    """Time `operation(game)` on a fresh game loaded with every state, only the
+    operation itself is timed
+    """
+    random.seed(SEED)
+    elapsed = 0
+    calls = 0
+    for _ in range(repeat):
+        for state in states:
+            game = ENGINES[engine](TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH)
+            load_state(game, state)
+            start = time.perf_counter()
+            operation(game)
+            elapsed += time.perf_counter() - start
+            calls += 1
+    return calls, elapsed
+
+
+def _reward(game):
+    env = TetrisEnv.__new__(TetrisEnv)
+    env.game = game
+    # off the metrics sampling
+    env.counter = 1
+    return lambda: env._reward()
+
+
+MICROBENCHMARKS = {
+    "intersects": lambda game: game.intersects(),
+    "freeze": lambda game: game.freeze(),
+    "break_lines": lambda game: game.break_lines(),
+    "go_space": lambda game: game.go_space(),
+    "heuristic_decision": HeuristicActionDecider().best_placement,
+}
+
+
+def run(engines, states):
+    results = {}
+    for engine in engines:
+        for name, bench in (
+            ("env_step", bench_env_step),
+            ("game_random_decider", bench_game_random_decider),
+            ("episodes", bench_episodes),
+        ):
+            calls, elapsed = bench(engine)
+            results[f"{engine}/{name}"] = {"ops_per_sec": calls / elapsed}
+        for name, operation in MICROBENCHMARKS.items():
+            calls, elapsed = _bench_on_states(engine, states, operation)
+            results[f"{engine}/{name}"] = {"ops_per_sec": calls / elapsed}
+        rewards = []
+        for state in states:
+            game = ENGINES[engine](TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH)
+            load_state(game, state)
+            rewards.append(_reward(game))
+        start = time.perf_counter()
+        for reward in rewards * 10:
+            reward()
+        results[f"{engine}/reward"] = {
+            "ops_per_sec": len(rewards) * 10 / (time.perf_counter() - start)
+        }
+        tracemalloc.start()
+        bench_env_step(engine, nb_steps=2000)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"{engine}/env_step"]["peak_memory_kb"] = peak / 1024
+    return results
+
+
+def best_of(runs):
+    """Keep the best throughput and the lowest memory of several runs"""
+    results = {}
+    for run in runs:
+        for name, values in run.items():
+            best = results.setdefault(name, dict(values))
+            best["ops_per_sec"] = max(best["ops_per_sec"], values["ops_per_sec"])
+            if "peak_memory_kb" in values:
+                best["peak_memory_kb"] = min(
+                    best["peak_memory_kb"], values["peak_memory_kb"]
+                )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Regressions of more than `threshold` (a ratio) against `baseline`"""
+    regressions = []
+    for name, values in baseline["results"].items():
+        if name not in results:
+            continue
+        current = results[name]
+        if current["ops_per_sec"] < values["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {current['ops_per_sec']:.0f} ops/s, "
+                f"baseline {values['ops_per_sec']:.0f} ops/s"
+            )
+        if "peak_memory_kb" in values and current.get("peak_memory_kb", 0) > values[
+            "peak_memory_kb"
+        ] * (1 + threshold):
+            regressions.append(
+                f"{name}: {current['peak_memory_kb']:.0f} KB peak, "
+                f"baseline {values['peak_memory_kb']:.0f} KB"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="throughput of Tetris/TetrisEnv")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--baseline", help="json file of a previous run to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="fail when a benchmark is slower than the baseline by this ratio",
+    )
+    args = parser.parse_args()
+
+    # measure the game, not the events piling up in the metrics ring buffers
+    metrics.configure("env", level="off")
+    metrics.configure("game", level="off")
+    states = record_states()
+    engines = args.engines.split(",")
+    results = best_of([run(engines, states) for _ in range(args.repeat)])
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": SEED,
+            "nb_states": len(states),
+            "time": time.time(),
+        },
+        "results": results,
+    }
+    for name, values in sorted(results.items()):
+        memory = values.get("peak_memory_kb")
+        memory = f" {memory:10.0f} KB" if memory is not None else ""
+        print(f"{name:32} {values['ops_per_sec']:12.0f} ops/s{memory}")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
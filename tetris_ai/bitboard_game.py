@@ -0,0 +1,132 @@
+from functools import lru_cache
+from tetris_ai.game import GEOMETRY, Tetris
+
+# each row is an int whose bits are the columns of the board surrounded by
+# walls, wide enough for a 4 cells figure to never fall outside of the int
+PADDING = 4
+
+
+@lru_cache(maxsize=None)
+def _build_shapes(width):
+    """For every rotation of every figure and every x offset, the 4 row
+    bitmasks of the figure
+    """
+    shapes = []
+    for rotations in GEOMETRY:
+        rotation_shapes = []
+        for geometry in rotations:
+            rows = [0, 0, 0, 0]
+            for dy, dx in geometry.cells:
+                rows[dy] |= 1 << dx
+            rotation_shapes.append(
+                [
+                    tuple(row << (x + PADDING) for row in rows)
+                    for x in range(-PADDING, width + 1)
+                ]
+            )
+        shapes.append(rotation_shapes)
+    return shapes
+
+
+class BitboardTetris(Tetris):
+    """Drop-in replacement for Tetris storing each row as an int bitmask
+
+    `rows` holds the occupancy used for collisions and line clears while
+    `field` is a sidecar holding the colors for TetrisDrawer, only written
+    to when a figure is frozen or lines are broken.
+    """
+
+    def __init__(self, height, width, pieces=None):
+        super().__init__(height, width, pieces)
+        walls = (1 << PADDING) - 1
+        self.full_row = (1 << (width + 2 * PADDING)) - 1
+        self.empty_row = walls | (walls << (PADDING + width))
+        # the rows below the board are walls as well
+        self.rows = [self.empty_row] * height + [self.full_row] * PADDING
+        self.shapes = _build_shapes(width)
+
+    def load_field(self, field):
+        """Replace the board with a list of lists of colors"""
+        self.field = [list(row) for row in field]
+        for i, row in enumerate(self.field):
+            bits = self.empty_row
+            for j, cell in enumerate(row):
+                if cell:
+                    bits |= 1 << (j + PADDING)
+            self.rows[i] = bits
+        self._update_rows(range(self.height))
+
+    def _row_features(self, i):
+        bits = (self.rows[i] & ~self.empty_row) >> PADDING
+        count = bin(bits).count("1")
+        # each shift-and shortens every segment by one cell
+        max_segment = 0
+        while bits:
+            bits &= bits << 1
+            max_segment += 1
+        return count, max_segment
+
+    def _board_snapshot(self):
+        return super()._board_snapshot(), tuple(self.rows)
+
+    def _restore_board(self, board):
+        field, rows = board
+        super()._restore_board(field)
+        self.rows = list(rows)
+
+    def _shape(self):
+        return self.shapes[self.figure.type][self.figure.rotation][
+            self.figure.x + PADDING
+        ]
+
+    def intersects(self):
+        y = self.figure.y
+        rows = self.rows
+        for i, mask in enumerate(self._shape()):
+            if mask and rows[y + i] & mask:
+                return True
+        return False
+
+    def drop_distance(self):
+        # the rows below the board are walls, the figure can't go past them
+        y = self.figure.y + 1
+        rows = self.rows
+        masks = [(i, mask) for i, mask in enumerate(self._shape()) if mask]
+        distance = 0
+        while not any(rows[y + distance + i] & mask for i, mask in masks):
+            distance += 1
+        return distance
+
+    def break_lines(self):
+        rows = self.rows
+        full = self.full_row
+        # the first row is never checked and the second one counts as a line
+        # but is never shifted out
+        lines = sum(1 for i in range(1, self.height) if rows[i] == full)
+        self.score = lines
+        if lines == 0:
+            return
+        kept = [i for i in range(2, self.height) if rows[i] != full]
+        removed = self.height - 2 - len(kept)
+        if removed:
+            field = self.field
+            self.rows[2 : self.height] = [rows[1]] * removed + [rows[i] for i in kept]
+            self.field[2:] = [list(field[1]) for _ in range(removed)] + [
+                field[i] for i in kept
+            ]
+            self._clear_row_features(set(range(2, self.height)).difference(kept))
+        self._log_lines(lines)
+
+    def freeze(self):
+        figure = self.figure
+        y = figure.y
+        for i, mask in enumerate(self._shape()):
+            self.rows[y + i] |= mask
+        geometry = figure.geometry()
+        for dy, dx in geometry.cells:
+            self.field[y + dy][figure.x + dx] = figure.color
+        self._update_rows({y + dy for dy in geometry.rows})
+        self.break_lines()
+        self.new_figure()
+        if self.intersects():
+            self.gameover()
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from tetris_ai.game import zobrist_keys
+
+
+@lru_cache(maxsize=None)
+def _cell_keys(height, width):
+    return np.array(zobrist_keys(height, width)[0], dtype=np.uint64)
+
+
+def board_hashes(boards):
+    """Zobrist hash of every board of a (N, height, width) stack, the same as
+    the board_hash of a Tetris with those cells
+    """
+    boards = np.asarray(boards)
+    keys = _cell_keys(*boards.shape[1:])
+    occupied = np.where(boards != 0, keys, np.uint64(0))
+    return np.bitwise_xor.reduce(occupied.reshape(len(boards), -1), axis=1)
+
+
+class LRUCache(object):
+    """Map keys to values, the least recently used entry is dropped once
+    there are more than `max_entries`. It counts entries, not bytes: the
+    values cached are a score or the Q-values of a state, all the same size
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
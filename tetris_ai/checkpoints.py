@@ -0,0 +1,134 @@
+import glob
+import json
+import os
+import queue
+import re
+import threading
+import zipfile
+import numpy as np
+from tetris_ai.metrics import metrics
+
+checkpoint_metrics = metrics.component("checkpoints")
+
+# prefix-<step>.npz
+NAME = re.compile(r"-(\d+)\.npz$")
+
+
+def checkpoint_path(directory, prefix, step):
+    return os.path.join(directory, f"{prefix}-{step:09d}.npz")
+
+
+def list_checkpoints(directory, prefix):
+    """(step, path) of the checkpoints of `prefix`, oldest first"""
+    checkpoints = []
+    for path in glob.glob(os.path.join(directory, f"{prefix}-*.npz")):
+        match = NAME.search(path)
+        if match and os.path.basename(path) == os.path.basename(
+            checkpoint_path(directory, prefix, int(match.group(1)))
+        ):
+            checkpoints.append((int(match.group(1)), path))
+    return sorted(checkpoints)
+
+
+def save_checkpoint(path, arrays, meta):
+    """Write `arrays`, a dict of lists of arrays, and the json `meta` to
+    `path`, through a temporary file renamed once complete so a crash never
+    leaves a partial checkpoint behind
+    """
+    payload = {"meta": np.array(json.dumps(meta))}
+    for group, values in arrays.items():
+        for i, value in enumerate(values):
+            payload[f"{group}/{i:04d}"] = value
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as output:
+            np.savez(output, **payload)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path):
+    """(arrays, meta) of a checkpoint written by save_checkpoint()"""
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        arrays = {}
+        for key in sorted(data.files):
+            if key == "meta":
+                continue
+            group, _ = key.split("/")
+            arrays.setdefault(group, []).append(data[key])
+    return arrays, meta
+
+
+def latest_checkpoint(directory, prefix):
+    """(arrays, meta) of the newest checkpoint of `prefix` that can be read
+    back, None without one
+    """
+    for _, path in reversed(list_checkpoints(directory, prefix)):
+        try:
+            return load_checkpoint(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+            checkpoint_metrics.event("invalid", path=path, error=str(error))
+    return None
+
+
+class CheckpointWriter(object):
+    """Save checkpoints of `prefix` in `directory` from a background thread
+    and only keep the `keep` newest ones
+
+    save() only queues the arrays, they have to be copies the caller won't
+    modify (get_weights() already returns copies).
+    """
+
+    def __init__(self, directory, prefix, keep=3):
+        if keep < 1:
+            raise ValueError("at least one checkpoint has to be kept")
+        self.directory = directory
+        self.prefix = prefix
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._write, name="checkpoint-writer", daemon=True
+        )
+        self.thread.start()
+
+    def _write(self):
+        while True:
+            item = self.pending.get()
+            try:
+                if item is None:
+                    break
+                self._save(*item)
+            except Exception as error:
+                # training goes on, the next checkpoint may make it, and the
+                # thread has to outlive any error or wait() would never return
+                checkpoint_metrics.event("failed", step=item[0], error=repr(error))
+            finally:
+                self.pending.task_done()
+
+    def _save(self, step, arrays, meta):
+        path = checkpoint_path(self.directory, self.prefix, step)
+        save_checkpoint(path, arrays, meta)
+        checkpoint_metrics.event("saved", step=step, path=path)
+        checkpoints = list_checkpoints(self.directory, self.prefix)
+        for _, old in checkpoints[: max(len(checkpoints) - self.keep, 0)]:
+            os.remove(old)
+
+    def save(self, step, arrays, meta=None):
+        meta = dict(meta or {}, step=step)
+        self.pending.put((step, arrays, meta))
+
+    def wait(self):
+        """Block until every queued checkpoint is on the disk"""
+        self.pending.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.pending.put(None)
+            self.thread.join()
@@ -0,0 +1,400 @@
+import io
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from tetris_ai.metrics import metrics
+from tetris_ai.trajectories import (
+    ARRAYS,
+    FINAL_FRAME,
+    pack_observation,
+    unpack_observations,
+)
+
+distributed_metrics = metrics.component("distributed")
+queue_depths = distributed_metrics.histogram("queue_depth")
+credit_waits = distributed_metrics.histogram("credit_wait")
+
+# every message is a kind and the length of its payload
+HEADER = struct.Struct("!BI")
+HELLO = 1
+TRANSITIONS = 2
+ACK = 3
+WEIGHTS = 4
+STOP = 5
+
+
+def encode_arrays(arrays, meta=None):
+    """Compressed payload of a dict of arrays and a json `meta`"""
+    buffer = io.BytesIO()
+    np.savez(buffer, meta=np.array(json.dumps(meta or {})), **arrays)
+    return zlib.compress(buffer.getvalue(), 1)
+
+
+def decode_arrays(payload):
+    """(arrays, meta) of an encode_arrays() payload"""
+    with np.load(io.BytesIO(zlib.decompress(payload))) as data:
+        arrays = {key: data[key] for key in data.files if key != "meta"}
+        meta = json.loads(str(data["meta"]))
+    return arrays, meta
+
+
+def encode_weights(weights, version):
+    arrays = {f"{i:04d}": w for i, w in enumerate(weights)}
+    return encode_arrays(arrays, {"version": version})
+
+
+def decode_weights(payload):
+    arrays, meta = decode_arrays(payload)
+    return [arrays[key] for key in sorted(arrays)], meta["version"]
+
+
+def _send(sock, kind, payload=b""):
+    sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock):
+    kind, size = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return kind, _recv_exact(sock, size)
+
+
+class ActorClient(object):
+    """Actor end of a LearnerServer: frames are appended like with a
+    TrajectoryWriter and sent in compressed batches of `batch_frames`
+
+    Backpressure: at most `max_in_flight` batches are sent before the learner
+    acknowledged them, append() blocks past that. Weights broadcast by the
+    learner are received in a background thread, see latest_weights().
+    """
+
+    def __init__(self, address, actor_id, batch_frames=256, max_in_flight=4):
+        self.actor_id = actor_id
+        self.batch_frames = batch_frames
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.credits = threading.Semaphore(max_in_flight)
+        self.weights = None
+        self.weights_ready = threading.Condition()
+        self.stopped = threading.Event()
+        self.buffers = {name: [] for name in ARRAYS}
+        self.blocked = 0.0
+        self.steps = 0
+        # frames buffered once the learner stopped listening, never sent
+        self.dropped = 0
+        self.start = time.perf_counter()
+        _send(self.sock, HELLO, json.dumps({"actor": actor_id}).encode())
+        self.thread = threading.Thread(
+            target=self._receive, name="actor-client", daemon=True
+        )
+        self.thread.start()
+
+    def _receive(self):
+        try:
+            while True:
+                kind, payload = _recv(self.sock)
+                if kind == ACK:
+                    self.credits.release()
+                elif kind == WEIGHTS:
+                    with self.weights_ready:
+                        self.weights = payload
+                        self.weights_ready.notify_all()
+                elif kind == STOP:
+                    break
+        except (EOFError, OSError):
+            pass
+        self.stopped.set()
+        # nothing will be acknowledged anymore, don't leave append() waiting
+        self.credits.release()
+        with self.weights_ready:
+            self.weights_ready.notify_all()
+
+    def latest_weights(self, wait=False):
+        """(weights, version) broadcast since the last call, None if none
+        was or waits for them with `wait`
+        """
+        with self.weights_ready:
+            while wait and self.weights is None and not self.stopped.is_set():
+                self.weights_ready.wait()
+            payload, self.weights = self.weights, None
+        return None if payload is None else decode_weights(payload)
+
+    def _append(self, observation, action, reward, done):
+        self.buffers["observations"].append(pack_observation(observation))
+        self.buffers["actions"].append(action)
+        self.buffers["rewards"].append(reward)
+        self.buffers["dones"].append(done)
+        if len(self.buffers["actions"]) >= self.batch_frames:
+            self.flush()
+
+    def append(self, observation, action, reward, done):
+        """The step taking `action` from `observation`"""
+        self.steps += 1
+        self._append(observation, action, reward, done)
+
+    def end_episode(self, observation):
+        """The observation the episode ended on"""
+        self._append(observation, FINAL_FRAME, 0.0, False)
+
+    def _drop(self, nb_frames):
+        self.dropped += nb_frames
+        distributed_metrics.event(
+            "frames_dropped", actor=self.actor_id, frames=nb_frames, total=self.dropped
+        )
+
+    def flush(self):
+        nb_frames = len(self.buffers["actions"])
+        if not nb_frames:
+            return
+        if self.stopped.is_set():
+            for buffer in self.buffers.values():
+                buffer.clear()
+            self._drop(nb_frames)
+            return
+        arrays = {
+            "observations": np.frombuffer(
+                b"".join(self.buffers["observations"]), dtype=np.uint8
+            ).reshape(len(self.buffers["observations"]), -1)
+        }
+        for name in ("actions", "rewards", "dones"):
+            arrays[name] = np.array(self.buffers[name], dtype=ARRAYS[name])
+        for buffer in self.buffers.values():
+            buffer.clear()
+        start = time.perf_counter()
+        self.credits.acquire()
+        waited = time.perf_counter() - start
+        self.blocked += waited
+        credit_waits.record(waited)
+        meta = {
+            "blocked": self.blocked,
+            "steps_per_sec": self.steps / (time.perf_counter() - self.start),
+        }
+        try:
+            _send(self.sock, TRANSITIONS, encode_arrays(arrays, meta))
+        except OSError:
+            self.stopped.set()
+            self._drop(nb_frames)
+
+    def close(self):
+        self.flush()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.thread.join()
+
+
+class _Connection(object):
+    """An actor as seen by the learner"""
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.actor_id = None
+        self.lock = threading.Lock()
+        self.transitions = []
+        self.frames = 0
+        self.episodes = 0
+        self.batches = 0
+        self.bytes = 0
+        self.blocked = 0.0
+        self.steps_per_sec = 0.0
+        self.connected = time.perf_counter()
+
+    def send(self, kind, payload=b""):
+        with self.lock:
+            try:
+                _send(self.sock, kind, payload)
+            except OSError:
+                # its reader thread sees it gone as well
+                pass
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.connected
+        return {
+            "actor": self.actor_id,
+            "frames": self.frames,
+            "episodes": self.episodes,
+            "batches": self.batches,
+            "bytes": self.bytes,
+            "frames_per_sec": self.frames / elapsed if elapsed else 0.0,
+            "steps_per_sec": self.steps_per_sec,
+            "blocked": self.blocked,
+        }
+
+
+class LearnerServer(object):
+    """Learner end: accept actors on `host`:`port` (0 picks a free port) and
+    hand their finished episodes to the learner
+
+    Every actor has a reader thread putting its batches in a queue of
+    `max_pending` batches. When the learner falls behind the readers block,
+    actors run out of credits and wait instead of piling up transitions.
+    """
+
+    def __init__(self, observation_shape, host="127.0.0.1", port=0, max_pending=16):
+        self.observation_shape = tuple(observation_shape)
+        self.listener = socket.create_server((host, port))
+        self.address = self.listener.getsockname()[:2]
+        self.pending = queue.Queue(max_pending)
+        self.connections = []
+        # (connection, thread) of every reader, see close()
+        self.readers = []
+        self.lock = threading.Lock()
+        self.weights = None
+        self.closed = False
+        self.thread = threading.Thread(
+            target=self._accept, name="learner-accept", daemon=True
+        )
+        self.thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self.listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _Connection(sock, address)
+            reader = threading.Thread(
+                target=self._read, args=(connection,), name="learner-read", daemon=True
+            )
+            with self.lock:
+                if self.closed:
+                    sock.close()
+                    return
+                self.readers.append((connection, reader))
+            reader.start()
+
+    def _read(self, connection):
+        try:
+            kind, payload = _recv(connection.sock)
+            if kind != HELLO:
+                raise EOFError("actors start with a hello")
+            connection.actor_id = json.loads(payload)["actor"]
+            with self.lock:
+                self.connections.append(connection)
+                weights = self.weights
+            if weights is not None:
+                connection.send(WEIGHTS, weights)
+            distributed_metrics.event(
+                "actor_connected", actor=connection.actor_id, address=connection.address
+            )
+            while True:
+                kind, payload = _recv(connection.sock)
+                if kind == TRANSITIONS:
+                    connection.bytes += len(payload)
+                    self._put(connection, payload)
+        except (EOFError, OSError):
+            pass
+        with self.lock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+        distributed_metrics.event("actor_disconnected", **connection.stats())
+        connection.sock.close()
+
+    def _put(self, connection, payload):
+        # blocks while the queue is full, unless the server is closed
+        while not self.closed:
+            try:
+                self.pending.put((connection, payload), timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def receive(self, timeout=None):
+        """(actor id, finished episodes) of the next batch, an episode being
+        ([(observation, action, reward, done)], terminal observation), or
+        None after `timeout` seconds without any
+        """
+        try:
+            connection, payload = self.pending.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        queue_depths.record(self.pending.qsize())
+        # the batch is in the learner's hands, the actor can send another
+        connection.send(ACK)
+        arrays, meta = decode_arrays(payload)
+        observations = unpack_observations(
+            arrays["observations"], self.observation_shape
+        )
+        episodes = []
+        transitions = connection.transitions
+        for observation, action, reward, done in zip(
+            observations, arrays["actions"], arrays["rewards"], arrays["dones"]
+        ):
+            if action == FINAL_FRAME:
+                episodes.append((transitions, observation))
+                transitions = []
+            else:
+                transitions.append(
+                    (observation, int(action), float(reward), bool(done))
+                )
+        connection.transitions = transitions
+        connection.frames += len(observations)
+        connection.episodes += len(episodes)
+        connection.batches += 1
+        connection.blocked = meta.get("blocked", 0.0)
+        connection.steps_per_sec = meta.get("steps_per_sec", 0.0)
+        return connection.actor_id, episodes
+
+    def broadcast_weights(self, weights, version=None):
+        """Send `weights` to every actor, and to the ones connecting later"""
+        payload = encode_weights(weights, version)
+        with self.lock:
+            self.weights = payload
+            connections = list(self.connections)
+        for connection in connections:
+            connection.send(WEIGHTS, payload)
+
+    def stats(self):
+        """Throughput and time spent waiting for credits of every actor"""
+        with self.lock:
+            connections = list(self.connections)
+        return [connection.stats() for connection in connections]
+
+    def report(self):
+        for stats in self.stats():
+            distributed_metrics.event("actor", **stats)
+
+    def close(self):
+        """Tell the actors to stop, close every connection and wait for the
+        reader threads
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            readers = list(self.readers)
+        # close() alone doesn't wake up a blocked accept()
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+        self.thread.join()
+        for connection, _ in readers:
+            connection.send(STOP)
+            # wakes up its reader, blocked in recv()
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for connection, reader in readers:
+            reader.join()
+            connection.sock.close()
@@ -1 +1,3 @@
 from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.envs.batched import BatchedTetrisEnv
+from tetris_ai.envs.vector import SubprocTetrisEnv
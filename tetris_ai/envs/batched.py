@@ -0,0 +1,210 @@
+import numpy as np
+from gym import spaces
+from tetris_ai.game import Actions
+from tetris_ai.numpy_game import CELLS, NB_ROTATIONS, break_lines_batch
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.pieces import PieceGenerator
+
+
+class BatchedTetrisEnv(object):
+    """Step N games of Tetris in lockstep
+
+    All the boards live in a single (N, height, width) array and every step
+    applies go_down followed by the chosen move to all the games at once,
+    following the rules of Tetris/TetrisEnv so the rewards are comparable.
+    Finished games are reset automatically, their last observation is
+    available in `info["terminal_observation"]`.
+    """
+
+    BOARD_HEIGHT = TetrisEnv.BOARD_HEIGHT
+    BOARD_WIDTH = TetrisEnv.BOARD_WIDTH
+    ACTIONS = TetrisEnv.ACTIONS
+
+    def __init__(self, nb_envs, piece_mode="uniform"):
+        self.nb_envs = nb_envs
+        # one generator per game so a game plays the same pieces whatever
+        # the others do
+        self.pieces = [PieceGenerator(mode=piece_mode) for _ in range(nb_envs)]
+        self.observation_space = spaces.Box(
+            low=0,
+            high=1,
+            shape=(nb_envs, self.BOARD_HEIGHT, self.BOARD_WIDTH),
+            dtype=np.uintc,
+        )
+        self.action_space = spaces.MultiDiscrete([len(self.ACTIONS)] * nb_envs)
+        shape = (nb_envs, self.BOARD_HEIGHT, self.BOARD_WIDTH)
+        self.boards = np.zeros(shape, dtype=np.int8)
+        self.has_figure = np.zeros(nb_envs, dtype=bool)
+        self.figure_type = np.zeros(nb_envs, dtype=np.intp)
+        self.figure_rotation = np.zeros(nb_envs, dtype=np.intp)
+        self.figure_x = np.zeros(nb_envs, dtype=np.intp)
+        self.figure_y = np.zeros(nb_envs, dtype=np.intp)
+        self.figure_color = np.zeros(nb_envs, dtype=np.int8)
+        self.scores = np.zeros(nb_envs, dtype=np.intp)
+        self.gameover = np.zeros(nb_envs, dtype=bool)
+        self.counters = np.zeros(nb_envs, dtype=np.intp)
+        # per row occupied cells and longest segment, only updated on freeze
+        self.row_counts = np.zeros(shape[:2], dtype=np.intp)
+        self.row_segments = np.zeros(shape[:2], dtype=np.intp)
+        self.rewards = np.zeros(nb_envs)
+        self.lower_tier_occupied_area = np.zeros(nb_envs, dtype=np.intp)
+        self.upper_tier_occupied_area = np.zeros(nb_envs, dtype=np.intp)
+        self.total_contiguous = np.zeros(nb_envs)
+        # the per action move applied after going down: rotation, dx
+        self.moves = np.array(
+            [
+                (action == Actions.ROTATE, -1 if action == Actions.LEFT else 1)
+                for action in self.ACTIONS
+            ]
+        )
+        self.all_envs = np.arange(nb_envs)
+
+    def seed(self, seed=None):
+        """Seed the game i with `seed + i`"""
+        seeds = [None if seed is None else seed + i for i in range(self.nb_envs)]
+        for pieces, env_seed in zip(self.pieces, seeds):
+            pieces.seed(env_seed)
+        return seeds
+
+    def reset(self):
+        self._reset(self.all_envs)
+        return self._observations()
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        self.counters += 1
+        # like TetrisEnv we get the reward from the previous actions
+        rewards = self._reward()
+        self.rewards += rewards
+        missing = np.flatnonzero(~self.has_figure)
+        if len(missing):
+            self._new_figures(missing)
+        # for each step we move one step downward
+        self.figure_y += 1
+        hit = self._intersects(self.all_envs)
+        self.figure_y[hit] -= 1
+        if hit.any():
+            self._freeze(np.flatnonzero(hit))
+        rotate, dx = self.moves[actions].T
+        rotating = np.flatnonzero(rotate)
+        old_rotation = self.figure_rotation[rotating]
+        self.figure_rotation[rotating] = (old_rotation + 1) % NB_ROTATIONS[
+            self.figure_type[rotating]
+        ]
+        reverted = self._intersects(rotating)
+        self.figure_rotation[rotating[reverted]] = old_rotation[reverted]
+        sliding = np.flatnonzero(~rotate.astype(bool))
+        self.figure_x[sliding] += dx[sliding]
+        reverted = self._intersects(sliding)
+        self.figure_x[sliding[reverted]] -= dx[sliding[reverted]]
+
+        observations = self._observations()
+        dones = self.gameover.copy()
+        info = {}
+        if dones.any():
+            finished = np.flatnonzero(dones)
+            info["terminal_observation"] = observations[finished].copy()
+            self._reset(finished)
+            observations[finished] = 0
+        return observations, rewards, dones, info
+
+    def _reset(self, envs):
+        self.boards[envs] = 0
+        self.row_counts[envs] = 0
+        self.row_segments[envs] = 0
+        self.has_figure[envs] = False
+        self.scores[envs] = 0
+        self.gameover[envs] = False
+        self.counters[envs] = 0
+        self.rewards[envs] = 0
+        self.lower_tier_occupied_area[envs] = 0
+        self.upper_tier_occupied_area[envs] = 0
+        self.total_contiguous[envs] = 0
+
+    def _observations(self):
+        return (self.boards != 0).astype(np.uintc)
+
+    def _new_figures(self, envs):
+        for env in envs:
+            self.figure_type[env], self.figure_color[env] = self.pieces[env].next()
+        self.figure_rotation[envs] = 0
+        self.figure_x[envs] = 3
+        self.figure_y[envs] = 0
+        self.has_figure[envs] = True
+
+    def _cells(self, envs):
+        cells = CELLS[self.figure_type[envs], self.figure_rotation[envs]]
+        ys = self.figure_y[envs, None] + cells[..., 0]
+        xs = self.figure_x[envs, None] + cells[..., 1]
+        return ys, xs
+
+    def _intersects(self, envs):
+        ys, xs = self._cells(envs)
+        outside = (ys > self.BOARD_HEIGHT - 1) | (xs > self.BOARD_WIDTH - 1) | (xs < 0)
+        occupied = (
+            self.boards[
+                envs[:, None],
+                np.minimum(ys, self.BOARD_HEIGHT - 1),
+                np.clip(xs, 0, self.BOARD_WIDTH - 1),
+            ]
+            != 0
+        )
+        return (outside | occupied).any(axis=1)
+
+    def _freeze(self, envs):
+        ys, xs = self._cells(envs)
+        self.boards[envs[:, None], ys, xs] = self.figure_color[envs, None]
+        self._break_lines(envs)
+        self._update_row_features(envs)
+        self._new_figures(envs)
+        self.gameover[envs[self._intersects(envs)]] = True
+
+    def _break_lines(self, envs):
+        boards = self.boards[envs]
+        self.scores[envs] = break_lines_batch(boards)
+        self.boards[envs] = boards
+
+    def _update_row_features(self, envs):
+        occupied = self.boards[envs] != 0
+        self.row_counts[envs] = occupied.sum(axis=2)
+        segment_size = np.zeros(occupied.shape[:2], dtype=np.intp)
+        max_segment = np.zeros(occupied.shape[:2], dtype=np.intp)
+        for column in range(self.BOARD_WIDTH):
+            segment_size = (segment_size + 1) * occupied[:, :, column]
+            np.maximum(max_segment, segment_size, out=max_segment)
+        self.row_segments[envs] = max_segment
+
+    def _reward(self):
+        rows_cleared = self.scores
+        positive, negative = self._get_occupied_area_rewards()
+        low_rows = self._get_low_rows_rewards()
+        return rows_cleared + positive + negative + low_rows
+
+    def _get_low_rows_rewards(self):
+        nb_low_rows = 5
+        low_rows = self.row_segments[:, self.BOARD_HEIGHT - nb_low_rows :]
+        # sum row by row to get the exact same floats as TetrisEnv
+        total_contiguous = np.zeros(self.nb_envs)
+        for row in range(nb_low_rows):
+            total_contiguous += low_rows[:, row] / self.BOARD_WIDTH
+        delta_contiguous = total_contiguous - self.total_contiguous
+        self.total_contiguous = total_contiguous
+        return delta_contiguous / nb_low_rows
+
+    def _get_occupied_area_rewards(self):
+        third_height = self.BOARD_HEIGHT // 3 + 1
+        third_surface_area = third_height * self.BOARD_WIDTH
+        lower_tier_occupied_area = self.row_counts[:, 2 * third_height :].sum(axis=1)
+        upper_tier_occupied_area = self.row_counts[:, :third_height].sum(axis=1)
+        positive_reward_occupied_aread = (
+            lower_tier_occupied_area - self.lower_tier_occupied_area
+        )
+        negative_reward_occupied_aread = (
+            upper_tier_occupied_area - self.upper_tier_occupied_area
+        )
+        self.lower_tier_occupied_area = lower_tier_occupied_area
+        self.upper_tier_occupied_area = upper_tier_occupied_area
+        return (
+            (positive_reward_occupied_aread / third_surface_area),
+            (negative_reward_occupied_aread / third_surface_area),
+        )
@@ -1,18 +1,57 @@
+from collections import namedtuple
 import gym
-from sys import stderr
 from gym import spaces
 from tetris_ai.game import *
+from tetris_ai.numpy_game import NumpyTetris
+from tetris_ai.bitboard_game import BitboardTetris
+from tetris_ai.frames import FrameRenderer
+from tetris_ai.numpy_game import CELLS
+from tetris_ai.pieces import PieceGenerator
+from tetris_ai.placements import afterstates, reachable_placements
 import numpy as np
-from termcolor import colored
+from tetris_ai.metrics import metrics
+
+# game engines the environment can run on, they all share the Tetris API
+ENGINES = {
+    "python": Tetris,
+    "numpy": NumpyTetris,
+    "bitboard": BitboardTetris,
+}
+
+# what the observation holds: only the locked cells, the locked cells and the
+# falling figure as two planes or both merged in a single plane
+OBSERVATION_MODES = ("board", "planes", "merged")
+
+# what an action is: a move of the falling figure repeated for action_repeat
+# ticks, a move repeated every tick until the figure locks or where to lock it
+ACTION_MODES = ("move", "lock", "placement")
+
+# immutable copy of an env, see TetrisEnv.clone_state()
+EnvState = namedtuple(
+    "EnvState",
+    [
+        "game",
+        "pieces",
+        "counter",
+        "reward",
+        "lower_tier_occupied_area",
+        "upper_tier_occupied_area",
+        "total_contiguous",
+    ],
+)
+
+env_metrics = metrics.component("env", sample_every=25)
+steps_counter = env_metrics.counter("steps")
 
 
 class TetrisEnv(gym.Env):
-    metadata = {"render.modes": ["human"]}
+    metadata = {"render.modes": ["human", "rgb_array"]}
 
     BOARD_HEIGHT = 20
     BOARD_WIDTH = 10
 
     drawer = None
+    frames = None
     game = None
     applier = ActionApplier()
     counter = 0
@@ -20,7 +59,6 @@ class TetrisEnv(gym.Env):
     upper_tier_occupied_area = 0
     total_contiguous = 0
     reward = 0
-    log_sampling = 25
     ROTATE_WEIGHT = 2
     SIDE_WEIGHT = 4
     ACTIONS = (
@@ -29,86 +67,280 @@ class TetrisEnv(gym.Env):
         + [Actions.RIGHT] * SIDE_WEIGHT
     )
 
-    def __init__(self):
+    def __init__(
+        self,
+        engine="python",
+        observation_mode=None,
+        action_mode="move",
+        piece_mode="uniform",
+        preview=0,
+        action_repeat=1,
+    ):
+        if observation_mode is None:
+            # a placement is chosen for the falling figure, it has to be seen
+            observation_mode = "merged" if action_mode == "placement" else "board"
+        if observation_mode not in OBSERVATION_MODES:
+            raise ValueError(f"unknown observation mode {observation_mode}")
+        if action_mode not in ACTION_MODES:
+            raise ValueError(f"unknown action mode {action_mode}")
+        if action_repeat < 1:
+            raise ValueError("action_repeat must be at least 1")
+        self.engine = ENGINES[engine]
+        self.observation_mode = observation_mode
+        self.action_mode = action_mode
+        # ticks, a forced go_down and the move, played for every move
+        self.action_repeat = action_repeat
+        # the figures are drawn from this generator for every game, see seed()
+        self.pieces = PieceGenerator(mode=piece_mode)
+        self.preview = preview
         # observation_space is the tetris "screen", height x width of 0/1
-        # wheter the space is occupied by a piece or not
-        self.observation_space = spaces.Box(
-            low=0,
-            high=1,
-            shape=(TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH),
-            dtype=np.uintc,
-        )
+        # wheter the space is occupied by a piece or not. The next `preview`
+        # figures are drawn at their starting position on planes of their own
+        shape = (TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH)
+        nb_planes = (2 if observation_mode == "planes" else 1) + preview
+        if nb_planes > 1:
+            shape = (nb_planes,) + shape
+        self.observation_space = spaces.Box(low=0, high=1, shape=shape, dtype=np.uintc)
+        # observations are written in place, the board is only refreshed when
+        # the game reports its locked cells changed
+        self.observation = np.zeros(shape, dtype=self.observation_space.dtype)
+        planes = self.observation.reshape((nb_planes,) + shape[-2:])
+        if observation_mode == "merged":
+            self.board = np.zeros_like(planes[0])
+        else:
+            self.board = planes[0]
+        self.figure_plane = planes[0] if observation_mode == "merged" else None
+        if observation_mode == "planes":
+            self.figure_plane = planes[1]
+        self.preview_planes = planes[nb_planes - preview :]
+        self.board_version = None
+        self.previewed = None
+        # board the reward was last computed on, see step()
+        self.rewarded_version = None
         # action_space is the possible movements "downgraded" to a one
         # dimensional space. Remove the ability to QUIT/DOWN/SPACE since we do
         # not want the agent to chose those. We also skew the choice so ROTATE
         # is less frequent than RIGHT/LEFT
         self.action_space = spaces.Discrete(len(TetrisEnv.ACTIONS))
+        if action_mode == "placement":
+            # a rotation and the column of the leftmost cell of the figure
+            self.action_space = spaces.Discrete(CELLS.shape[1] * TetrisEnv.BOARD_WIDTH)
 
     def step(self, action):
-        self.counter += 1
+        if self.action_mode == "placement":
+            return self._place(action)
         action_to_perform = Actions(TetrisEnv.ACTIONS[action])
-        # we actually get the reward from the previous action given that the
-        # one passed in isn't applied yet
-        reward = self._reward()
-        self.reward += reward
-        if self.counter % self.log_sampling == 0:
-            print(
-                colored(
-                    f"step {self.counter}({self.reward:.5f}): {action_to_perform}",
-                    "green",
-                ),
-                file=stderr,
-            )
-        # game.figure is the piece that we control/that is going down
-        if self.game.figure is None:
-            self.game.new_figure()
-        # for each step we move one step downward
-        self.game.go_down()
-        self.applier.apply_actions([action_to_perform], self.game)
-        return self._game_to_observation(), reward, self.game.is_done(), {}
+        game = self.game
+        reward = 0.0
+        ticks = 0
+        # only the observation of the last tick is built, and the boards the
+        # ticks didn't change have nothing but the last lines to reward
+        while True:
+            self.counter += 1
+            # we actually get the reward from the previous action given that
+            # the one passed in isn't applied yet
+            if self.rewarded_version != game.board_version or env_metrics.sampled(
+                self.counter
+            ):
+                self.rewarded_version = game.board_version
+                tick_reward = self._reward()
+            else:
+                tick_reward = float(game.score)
+            reward += tick_reward
+            self.reward += tick_reward
+            steps_counter.inc()
+            if env_metrics.sampled(self.counter):
+                env_metrics.event(
+                    "step",
+                    step=self.counter,
+                    reward=self.reward,
+                    action=action_to_perform.name,
+                )
+            # game.figure is the piece that we control/that is going down
+            if game.figure is None:
+                game.new_figure()
+            figure = game.figure
+            # for each step we move one step downward
+            game.go_down()
+            self.applier.apply_actions([action_to_perform], game)
+            ticks += 1
+            if game.is_done():
+                break
+            if self.action_mode == "lock":
+                # freeze() already brought the next figure in
+                if game.figure is not figure:
+                    break
+            elif ticks == self.action_repeat:
+                break
+        return self._game_to_observation(), reward, game.is_done(), {}
+
+    def seed(self, seed=None):
+        self.pieces.seed(seed)
+        return [seed]
 
     def reset(self):
-        self.drawer = TetrisDrawer()
-        self.game = Tetris(TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH)
+        self.game = self.engine(
+            TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH, self.pieces
+        )
         self.counter = 0
         self.reward = 0
         self.lower_tier_occupied_area = 0
         self.upper_tier_occupied_area = 0
         self.total_contiguous = 0
+        self.board_version = None
+        self.previewed = None
+        self.rewarded_version = None
+        if self.action_mode == "placement":
+            # the agent needs to see the figure to place it
+            self.game.new_figure()
         return self._game_to_observation()
 
+    def clone_state(self):
+        """Immutable copy of the game, the upcoming pieces and the reward
+        accumulators to try moves from and come back to with restore_state()
+        """
+        return EnvState(
+            self.game.snapshot(),
+            self.pieces.snapshot(),
+            self.counter,
+            self.reward,
+            self.lower_tier_occupied_area,
+            self.upper_tier_occupied_area,
+            self.total_contiguous,
+        )
+
+    def restore_state(self, state):
+        self.game.restore(state.game)
+        self.pieces.restore(state.pieces)
+        self.counter = state.counter
+        self.reward = state.reward
+        self.lower_tier_occupied_area = state.lower_tier_occupied_area
+        self.upper_tier_occupied_area = state.upper_tier_occupied_area
+        self.total_contiguous = state.total_contiguous
+        self.previewed = None
+        self.rewarded_version = None
+
+    def placement_action(self, rotation, x):
+        """Action locking the current figure with `rotation` at `x`"""
+        cells = CELLS[self.game.figure.type, rotation]
+        return rotation * TetrisEnv.BOARD_WIDTH + x + cells[:, 1].min()
+
+    def placements(self):
+        """(rotation, x, y) of every position the current figure can reach"""
+        return reachable_placements(self.game)
+
+    def afterstates(self):
+        """Every action of the placement mode along with the board it leads
+        to and the number of lines it breaks, as arrays to be scored at once
+        """
+        placements = self.placements()
+        boards, lines = afterstates(self.game, placements)
+        actions = np.array([self.placement_action(r, x) for r, x, _ in placements])
+        return actions, (boards != 0).astype(self.observation_space.dtype), lines
+
+    def _place(self, action):
+        """Lock the figure with the rotation and column of `action`, the
+        closest reachable placement when it can't get there. With nowhere to
+        lock it, once the game is over, the episode ends
+        """
+        self.counter += 1
+        rotation, column = divmod(int(action), TetrisEnv.BOARD_WIDTH)
+        figure = self.game.figure
+        placements = [] if figure is None else self.placements()
+        if not placements:
+            # nowhere to lock the figure, stepping a game already over
+            self.game.gameover()
+            return self._game_to_observation(), 0.0, True, {}
+        rotation %= len(figure.figures[figure.type])
+        # unreachable placements fall back to the closest reachable one
+        rotation, x, y = min(
+            placements,
+            key=lambda p: (
+                p[0] != rotation,
+                abs(self.placement_action(p[0], p[1]) % TetrisEnv.BOARD_WIDTH - column),
+            ),
+        )
+        figure.rotation = rotation
+        figure.x = x
+        figure.y = y
+        self.game.freeze()
+        # unlike moves, the reward is the one of the placement just made
+        reward = self._reward()
+        self.reward += reward
+        return self._game_to_observation(), reward, self.game.is_done(), {}
+
     def render(self, mode="human"):
+        if self.game is None:
+            raise gym.error.ResetNeeded("call reset() before render()")
+        if mode == "rgb_array":
+            # the board as a reusable (height * zoom, width * zoom, 3) image,
+            # drawn with NumPy so it works without a display
+            if self.frames is None:
+                self.frames = FrameRenderer(
+                    TetrisEnv.BOARD_HEIGHT, TetrisEnv.BOARD_WIDTH, self.game.zoom
+                )
+            return self.frames.render(self.game)
+        if mode != "human":
+            raise ValueError(f"unknown render mode {mode}")
+        if self.drawer is None:
+            # pygame is only imported once something is actually rendered
+            from tetris_ai.render import TetrisDrawer
+
+            self.drawer = TetrisDrawer()
         self.drawer.render(self.game, self._get_display_info())
 
     def close(self):
-        self.drawer.close()
+        if self.drawer is not None:
+            self.drawer.close()
+            self.drawer = None
 
     def _get_display_info(self):
         return f"step {self.counter}({self.reward:.5f})"
 
     def _game_to_observation(self):
-        """returns a 2d array of booleans representing whether or not a piece
-        is in position (x,y)
+        """returns a 2d array of 0/1 representing whether or not a piece is in
+        position (x,y), with the falling figure on a second plane or merged in
+        depending on the observation mode, followed by the preview planes.
+
+        The same preallocated array is returned on every step, copy it to keep
+        it around (keras-rl already does).
         """
-        observation = []
-        for i in range(TetrisEnv.BOARD_HEIGHT):
-            new_line = []
-            for j in range(TetrisEnv.BOARD_WIDTH):
-                new_line.append(bool(self.game.field[i][j]))
-            observation.append(new_line)
-        return observation
+        if self.board_version != self.game.board_version:
+            self.board_version = self.game.board_version
+            np.not_equal(self.game.field, 0, out=self.board, casting="unsafe")
+        if self.preview and self.previewed != self.pieces.drawn:
+            # the queue only moves when a figure is drawn
+            self.previewed = self.pieces.drawn
+            self.preview_planes.fill(0)
+            for plane, figure_type in zip(
+                self.preview_planes, self.pieces.preview(self.preview)
+            ):
+                for i, j in GEOMETRY[figure_type][0].spawn_cells:
+                    plane[i, j] = 1
+        if self.observation_mode == "board":
+            return self.observation
+        figure_plane = self.figure_plane
+        if self.observation_mode == "planes":
+            figure_plane.fill(0)
+        else:
+            np.copyto(figure_plane, self.board)
+        figure = self.game.figure
+        if figure is not None:
+            for dy, dx in figure.cells():
+                figure_plane[figure.y + dy, figure.x + dx] = 1
+        return self.observation
 
     def _reward(self):
         rows_cleared = self.game.score
         positive, negative = self._get_occupied_area_rewards()
         low_rows = self._get_low_rows_rewards()
-        if self.counter % self.log_sampling == 0:
-            print(
-                colored(
-                    f"{rows_cleared} + {positive:.5f} - {negative:.5f} + {low_rows:.5f}",
-                    "green",
-                ),
-                file=stderr,
+        if env_metrics.sampled(self.counter):
+            env_metrics.event(
+                "reward",
+                rows_cleared=rows_cleared,
+                positive=positive,
+                negative=negative,
+                low_rows=low_rows,
             )
         return rows_cleared + positive + negative + low_rows
 
@@ -117,18 +349,9 @@ class TetrisEnv(gym.Env):
         as a ratio of the row length and sum.
         """
         nb_low_rows = 5
-        low_rows = self.game.field[TetrisEnv.BOARD_HEIGHT - nb_low_rows :]
+        low_rows = self.game.row_segments[TetrisEnv.BOARD_HEIGHT - nb_low_rows :]
         total_contiguous = 0
-        for row in low_rows:
-            segment_size = 0
-            max_segment = 0
-            previous = None
-            for column in row:
-                if column != 0:
-                    segment_size += 1
-                    max_segment = max(max_segment, segment_size)
-                else:
-                    segment_size = 0
+        for max_segment in low_rows:
             total_contiguous += max_segment / TetrisEnv.BOARD_WIDTH
         delta_contiguous = total_contiguous - self.total_contiguous
         self.total_contiguous = total_contiguous
@@ -137,17 +360,10 @@ class TetrisEnv(gym.Env):
     def _get_occupied_area_rewards(self):
         third_height = TetrisEnv.BOARD_HEIGHT // 3 + 1
         third_surface_area = third_height * TetrisEnv.BOARD_WIDTH
-        lower_tier_occupied_area = 0
-        upper_tier_occupied_area = 0
-        for i in range(TetrisEnv.BOARD_HEIGHT):
-            for j in range(TetrisEnv.BOARD_WIDTH):
-                if self.game.field[i][j] != 0:
-                    # (0, 0) is top left so we need i to be greater than 2
-                    # times a third of the height
-                    if i >= 2 * third_height:
-                        lower_tier_occupied_area += 1
-                    if i < third_height:
-                        upper_tier_occupied_area += 1
+        # the game keeps track of the occupied cells in the lower and upper
+        # third of the board as figures are frozen and lines broken
+        lower_tier_occupied_area = self.game.lower_tier_occupied
+        upper_tier_occupied_area = self.game.upper_tier_occupied
         positive_reward_occupied_aread = (
             lower_tier_occupied_area - self.lower_tier_occupied_area
         )
@@ -0,0 +1,168 @@
+import ctypes
+import multiprocessing
+import os
+import random
+import numpy as np
+from tetris_ai.envs.tetris import TetrisEnv
+
+
+def _worker(core, start, stop, env_kwargs, buffers, pipe):
+    """Run the TetrisEnv instances [start, stop) and write their results in
+    the shared buffers, the pipe only carries commands
+    """
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+    observations, terminal_observations, rewards, dones, actions = [
+        np.frombuffer(buffer, dtype=dtype).reshape(shape)
+        for buffer, dtype, shape in buffers
+    ]
+    envs = [TetrisEnv(**env_kwargs) for _ in range(start, stop)]
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "step":
+                for i, env in enumerate(envs, start):
+                    observation, reward, done, _ = env.step(actions[i])
+                    rewards[i] = reward
+                    dones[i] = done
+                    if done:
+                        terminal_observations[i] = observation
+                        observation = env.reset()
+                    observations[i] = observation
+            elif command == "reset":
+                for i, env in enumerate(envs, start):
+                    observations[i] = env.reset()
+            elif command == "seed":
+                for i, env in enumerate(envs, start):
+                    env.seed(None if data is None else data + i)
+                # for anything else drawing from the process wide generators,
+                # seeded from the OS without a seed
+                seed = None if data is None else data + start
+                random.seed(seed)
+                np.random.seed(seed)
+            elif command == "close":
+                for env in envs:
+                    env.close()
+                pipe.send(None)
+                break
+            pipe.send(None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipe.close()
+
+
+class SubprocTetrisEnv(object):
+    """Run many TetrisEnv in worker processes pinned to cores
+
+    Actions are written for all the envs at once in a shared buffer and the
+    workers write back observations, rewards and done flags in shared buffers
+    so nothing but a short command is pickled on each step. Finished games are
+    reset automatically, their last observation is available in
+    `info["terminal_observation"]` like BatchedTetrisEnv.
+    """
+
+    BOARD_HEIGHT = TetrisEnv.BOARD_HEIGHT
+    BOARD_WIDTH = TetrisEnv.BOARD_WIDTH
+    ACTIONS = TetrisEnv.ACTIONS
+
+    def __init__(
+        self,
+        nb_envs,
+        nb_workers=None,
+        env_kwargs=None,
+        pin_workers=True,
+        start_method="spawn",
+    ):
+        self.nb_envs = nb_envs
+        if hasattr(os, "sched_getaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+        else:
+            cores = list(range(os.cpu_count() or 1))
+            # no way to pin a process on this platform
+            pin_workers = False
+        self.nb_workers = min(nb_workers or len(cores), nb_envs)
+        context = multiprocessing.get_context(start_method)
+        self.observation_space = TetrisEnv(**(env_kwargs or {})).observation_space
+        shape = (nb_envs,) + self.observation_space.shape
+        buffers = [
+            (context.RawArray(ctypes.c_uint, int(np.prod(shape))), np.uintc, shape),
+            (context.RawArray(ctypes.c_uint, int(np.prod(shape))), np.uintc, shape),
+            (context.RawArray(ctypes.c_double, nb_envs), np.float64, (nb_envs,)),
+            (context.RawArray(ctypes.c_bool, nb_envs), np.bool_, (nb_envs,)),
+            (context.RawArray(ctypes.c_int64, nb_envs), np.int64, (nb_envs,)),
+        ]
+        (
+            self.observations,
+            self.terminal_observations,
+            self.rewards,
+            self.dones,
+            self.actions,
+        ) = [
+            np.frombuffer(buffer, dtype=dtype).reshape(shape)
+            for buffer, dtype, shape in buffers
+        ]
+        bounds = np.linspace(0, nb_envs, self.nb_workers + 1).astype(int).tolist()
+        self.pipes = []
+        self.processes = []
+        for index in range(self.nb_workers):
+            parent, child = context.Pipe()
+            core = cores[index % len(cores)] if pin_workers else None
+            process = context.Process(
+                target=_worker,
+                args=(
+                    core,
+                    bounds[index],
+                    bounds[index + 1],
+                    env_kwargs or {},
+                    buffers,
+                    child,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+        self.closed = False
+
+    def _broadcast(self, command, data=None):
+        for pipe in self.pipes:
+            pipe.send((command, data))
+        for pipe in self.pipes:
+            pipe.recv()
+
+    def seed(self, seed=None):
+        """Seed every env with `seed + env index`, each worker also seeds its
+        process wide generators with the index of its first env. Without a
+        seed every env draws one from the OS like gym does
+        """
+        self._broadcast("seed", seed)
+        if seed is None:
+            return [None] * self.nb_envs
+        return [seed + i for i in range(self.nb_envs)]
+
+    def reset(self):
+        self._broadcast("reset")
+        return self.observations.copy()
+
+    def step(self, actions):
+        self.actions[:] = actions
+        self._broadcast("step")
+        info = {}
+        if self.dones.any():
+            info["terminal_observation"] = self.terminal_observations[self.dones]
+        return (
+            self.observations.copy(),
+            self.rewards.copy(),
+            self.dones.copy(),
+            info,
+        )
+
+    def close(self):
+        if self.closed:
+            return
+        self._broadcast("close")
+        for process in self.processes:
+            process.join()
+        self.closed = True
@@ -0,0 +1,270 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+import traceback
+import numpy as np
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.inference import receive
+
+# what is measured on every episode
+STATS = ("reward", "lines", "pieces", "length")
+
+
+def _evaluator(client, env_kwargs, seeds, max_steps, results):
+    """Play the episodes of `seeds` greedily on the server's Q-values, as
+    many at once as the client has rows, and put ("episode", the seed and
+    STATS) of each of them in `results`, or ("error", traceback)
+    """
+    try:
+        _play_episodes(client, env_kwargs, list(seeds), max_steps, results)
+    except Exception:
+        results.put(("error", traceback.format_exc()))
+    finally:
+        client.close()
+
+
+def _play_episodes(client, env_kwargs, seeds, max_steps, results):
+    envs = []
+    observations = []
+    episodes = []
+    while seeds or envs:
+        # finished envs are replaced by the next episodes
+        while seeds and len(envs) < client.nb_rows:
+            env = TetrisEnv(**env_kwargs)
+            env.seed(seeds[0])
+            observations.append(np.array(env.reset(), dtype=np.float32))
+            envs.append(env)
+            episodes.append(
+                dict(seed=seeds.pop(0), reward=0.0, lines=0, pieces=0, length=0)
+            )
+        q_values = client.predict(np.array(observations))
+        for i in reversed(range(len(envs))):
+            env = envs[i]
+            episode = episodes[i]
+            figure = env.game.figure
+            observation, reward, done, _ = env.step(int(np.argmax(q_values[i])))
+            episode["reward"] += reward
+            episode["length"] += 1
+            if figure is not None and env.game.figure is not figure:
+                # a figure locked, game.score holds the lines it broke (a
+                # step only locks one unless action_repeat is more than 1)
+                episode["pieces"] += 1
+                episode["lines"] += env.game.score
+            truncated = episode["length"] >= max_steps
+            if done or truncated:
+                episode["truncated"] = truncated and not done
+                results.put(("episode", episode))
+                env.close()
+                del envs[i], observations[i], episodes[i]
+            else:
+                observations[i] = observation
+
+
+def evaluate(
+    server, nb_episodes, seed=0, env_kwargs=None, max_steps=10000, start_method="spawn"
+):
+    """Play `nb_episodes` episodes, episode i seeded with `seed + i`, in a
+    worker process per client of `server`, choosing the actions greedily on
+    its Q-values like agent.test does
+
+    Games longer than `max_steps` steps are cut short. Returns an array of
+    each of STATS and of "truncated", ordered by episode, and the seconds it
+    took. A worker dying or raising raises here, the other workers are
+    terminated.
+    """
+    context = multiprocessing.get_context(start_method)
+    results = context.Queue()
+    processes = []
+    nb_clients = len(server.clients)
+    for index, client in enumerate(server.clients):
+        seeds = [seed + i for i in range(index, nb_episodes, nb_clients)]
+        process = context.Process(
+            target=_evaluator,
+            args=(client, env_kwargs or {}, seeds, max_steps, results),
+            daemon=True,
+        )
+        processes.append(process)
+    finished = False
+    try:
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        episodes = sorted(
+            (receive(results, processes) for _ in range(nb_episodes)),
+            key=lambda e: e["seed"],
+        )
+        duration = time.perf_counter() - start
+        finished = True
+    finally:
+        for process in processes:
+            if process.pid is None:
+                continue
+            # the others may wait forever for a server left behind
+            if not finished:
+                process.terminate()
+            process.join()
+        results.close()
+    stats = {
+        name: np.array([episode[name] for episode in episodes])
+        for name in STATS + ("truncated",)
+    }
+    return stats, duration
+
+
+def bootstrap_mean(values, confidence=0.95, nb_resamples=2000, seed=0):
+    """Percentile bootstrap confidence interval of the mean of `values`"""
+    values = np.asarray(values, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    means = np.empty(nb_resamples)
+    # resampled in chunks to bound the memory on many episodes
+    chunk = max(1, 1000000 // max(len(values), 1))
+    for start in range(0, nb_resamples, chunk):
+        count = min(chunk, nb_resamples - start)
+        indices = rng.integers(0, len(values), (count, len(values)))
+        means[start : start + count] = values[indices].mean(axis=1)
+    tail = (1.0 - confidence) / 2 * 100
+    low, high = np.percentile(means, [tail, 100 - tail])
+    return low, high
+
+
+def summarize(values, baseline=None, confidence=0.95):
+    """Distribution of `values` with a confidence interval of its mean, and
+    of its mean difference with the `baseline` values of the same episodes
+    """
+    values = np.asarray(values, dtype=np.float64)
+    low, high = bootstrap_mean(values, confidence)
+    summary = {
+        "episodes": len(values),
+        "mean": values.mean(),
+        "ci_low": low,
+        "ci_high": high,
+        "std": values.std(),
+        "min": values.min(),
+        "p10": np.percentile(values, 10),
+        "p50": np.percentile(values, 50),
+        "p90": np.percentile(values, 90),
+        "max": values.max(),
+    }
+    if baseline is not None:
+        # the same seeds give both the same figures, compare them pairwise
+        differences = values - np.asarray(baseline, dtype=np.float64)
+        low, high = bootstrap_mean(differences, confidence)
+        summary.update(delta=differences.mean(), delta_ci_low=low, delta_ci_high=high)
+    return summary
+
+
+TABLE_FIELDS = [
+    "weights",
+    "stat",
+    "episodes",
+    "truncated",
+    "mean",
+    "ci_low",
+    "ci_high",
+    "std",
+    "min",
+    "p10",
+    "p50",
+    "p90",
+    "max",
+    "delta",
+    "delta_ci_low",
+    "delta_ci_high",
+]
+
+
+def results_table(results, confidence=0.95):
+    """Rows of TABLE_FIELDS for {weights: stats} in their order, the deltas
+    being against the first weights
+    """
+    rows = []
+    baseline = None
+    for weights, stats in results.items():
+        for name in STATS:
+            summary = summarize(
+                stats[name],
+                None if baseline is None else baseline[name],
+                confidence,
+            )
+            rows.append(
+                dict(
+                    summary,
+                    weights=weights,
+                    stat=name,
+                    truncated=int(stats["truncated"].sum()),
+                )
+            )
+        if baseline is None:
+            baseline = stats
+    return rows
+
+
+def write_table(path, rows):
+    with open(path, "w", newline="") as output:
+        writer = csv.DictWriter(output, TABLE_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_table(rows):
+    for row in rows:
+        line = (
+            f"{os.path.basename(row['weights']):32} {row['stat']:7} "
+            f"{row['mean']:10.3f} [{row['ci_low']:10.3f}, {row['ci_high']:10.3f}] "
+            f"p50={row['p50']:.1f} max={row['max']:.1f}"
+        )
+        if "delta" in row:
+            line += (
+                f" delta={row['delta']:+.3f} "
+                f"[{row['delta_ci_low']:+.3f}, {row['delta_ci_high']:+.3f}]"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="evaluate weight files on the same seeded episodes"
+    )
+    parser.add_argument("weights", nargs="+", help="weight files to compare")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--envs-per-worker",
+        type=int,
+        default=4,
+        help="episodes every worker plays at once, the rows of its requests",
+    )
+    parser.add_argument("--max-steps", type=int, default=10000)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--output", default="evaluation.csv")
+    args = parser.parse_args()
+
+    import gym
+    from tetris_ai.train import get_agent, serve_q_values
+
+    env = gym.make("tetris_ai:tetris_gym-v0")
+    agent, _ = get_agent(env)
+    results = {}
+    for weights in args.weights:
+        agent.load_weights(os.path.abspath(weights))
+        server = serve_q_values(
+            agent,
+            args.workers,
+            rows_per_client=args.envs_per_worker,
+            max_batch_size=args.max_batch_size,
+        )
+        try:
+            results[weights], duration = evaluate(
+                server, args.episodes, args.seed, max_steps=args.max_steps
+            )
+        finally:
+            server.close()
+        steps = results[weights]["length"].sum()
+        print(f"{weights}: {args.episodes} episodes, {steps / duration:.0f} steps/s")
+    rows = results_table(results, args.confidence)
+    print_table(rows)
+    write_table(args.output, rows)
@@ -0,0 +1,136 @@
+import gzip
+import json
+import queue
+import threading
+import numpy as np
+from tetris_ai.game import colors
+
+# the colors of TetrisDrawer
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+RED = (255, 128, 128)
+GREEN = (128, 255, 128)
+
+
+class FrameRenderer(object):
+    """Draw games in a (height * zoom, width * zoom, 3) uint8 image the way
+    TetrisDrawer draws the board, with NumPy only so it runs without pygame
+    or a display
+
+    The board is only drawn again when the game reports its locked cells
+    changed, every frame is a copy of it with the falling figure on top.
+    The same image is returned every time, copy it to keep it around.
+    """
+
+    def __init__(self, height, width, zoom=20):
+        self.height = height
+        self.width = width
+        self.zoom = zoom
+        self.palette = np.array(colors, dtype=np.uint8)
+        self.background = np.empty((height * zoom, width * zoom, 3), dtype=np.uint8)
+        self.background[:] = WHITE
+        third = height // 3 + 1
+        for i in range(height):
+            color = GRAY
+            if i >= 2 * third:
+                color = GREEN
+            if i < third:
+                color = RED
+            cells = self.background[i * zoom : (i + 1) * zoom]
+            for j in range(width):
+                cell = cells[:, j * zoom : (j + 1) * zoom]
+                cell[[0, -1], :] = color
+                cell[:, [0, -1]] = color
+        self.board = self.background.copy()
+        self.image = np.empty_like(self.background)
+        self.game = None
+        self.board_version = None
+        self.drawn_field = np.zeros((height, width), dtype=np.int64)
+
+    def _cell(self, image, i, j):
+        zoom = self.zoom
+        return image[i * zoom : (i + 1) * zoom, j * zoom : (j + 1) * zoom]
+
+    def _draw_board(self, game):
+        field = np.asarray(game.field, dtype=np.int64)
+        for i, j in zip(*np.nonzero(field != self.drawn_field)):
+            cell = self._cell(self.board, i, j)
+            cell[:] = self._cell(self.background, i, j)
+            if field[i, j] > 0:
+                # like TetrisDrawer, locked cells go down to the bottom edge
+                cell[1:, 1:-1] = self.palette[field[i, j]]
+        self.drawn_field = field
+
+    def render(self, game):
+        if game is not self.game or game.board_version != self.board_version:
+            self.game = game
+            self.board_version = game.board_version
+            self._draw_board(game)
+        image = self.image
+        np.copyto(image, self.board)
+        figure = game.figure
+        if figure is not None:
+            color = self.palette[figure.color]
+            for dy, dx in figure.cells():
+                cell = self._cell(image, figure.y + dy, figure.x + dx)
+                cell[1:-1, 1:-1] = color
+        return image
+
+
+class VideoWriter(object):
+    """Stream frames to a gzip file from a background thread so the caller
+    never waits on the compression
+
+    The file is a json header line with the shape of the frames and the fps
+    followed by the raw frames, see read_video(). Up to `max_pending` frames
+    are queued before write() blocks.
+    """
+
+    def __init__(self, path, shape, fps=25, compresslevel=1, max_pending=256):
+        self.path = path
+        self.shape = tuple(shape)
+        self.frames = queue.Queue(max_pending)
+        self.file = gzip.open(path, "wb", compresslevel=compresslevel)
+        header = {"shape": list(self.shape), "dtype": "uint8", "fps": fps}
+        self.file.write((json.dumps(header) + "\n").encode())
+        self.nb_frames = 0
+        self.closed = False
+        self.thread = threading.Thread(
+            target=self._write, name="video-writer", daemon=True
+        )
+        self.thread.start()
+
+    def _write(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            self.file.write(frame)
+        self.file.close()
+
+    def write(self, frame):
+        if frame.shape != self.shape:
+            raise ValueError(f"frame of shape {frame.shape}, expected {self.shape}")
+        # the renderers reuse their image
+        self.frames.put(np.asarray(frame, dtype=np.uint8).tobytes())
+        self.nb_frames += 1
+
+    def close(self, wait=True):
+        """Write what's left and close the file, in the background unless
+        `wait`
+        """
+        if not self.closed:
+            self.closed = True
+            self.frames.put(None)
+        if wait:
+            self.thread.join()
+
+
+def read_video(path):
+    """(frames, fps) of a file written by VideoWriter"""
+    with gzip.open(path, "rb") as video:
+        header = json.loads(video.readline())
+        data = video.read()
+    shape = tuple(header["shape"])
+    frames = np.frombuffer(data, dtype=header["dtype"]).reshape((-1,) + shape)
+    return frames, header["fps"]
@@ -1,8 +1,8 @@
-import pygame
 import random
+from collections import namedtuple
 from enum import Enum
-from termcolor import colored
-from sys import stderr
+from functools import lru_cache
+from tetris_ai.metrics import DEBUG, metrics
 
 colors = [
     (0, 0, 0),
@@ -15,28 +15,150 @@ colors = [
 ]
 
 
+game_metrics = metrics.component("game")
+
+
+def board_to_string(field):
+    return "\n".join(" ".join("X" if cell else " " for cell in row) for row in field)
+
+
+def row_features(row):
+    """Number of occupied cells and longest segment of occupied cells"""
+    count = 0
+    segment_size = 0
+    max_segment = 0
+    for cell in row:
+        if cell != 0:
+            count += 1
+            segment_size += 1
+            max_segment = max(max_segment, segment_size)
+        else:
+            segment_size = 0
+    return count, max_segment
+
+
+def row_hash(row, keys):
+    """Zobrist hash of a row: the xor of the keys of its occupied cells"""
+    hash_ = 0
+    for key, cell in zip(keys, row):
+        if cell != 0:
+            hash_ ^= key
+    return hash_
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(height, width):
+    """Random 64 bit keys of every cell of a board, and of every type and
+    rotation, column (from -3) and row of the falling figure. The same for
+    every game of that size so hashes can be compared across games
+    """
+    rng = random.Random(f"zobrist {height}x{width}")
+    cells = [[rng.getrandbits(64) for _ in range(width)] for _ in range(height)]
+    figures = [[rng.getrandbits(64) for _ in rotations] for rotations in FIGURES]
+    columns = [rng.getrandbits(64) for _ in range(width + 3)]
+    rows = [rng.getrandbits(64) for _ in range(height)]
+    return cells, figures, columns, rows
+
+
+# immutable copy of a game, the figure is (type, rotation, x, y, color) or None
+# and the board whatever the engine needs to restore its cells
+GameSnapshot = namedtuple(
+    "GameSnapshot",
+    [
+        "board",
+        "figure",
+        "score",
+        "state",
+        "row_counts",
+        "row_segments",
+        "upper_tier_occupied",
+        "lower_tier_occupied",
+        "row_hashes",
+        "board_hash",
+    ],
+)
+
+
+# cells of every rotation of every figure as indices in a 4x4 box
+FIGURES = [
+    [[1, 5, 9, 13], [4, 5, 6, 7]],
+    [[1, 2, 5, 9], [0, 4, 5, 6], [1, 5, 9, 8], [4, 5, 6, 10]],
+    [[1, 2, 6, 10], [5, 6, 7, 9], [2, 6, 10, 11], [3, 5, 6, 7]],
+    [[1, 4, 5, 6], [1, 4, 5, 9], [4, 5, 6, 9], [1, 5, 6, 9]],
+    [[1, 2, 5, 6]],
+]
+
+# where new figures appear
+SPAWN_X = 3
+SPAWN_Y = 0
+
+# what the game needs to know of a rotation of a figure: the (dy, dx) of its
+# cells, the rows it spans, its bounding box in the 4x4 box, the lowest dy of
+# each of its columns as (dx, dy) and its cells on the board when it spawns
+FigureGeometry = namedtuple(
+    "FigureGeometry",
+    ["cells", "rows", "left", "right", "top", "bottom", "bottoms", "spawn_cells"],
+)
+
+
+def _build_geometry():
+    geometry = []
+    for rotations in FIGURES:
+        rotation_geometry = []
+        for image in rotations:
+            cells = tuple((p // 4, p % 4) for p in image)
+            dys = [dy for dy, _ in cells]
+            dxs = [dx for _, dx in cells]
+            bottoms = tuple(
+                (dx, max(dy for dy, x in cells if x == dx)) for dx in sorted(set(dxs))
+            )
+            rotation_geometry.append(
+                FigureGeometry(
+                    cells,
+                    tuple(sorted(set(dys))),
+                    min(dxs),
+                    max(dxs),
+                    min(dys),
+                    max(dys),
+                    bottoms,
+                    tuple((SPAWN_Y + dy, SPAWN_X + dx) for dy, dx in cells),
+                )
+            )
+        geometry.append(tuple(rotation_geometry))
+    return tuple(geometry)
+
+
+# GEOMETRY[type][rotation], built once for every path to index into
+GEOMETRY = _build_geometry()
+
+
 class Figure:
-    x = 0
-    y = 0
-
-    figures = [
-        [[1, 5, 9, 13], [4, 5, 6, 7]],
-        [[1, 2, 5, 9], [0, 4, 5, 6], [1, 5, 9, 8], [4, 5, 6, 10]],
-        [[1, 2, 6, 10], [5, 6, 7, 9], [2, 6, 10, 11], [3, 5, 6, 7]],
-        [[1, 4, 5, 6], [1, 4, 5, 9], [4, 5, 6, 9], [1, 5, 6, 9]],
-        [[1, 2, 5, 6]],
-    ]
-
-    def __init__(self, x, y):
+    __slots__ = ("x", "y", "type", "color", "rotation")
+
+    figures = FIGURES
+
+    def __init__(self, x, y, figure_type=None, color=None):
         self.x = x
         self.y = y
-        self.type = random.randint(0, len(self.figures) - 1)
-        self.color = random.randint(1, len(colors) - 1)
+        # drawn from the process wide generator unless given
+        if figure_type is None:
+            figure_type = random.randint(0, len(self.figures) - 1)
+        if color is None:
+            color = random.randint(1, len(colors) - 1)
+        self.type = figure_type
+        self.color = color
         self.rotation = 0
 
     def image(self):
         return self.figures[self.type][self.rotation]
 
+    def geometry(self):
+        return GEOMETRY[self.type][self.rotation]
+
+    def cells(self):
+        """(dy, dx) of the 4 cells of the figure"""
+        return GEOMETRY[self.type][self.rotation].cells
+
     def rotate(self):
         self.rotation = (self.rotation + 1) % len(self.figures[self.type])
 
@@ -53,9 +175,12 @@ class Tetris:
     zoom = 20
     figure = None
 
-    def __init__(self, height, width):
+    def __init__(self, height, width, pieces=None):
         self.height = height
         self.width = width
+        # a PieceGenerator, the figures are drawn from the random module
+        # without one
+        self.pieces = pieces
         self.state = "start"
         self.field = []
         self.score = 0
@@ -65,9 +190,148 @@ class Tetris:
             for j in range(width):
                 new_line.append(0)
             self.field.append(new_line)
+        self._init_row_features()
+
+    def load_field(self, field):
+        """Replace the board with a list of lists of colors"""
+        for i, row in enumerate(field):
+            for j, cell in enumerate(row):
+                self.field[i][j] = cell
+        self._update_rows(range(self.height))
+
+    def _init_row_features(self):
+        """Per row number of occupied cells and longest segment of occupied
+        cells, and the number of occupied cells in the upper and lower third
+        of the board. They are kept up to date when a figure is frozen or
+        lines are broken so rewards don't need to scan the board.
+        """
+        third_height = self.height // 3 + 1
+        self.upper_tier_end = third_height
+        self.lower_tier_start = 2 * third_height
+        self.row_counts = [0] * self.height
+        self.row_segments = [0] * self.height
+        self.upper_tier_occupied = 0
+        self.lower_tier_occupied = 0
+        # bumped every time the locked cells change
+        self.board_version = 0
+        # zobrist hash of the locked cells, kept up to date row by row
+        self.cell_keys, self.figure_keys, self.column_keys, self.row_keys = (
+            zobrist_keys(self.height, self.width)
+        )
+        self.row_hashes = [0] * self.height
+        self.board_hash = 0
+        # at which version the cells were a copy of which snapshot board
+        self.board_source = (None, None)
+
+    def _row_features(self, i):
+        return row_features(self.field[i])
+
+    def _row_hash(self, i):
+        return row_hash(self.field[i], self.cell_keys[i])
+
+    def _rehash_rows(self, rows):
+        for i in rows:
+            hash_ = self._row_hash(i)
+            self.board_hash ^= self.row_hashes[i] ^ hash_
+            self.row_hashes[i] = hash_
+
+    def position_hash(self):
+        """board_hash combined with the type, rotation and position of the
+        falling figure
+        """
+        figure = self.figure
+        if figure is None:
+            return self.board_hash
+        return (
+            self.board_hash
+            ^ self.figure_keys[figure.type][figure.rotation]
+            ^ self.column_keys[figure.x + 3]
+            ^ self.row_keys[figure.y]
+        )
+
+    def _update_rows(self, rows):
+        self.board_version += 1
+        self._rehash_rows(rows)
+        for i in rows:
+            count, max_segment = self._row_features(i)
+            delta = count - self.row_counts[i]
+            if i < self.upper_tier_end:
+                self.upper_tier_occupied += delta
+            elif i >= self.lower_tier_start:
+                self.lower_tier_occupied += delta
+            self.row_counts[i] = count
+            self.row_segments[i] = max_segment
+
+    def _clear_row_features(self, cleared):
+        """Mirror on the row features the shift of the rows above `cleared`"""
+        order = [1] * (len(cleared) + 1) + [
+            i for i in range(2, self.height) if i not in cleared
+        ]
+        self.row_counts[1:] = [self.row_counts[i] for i in order]
+        self.row_segments[1:] = [self.row_segments[i] for i in order]
+        self.upper_tier_occupied = sum(self.row_counts[: self.upper_tier_end])
+        self.lower_tier_occupied = sum(self.row_counts[self.lower_tier_start :])
+        # every row down to the lowest cleared one moved
+        self._rehash_rows(range(2, max(cleared) + 1))
+        self.board_version += 1
+
+    def _board_snapshot(self):
+        return tuple(map(tuple, self.field))
+
+    def _restore_board(self, board):
+        for row, cells in zip(self.field, board):
+            row[:] = cells
+
+    def snapshot(self):
+        """Immutable copy of the board, the falling figure, the score and the
+        state. Branches can share it, see restore()
+        """
+        figure = self.figure
+        if figure is not None:
+            figure = (figure.type, figure.rotation, figure.x, figure.y, figure.color)
+        board = self._board_snapshot()
+        self.board_source = (self.board_version, board)
+        return GameSnapshot(
+            board,
+            figure,
+            self.score,
+            self.state,
+            tuple(self.row_counts),
+            tuple(self.row_segments),
+            self.upper_tier_occupied,
+            self.lower_tier_occupied,
+            tuple(self.row_hashes),
+            self.board_hash,
+        )
+
+    def restore(self, snapshot):
+        """Go back to a snapshot(), the board is only copied when it changed
+        since it was last taken or restored from the same snapshot
+        """
+        if self.board_source != (self.board_version, snapshot.board):
+            self._restore_board(snapshot.board)
+            self.row_counts = list(snapshot.row_counts)
+            self.row_segments = list(snapshot.row_segments)
+            self.upper_tier_occupied = snapshot.upper_tier_occupied
+            self.lower_tier_occupied = snapshot.lower_tier_occupied
+            self.row_hashes = list(snapshot.row_hashes)
+            self.board_hash = snapshot.board_hash
+            self.board_version += 1
+            self.board_source = (self.board_version, snapshot.board)
+        if snapshot.figure is None:
+            self.figure = None
+        else:
+            figure_type, rotation, x, y, color = snapshot.figure
+            self.figure = Figure(x, y, figure_type, color)
+            self.figure.rotation = rotation
+        self.score = snapshot.score
+        self.state = snapshot.state
 
     def new_figure(self):
-        self.figure = Figure(3, 0)
+        if self.pieces is None:
+            self.figure = Figure(3, 0)
+        else:
+            self.figure = Figure(3, 0, *self.pieces.next())
 
     def gameover(self):
         self.state = "gameover"
@@ -76,46 +340,71 @@ class Tetris:
         return self.state == "gameover"
 
     def intersects(self):
-        intersection = False
-        for i in range(4):
-            for j in range(4):
-                if i * 4 + j in self.figure.image():
-                    if (
-                        i + self.figure.y > self.height - 1
-                        or j + self.figure.x > self.width - 1
-                        or j + self.figure.x < 0
-                        or self.field[i + self.figure.y][j + self.figure.x] > 0
-                    ):
-                        intersection = True
-        return intersection
+        figure = self.figure
+        x = figure.x
+        y = figure.y
+        field = self.field
+        for dy, dx in GEOMETRY[figure.type][figure.rotation].cells:
+            if (
+                y + dy > self.height - 1
+                or x + dx > self.width - 1
+                or x + dx < 0
+                or field[y + dy][x + dx] > 0
+            ):
+                return True
+        return False
 
     def break_lines(self):
         lines = 0
         self.score = 0
-        output = []
+        cleared = set()
         # why does it start at 1?
         for i in range(1, self.height):
             zeros = 0
-            line = []
             for j in range(self.width):
-                line.append("X" if self.field[i][j] else " ")
                 if self.field[i][j] == 0:
                     zeros += 1
             if zeros == 0:
                 lines += 1
+                if i > 1:
+                    cleared.add(i)
                 for i1 in range(i, 1, -1):
                     for j in range(self.width):
                         self.field[i1][j] = self.field[i1 - 1][j]
-            output.append(line)
+        if cleared:
+            self._clear_row_features(cleared)
         if lines != 0:
-            print(colored(f"IT'S A BINGO {lines}", "cyan"), file=stderr)
-            print("\n".join([" ".join(x) for x in output]), file=stderr)
+            self._log_lines(lines)
         self.score = lines
 
+    def _log_lines(self, lines):
+        game_metrics.event("lines_cleared", lines=lines)
+        if game_metrics.enabled(DEBUG):
+            game_metrics.event("board", DEBUG, board=board_to_string(self.field[1:]))
+
+    def drop_distance(self):
+        """Rows the figure falls on a hard drop, the free cells under the
+        bottom of each of its columns
+        """
+        figure = self.figure
+        field = self.field
+        distance = self.height
+        for dx, bottom in GEOMETRY[figure.type][figure.rotation].bottoms:
+            x = figure.x + dx
+            start = figure.y + bottom + 1
+            end = min(self.height, start + distance)
+            i = start
+            while i < end and field[i][x] == 0:
+                i += 1
+            distance = i - start
+        return distance
+
     def go_space(self):
-        while not self.intersects():
-            self.figure.y += 1
-        self.figure.y -= 1
+        if self.intersects():
+            # what falling row by row does to a figure already colliding
+            self.figure.y -= 1
+        else:
+            self.figure.y += self.drop_distance()
         self.freeze()
 
     def go_down(self):
@@ -125,10 +414,11 @@ class Tetris:
             self.freeze()
 
     def freeze(self):
-        for i in range(4):
-            for j in range(4):
-                if i * 4 + j in self.figure.image():
-                    self.field[i + self.figure.y][j + self.figure.x] = self.figure.color
+        figure = self.figure
+        geometry = GEOMETRY[figure.type][figure.rotation]
+        for dy, dx in geometry.cells:
+            self.field[figure.y + dy][figure.x + dx] = figure.color
+        self._update_rows({figure.y + dy for dy in geometry.rows})
         self.break_lines()
         self.new_figure()
         if self.intersects():
@@ -147,120 +437,6 @@ class Tetris:
             self.figure.rotation = old_rotation
 
 
-class TetrisDrawer(object):
-    """Hold all the logic to render a game of Tetris
-    """
-
-    INITIALIZED = None
-    FPS = 25
-    BLACK = (0, 0, 0)
-    WHITE = (255, 255, 255)
-    GRAY = (128, 128, 128)
-    RED = (255, 128, 128)
-    GREEN = (128, 255, 128)
-
-    size = (400, 500)
-    screen = None
-    score_font = None
-    game_over_font = None
-    clock = None
-
-    def __init__(self):
-        self.screen = None
-        self.clock = None
-        self.score_font = None
-        self.game_over_font = None
-
-    def _setup(self):
-        self.screen = pygame.display.set_mode(self.size)
-        self.clock = pygame.time.Clock()
-        self.score_font = pygame.font.SysFont("Calibri", 25, True, False)
-        self.game_over_font = pygame.font.SysFont("Calibri", 65, True, False)
-
-    def _load_pygame(self):
-        pygame.init()
-        pygame.display.set_caption("Tetris-Now With AI!")
-
-    def close(self):
-        pygame.quit()
-
-    def render(self, game, info=None):
-        if TetrisDrawer.INITIALIZED is None:
-            self._load_pygame()
-            TetrisDrawer.INITIALIZED = True
-        if self.screen is None:
-            self._setup()
-        self.clear_screen()
-        self.render_grid_and_pieces(game)
-        self.render_current_piece(game)
-        self.render_info(info or "")
-        if game.is_done():
-            self.render_game_over()
-        pygame.display.flip()
-        self.clock.tick(TetrisDrawer.FPS)
-
-    def clear_screen(self):
-        self.screen.fill(TetrisDrawer.WHITE)
-
-    def render_grid_and_pieces(self, game):
-        for i in range(game.height):
-            for j in range(game.width):
-                color = TetrisDrawer.GRAY
-                # draw the lower third as red since this is where we want the
-                # tetrominoes to be
-                if i >= 2 * (game.height // 3 + 1):
-                    color = TetrisDrawer.GREEN
-                if i < (game.height // 3 + 1):
-                    color = TetrisDrawer.RED
-                pygame.draw.rect(
-                    self.screen,
-                    color,
-                    [
-                        game.x + game.zoom * j,
-                        game.y + game.zoom * i,
-                        game.zoom,
-                        game.zoom,
-                    ],
-                    1,
-                )
-                if game.field[i][j] > 0:
-                    pygame.draw.rect(
-                        self.screen,
-                        colors[game.field[i][j]],
-                        [
-                            game.x + game.zoom * j + 1,
-                            game.y + game.zoom * i + 1,
-                            game.zoom - 2,
-                            game.zoom - 1,
-                        ],
-                    )
-
-    def render_current_piece(self, game):
-        if game.figure is not None:
-            for i in range(4):
-                for j in range(4):
-                    p = i * 4 + j
-                    if p in game.figure.image():
-                        pygame.draw.rect(
-                            self.screen,
-                            colors[game.figure.color],
-                            [
-                                game.x + game.zoom * (j + game.figure.x) + 1,
-                                game.y + game.zoom * (i + game.figure.y) + 1,
-                                game.zoom - 2,
-                                game.zoom - 2,
-                            ],
-                        )
-
-    def render_info(self, info):
-        text = self.score_font.render(info, True, TetrisDrawer.BLACK)
-        self.screen.blit(text, [0, 0])
-
-    def render_game_over(self):
-        text_game_over = self.game_over_font.render("Game Over :( ", True, (255, 0, 0))
-        self.screen.blit(text_game_over, [10, 200])
-
-
 class Actions(Enum):
     ROTATE = 0
     LEFT = 1
@@ -295,33 +471,6 @@ class RandomActionDecider(ActionDecider):
         return [self.action_space[random.randint(0, len(self.action_space) - 1)]]
 
 
-class KeyboardAction(ActionDecider):
-    def __init__(self):
-        super().__init__([action for action in Actions])
-
-    def get_action(self, counter, game):
-        actions = []
-        # automatically go down if no input
-        if counter % (TetrisDrawer.FPS // game.level // 2) == 0:
-            actions.append(Actions.DOWN)
-
-        for event in pygame.event.get():
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    actions.append(Actions.ROTATE)
-                if event.key == pygame.K_DOWN:
-                    actions.append(Actions.DOWN)
-                if event.key == pygame.K_LEFT:
-                    actions.append(Actions.LEFT)
-                if event.key == pygame.K_RIGHT:
-                    actions.append(Actions.RIGHT)
-                if event.key == pygame.K_SPACE:
-                    actions.append(Actions.SPACE)
-                if event.key == pygame.K_ESCAPE:
-                    actions = [Actions.QUIT]
-        return actions
-
-
 class ActionApplier(object):
     def apply_actions(self, actions, game):
         for action in actions:
@@ -341,29 +490,22 @@ class ActionApplier(object):
         return False
 
 
+def __getattr__(name):
+    # rendering and keyboard input need pygame, only import it when asked for
+    if name == "TetrisDrawer":
+        from tetris_ai.render import TetrisDrawer
+
+        return TetrisDrawer
+    if name == "KeyboardAction":
+        from tetris_ai.keyboard import KeyboardAction
+
+        return KeyboardAction
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
-    # Initialize the game engine
-    drawer = TetrisDrawer()
-
-    # Loop until the user clicks the close button.
-    done = False
-    game = Tetris(20, 10)
-    counter = 0
-
-    decider = KeyboardAction()
-    applier = ActionApplier()
-    drawer.render(game)
-
-    while not done:
-        if game.figure is None:
-            game.new_figure()
-        counter += 1
-        if counter > 100000:
-            counter = 0
-
-        actions = decider.get_action(counter, game)
-        done = applier.apply_actions(actions, game)
-        drawer.render(game)
-
-    clock = pygame.time.Clock()
-    drawer.close()
+    # the game loop uses the package modules so KeyboardAction and
+    # ActionApplier agree on Actions
+    from tetris_ai.keyboard import play
+
+    play()
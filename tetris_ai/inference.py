@@ -0,0 +1,323 @@
+import collections
+import ctypes
+import multiprocessing
+import queue
+import struct
+import threading
+import time
+import traceback
+from multiprocessing.connection import wait
+import numpy as np
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.metrics import metrics
+
+inference_metrics = metrics.component("inference")
+batch_sizes = inference_metrics.histogram("batch_size")
+queue_depths = inference_metrics.histogram("queue_depth")
+batch_latencies = inference_metrics.histogram("batch_latency")
+
+# a request is the number of rows the client wrote
+REQUEST = struct.Struct("i")
+
+
+class InferenceClient(object):
+    """End of an InferenceServer given to a worker, owns `nb_rows` rows of
+    the shared buffers. Picklable, to be passed to a worker process
+    """
+
+    def __init__(self, start, nb_rows, buffers, pipe):
+        self.start = start
+        self.nb_rows = nb_rows
+        self.buffers = buffers
+        self.pipe = pipe
+        self.observations = None
+        self.outputs = None
+
+    def _map(self):
+        self.observations, self.outputs = [
+            np.frombuffer(buffer, dtype=np.float32).reshape(shape)
+            for buffer, shape in self.buffers
+        ]
+
+    def predict(self, observations):
+        """Outputs of the server's model for up to `nb_rows` observations,
+        blocks until the batch they were put in is done
+        """
+        if self.observations is None:
+            self._map()
+        count = len(observations)
+        if count > self.nb_rows:
+            raise ValueError(f"at most {self.nb_rows} observations per request")
+        rows = slice(self.start, self.start + count)
+        self.observations[rows] = observations
+        self.pipe.send_bytes(REQUEST.pack(count))
+        self.pipe.recv_bytes()
+        return self.outputs[rows].copy()
+
+    def close(self):
+        self.pipe.close()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["observations"] = state["outputs"] = None
+        return state
+
+
+class InferenceServer(object):
+    """Run `predict` on the observations of many workers at once
+
+    Every client writes its observations in its rows of a shared buffer and
+    sends the number of rows on its pipe. The server thread waits for the
+    first request, then for more until it holds `max_batch_size`
+    observations or `max_wait` seconds went by, runs a single `predict` on
+    all of them and writes the outputs back in the shared buffer before
+    answering every client of the batch. A batch never holds more than
+    `max_batch_size` observations, unless a single request does, the
+    requests that don't fit go in the next one. The number of requests
+    waiting when a batch starts and the size of the batches are recorded in
+    the "inference" metrics.
+
+    `predict` maps a (N,) + `observation_shape` float32 array to (N,
+    nb_outputs) outputs, it is only called from the server thread.
+    """
+
+    def __init__(
+        self,
+        predict,
+        observation_shape,
+        nb_outputs,
+        nb_clients,
+        rows_per_client=1,
+        max_batch_size=64,
+        max_wait=0.002,
+        start_method="spawn",
+    ):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        context = multiprocessing.get_context(start_method)
+        nb_rows = nb_clients * rows_per_client
+        shapes = [(nb_rows,) + tuple(observation_shape), (nb_rows, nb_outputs)]
+        buffers = [
+            (context.RawArray(ctypes.c_float, int(np.prod(shape))), shape)
+            for shape in shapes
+        ]
+        self.observations, self.outputs = [
+            np.frombuffer(buffer, dtype=np.float32).reshape(shape)
+            for buffer, shape in buffers
+        ]
+        self.pipes = []
+        self.clients = []
+        for index in range(nb_clients):
+            parent, child = context.Pipe()
+            self.pipes.append(parent)
+            self.clients.append(
+                InferenceClient(
+                    index * rows_per_client, rows_per_client, buffers, child
+                )
+            )
+        self.starts = {pipe: c.start for pipe, c in zip(self.pipes, self.clients)}
+        self.backlog = collections.deque()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._serve, name="inference-server", daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _receive(self, pipes, requests, open_pipes):
+        for pipe in pipes:
+            try:
+                (count,) = REQUEST.unpack(pipe.recv_bytes())
+            except (EOFError, OSError):
+                # the worker is gone
+                open_pipes.remove(pipe)
+                continue
+            requests.append((pipe, count))
+
+    def _take(self, requests, size):
+        """Move the backlog requests that fit in the batch to `requests`, the
+        first one always fits
+        """
+        backlog = self.backlog
+        while backlog and (not requests or size + backlog[0][1] <= self.max_batch_size):
+            pipe, count = backlog.popleft()
+            requests.append((pipe, count))
+            size += count
+        return size
+
+    def _collect(self, open_pipes):
+        """Requests of the next batch, empty once stopped"""
+        requests = []
+        # requests read but left out of the previous batch go first
+        size = self._take(requests, 0)
+        while not requests:
+            if self.stopped.is_set() or not open_pipes:
+                return requests
+            ready = wait(open_pipes, timeout=0.05)
+            if ready:
+                queue_depths.record(len(ready))
+            self._receive(ready, self.backlog, open_pipes)
+            size = self._take(requests, size)
+        deadline = time.perf_counter() + self.max_wait
+        # a request that doesn't fit waits in the backlog for the next batch
+        while size < self.max_batch_size and not self.backlog:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            # the clients of read requests wait for their answer, their pipes
+            # have nothing more to read
+            ready = wait(open_pipes, timeout=remaining)
+            if not ready:
+                break
+            self._receive(ready, self.backlog, open_pipes)
+            size = self._take(requests, size)
+        return requests
+
+    def _serve(self):
+        open_pipes = list(self.pipes)
+        while True:
+            requests = self._collect(open_pipes)
+            if not requests:
+                return
+            start = time.perf_counter()
+            rows = np.concatenate(
+                [np.arange(self.starts[p], self.starts[p] + n) for p, n in requests]
+            )
+            self.outputs[rows] = self.predict(self.observations[rows])
+            batch_sizes.record(len(rows))
+            batch_latencies.record(time.perf_counter() - start)
+            for pipe, _ in requests:
+                pipe.send_bytes(b"")
+
+    def close(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        for pipe in self.pipes:
+            pipe.close()
+
+
+def boltzmann_action(q_values, rng, tau=1.0):
+    """Action drawn like rl.policy.BoltzmannQPolicy does"""
+    exp_values = np.exp(np.clip(q_values / tau, -500.0, 500.0))
+    return rng.choice(len(q_values), p=exp_values / exp_values.sum())
+
+
+def _actor(client, env_kwargs, nb_envs, nb_steps, seed, greedy, go, results):
+    """Play `nb_steps` steps on each of `nb_envs` envs choosing the actions
+    with the server's Q-values, once `go` is set. Puts ("ready", None) once
+    the envs are reset, then ("scores", scores of the finished games) or
+    ("error", traceback) in `results`
+    """
+    try:
+        rng = np.random.default_rng(seed)
+        envs = [TetrisEnv(**env_kwargs) for _ in range(nb_envs)]
+        for i, env in enumerate(envs):
+            env.seed(seed + i)
+        observations = np.array([env.reset() for env in envs], dtype=np.float32)
+        episode_rewards = np.zeros(nb_envs)
+        scores = []
+        results.put(("ready", None))
+        go.wait()
+        for _ in range(nb_steps):
+            q_values = client.predict(observations)
+            for i, env in enumerate(envs):
+                if greedy:
+                    action = int(np.argmax(q_values[i]))
+                else:
+                    action = boltzmann_action(q_values[i], rng)
+                observation, reward, done, _ = env.step(action)
+                episode_rewards[i] += reward
+                if done:
+                    scores.append(episode_rewards[i])
+                    episode_rewards[i] = 0
+                    observation = env.reset()
+                observations[i] = observation
+        results.put(("scores", scores))
+    except Exception:
+        results.put(("error", traceback.format_exc()))
+    finally:
+        client.close()
+
+
+def receive(results, processes, poll=1.0):
+    """Next message a worker put in `results`, checking every `poll` seconds
+    that none of `processes` died without a word. A worker's traceback is
+    raised as a RuntimeError
+    """
+    while True:
+        try:
+            kind, value = results.get(timeout=poll)
+        except queue.Empty:
+            for process in processes:
+                if not process.is_alive() and process.exitcode != 0:
+                    raise RuntimeError(
+                        f"{process.name} died with exit code {process.exitcode}"
+                    )
+            continue
+        if kind == "error":
+            raise RuntimeError(f"worker failed:\n{value}")
+        return value
+
+
+def run_actors(
+    server,
+    nb_steps,
+    env_kwargs=None,
+    seed=0,
+    greedy=False,
+    start_method="spawn",
+):
+    """Play `nb_steps` steps on every env of one worker process per client
+    of `server`, a client's rows are its envs. Returns the steps played by
+    all the envs, the seconds it took and the score of every finished game
+
+    The clock starts once every worker is up with its envs reset, spawning
+    processes and importing modules isn't part of the time. A worker dying
+    or raising raises here, the other workers are terminated.
+    """
+    context = multiprocessing.get_context(start_method)
+    results = context.Queue()
+    go = context.Event()
+    processes = []
+    for client in server.clients:
+        process = context.Process(
+            target=_actor,
+            args=(
+                client,
+                env_kwargs or {},
+                client.nb_rows,
+                nb_steps,
+                seed + client.start,
+                greedy,
+                go,
+                results,
+            ),
+            daemon=True,
+        )
+        processes.append(process)
+    finished = False
+    try:
+        for process in processes:
+            process.start()
+        for _ in processes:
+            receive(results, processes)
+        go.set()
+        start = time.perf_counter()
+        scores = [score for _ in processes for score in receive(results, processes)]
+        duration = time.perf_counter() - start
+        finished = True
+    finally:
+        for process in processes:
+            if process.pid is None:
+                continue
+            # the others may wait forever for a server or a go left behind
+            if not finished:
+                process.terminate()
+            process.join()
+        results.close()
+    nb_rows = sum(client.nb_rows for client in server.clients)
+    return nb_rows * nb_steps, duration, scores
@@ -0,0 +1,62 @@
+import pygame
+from tetris_ai.game import ActionApplier, ActionDecider, Actions, Tetris
+from tetris_ai.render import TetrisDrawer
+
+
+class KeyboardAction(ActionDecider):
+    def __init__(self):
+        super().__init__([action for action in Actions])
+
+    def get_action(self, counter, game):
+        actions = []
+        # automatically go down if no input
+        if counter % (TetrisDrawer.FPS // game.level // 2) == 0:
+            actions.append(Actions.DOWN)
+
+        for event in pygame.event.get():
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_UP:
+                    actions.append(Actions.ROTATE)
+                if event.key == pygame.K_DOWN:
+                    actions.append(Actions.DOWN)
+                if event.key == pygame.K_LEFT:
+                    actions.append(Actions.LEFT)
+                if event.key == pygame.K_RIGHT:
+                    actions.append(Actions.RIGHT)
+                if event.key == pygame.K_SPACE:
+                    actions.append(Actions.SPACE)
+                if event.key == pygame.K_ESCAPE:
+                    actions = [Actions.QUIT]
+        return actions
+
+
+def play():
+    # Initialize the game engine
+    drawer = TetrisDrawer()
+
+    # Loop until the user clicks the close button.
+    done = False
+    game = Tetris(20, 10)
+    counter = 0
+
+    decider = KeyboardAction()
+    applier = ActionApplier()
+    drawer.render(game)
+
+    while not done:
+        if game.figure is None:
+            game.new_figure()
+        counter += 1
+        if counter > 100000:
+            counter = 0
+
+        actions = decider.get_action(counter, game)
+        done = applier.apply_actions(actions, game)
+        # render() caps the loop at TetrisDrawer.FPS
+        drawer.render(game)
+
+    drawer.close()
+
+
+if __name__ == "__main__":
+    play()
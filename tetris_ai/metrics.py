@@ -0,0 +1,317 @@
+import contextlib
+import csv
+import json
+import threading
+import time
+from array import array
+from sys import stderr
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "off": OFF}
+
+
+class Counter(object):
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, value=1):
+        self.value += value
+
+    def drain(self):
+        return {"type": "counter", "name": self.name, "value": self.value}
+
+
+class Histogram(object):
+    """Keep the last `capacity` samples, older ones are overwritten"""
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.samples = array("d", [0.0]) * capacity
+        self.written = 0
+        self.drained = 0
+
+    def record(self, value):
+        self.samples[self.written % self.capacity] = value
+        self.written += 1
+
+    def drain(self):
+        written = self.written
+        count = min(written - self.drained, self.capacity)
+        self.drained = written
+        if count == 0:
+            return None
+        end = written % self.capacity
+        if count <= end:
+            values = self.samples[end - count : end]
+        else:
+            values = self.samples[end - count :] + self.samples[:end]
+        values = sorted(values)
+        return {
+            "type": "histogram",
+            "name": self.name,
+            "count": count,
+            "mean": sum(values) / count,
+            "min": values[0],
+            "max": values[-1],
+            "p50": values[count // 2],
+            "p90": values[int(count * 0.9)],
+            "p99": values[int(count * 0.99)],
+        }
+
+
+class Events(object):
+    """Keep the last `capacity` events, older ones are overwritten"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.events = [None] * capacity
+        self.written = 0
+        self.drained = 0
+
+    def record(self, name, fields):
+        self.events[self.written % self.capacity] = (time.time(), name, fields)
+        self.written += 1
+
+    def drain(self):
+        written = self.written
+        count = min(written - self.drained, self.capacity)
+        self.drained = written
+        records = []
+        for i in range(written - count, written):
+            timestamp, name, fields = self.events[i % self.capacity]
+            records.append(
+                {"type": "event", "name": name, "time": timestamp, "fields": fields}
+            )
+        return records
+
+
+class Component(object):
+    """Metrics of one part of the code with its own level and sampling"""
+
+    def __init__(self, name, capacity, level=INFO, sample_every=1):
+        self.name = name
+        self.capacity = capacity
+        self.level = level
+        self.sample_every = sample_every
+        self.calls = 0
+        self.counters = {}
+        self.histograms = {}
+        self.events = Events(capacity)
+
+    def enabled(self, level=INFO):
+        return level >= self.level
+
+    def sampled(self, count=None, level=INFO):
+        """True once every `sample_every` calls, or when `count` is a multiple
+        of it, if `level` is enabled
+        """
+        if level < self.level:
+            return False
+        if count is None:
+            self.calls += 1
+            count = self.calls
+        return count % self.sample_every == 0
+
+    def counter(self, name):
+        if name not in self.counters:
+            self.counters[name] = Counter(name)
+        return self.counters[name]
+
+    def histogram(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, self.capacity)
+        return self.histograms[name]
+
+    def event(self, name, level=INFO, **fields):
+        if level >= self.level:
+            self.events.record(name, fields)
+
+    def drain(self):
+        records = [counter.drain() for counter in self.counters.values()]
+        records += [
+            record
+            for record in (h.drain() for h in self.histograms.values())
+            if record is not None
+        ]
+        records += self.events.drain()
+        for record in records:
+            record["component"] = self.name
+        return records
+
+
+class Metrics(object):
+    """Counters, histograms and events of every component, recorded in
+    preallocated ring buffers and drained by a MetricsFlusher thread so
+    nothing is formatted or written on the hot path
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.components = {}
+        self.lock = threading.Lock()
+
+    def component(self, name, level=INFO, sample_every=1):
+        """The component called `name`, created with `level` and
+        `sample_every` if it doesn't exist yet
+        """
+        with self.lock:
+            if name not in self.components:
+                self.components[name] = Component(
+                    name, self.capacity, level, sample_every
+                )
+            return self.components[name]
+
+    def configure(self, name, level=None, sample_every=None):
+        """Set the level ("debug", "info", "warning", "off" or a number) and
+        the sampling of a component
+        """
+        component = self.component(name)
+        if level is not None:
+            component.level = LEVELS.get(level, level)
+        if sample_every is not None:
+            component.sample_every = sample_every
+        return component
+
+    @contextlib.contextmanager
+    def muted(self, *names):
+        """Turn the components `names` off for the duration of a with block"""
+        components = [self.component(name) for name in names]
+        levels = [component.level for component in components]
+        for component in components:
+            component.level = OFF
+        try:
+            yield
+        finally:
+            for component, level in zip(components, levels):
+                component.level = level
+
+    def drain(self):
+        """Everything recorded since the last call"""
+        now = time.time()
+        with self.lock:
+            components = list(self.components.values())
+        records = []
+        for component in components:
+            for record in component.drain():
+                record.setdefault("time", now)
+                records.append(record)
+        return records
+
+
+class JsonlSink(object):
+    def __init__(self, path):
+        self.file = open(path, "a")
+
+    def write(self, records):
+        for record in records:
+            self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink(object):
+    FIELDS = [
+        "time",
+        "component",
+        "type",
+        "name",
+        "value",
+        "count",
+        "mean",
+        "min",
+        "max",
+        "p50",
+        "p90",
+        "p99",
+        "fields",
+    ]
+
+    def __init__(self, path):
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, CsvSink.FIELDS)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if "fields" in record:
+                record = dict(record, fields=json.dumps(record["fields"]))
+            self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ConsoleSink(object):
+    """Human readable lines on stderr, written from the flusher thread"""
+
+    def __init__(self, file=stderr):
+        self.file = file
+
+    def write(self, records):
+        lines = []
+        for record in records:
+            if record["type"] == "counter":
+                continue
+            if record["type"] == "event":
+                fields = " ".join(f"{k}={v}" for k, v in record["fields"].items())
+                lines.append(f"{record['component']}.{record['name']} {fields}")
+            else:
+                lines.append(
+                    f"{record['component']}.{record['name']} "
+                    f"n={record['count']} mean={record['mean']:.5f} "
+                    f"min={record['min']:.5f} max={record['max']:.5f}"
+                )
+        if lines:
+            print("\n".join(lines), file=self.file)
+
+    def close(self):
+        pass
+
+
+def sink_for(path):
+    """Sink writing to `path` based on its extension, stderr when None"""
+    if path is None:
+        return ConsoleSink()
+    if path.endswith(".csv"):
+        return CsvSink(path)
+    return JsonlSink(path)
+
+
+class MetricsFlusher(threading.Thread):
+    """Drain `metrics` into `sink` every `interval` seconds"""
+
+    def __init__(self, metrics, sink, interval=1.0):
+        super().__init__(name="metrics-flusher", daemon=True)
+        self.metrics = metrics
+        self.sink = sink
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        records = self.metrics.drain()
+        if records:
+            self.sink.write(records)
+
+    def close(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+        self.sink.close()
+
+
+# shared by the whole process
+metrics = Metrics()
@@ -0,0 +1,139 @@
+import numpy as np
+from tetris_ai.game import GEOMETRY, Tetris, row_features, row_hash
+
+# width of the wall surrounding the board, large enough for a 4x4 figure
+# window to never slice outside of the padded array
+PADDING = 4
+WALL = -1
+
+
+def _build_masks():
+    """4x4 boolean occupancy mask for every rotation of every figure"""
+    masks = []
+    for rotations in GEOMETRY:
+        rotation_masks = []
+        for geometry in rotations:
+            mask = np.zeros((4, 4), dtype=bool)
+            for dy, dx in geometry.cells:
+                mask[dy, dx] = True
+            rotation_masks.append(mask)
+        masks.append(rotation_masks)
+    return masks
+
+
+def _build_cells():
+    """(dy, dx) of the 4 cells of every rotation of every figure, figures
+    with less rotations repeat their last one so the table is dense
+    """
+    nb_rotations = max(len(rotations) for rotations in GEOMETRY)
+    cells = np.zeros((len(GEOMETRY), nb_rotations, 4, 2), dtype=np.intp)
+    for t, rotations in enumerate(GEOMETRY):
+        for r in range(nb_rotations):
+            cells[t, r] = rotations[min(r, len(rotations) - 1)].cells
+    return cells
+
+
+MASKS = _build_masks()
+CELLS = _build_cells()
+NB_ROTATIONS = np.array([len(rotations) for rotations in GEOMETRY])
+
+
+def break_lines_batch(boards):
+    """Break the full lines of a (N, height, width) stack of boards in place
+    following the rules of Tetris.break_lines, returns the number of lines of
+    every board
+    """
+    full = (boards != 0).all(axis=2)
+    # the first row is never checked
+    full[:, 0] = False
+    lines = full.sum(axis=1)
+    # the second row counts as a line but is never shifted out, the rows
+    # above the cleared ones are filled with copies of it
+    full[:, 1] = False
+    removed = full.sum(axis=1)
+    shifting = np.flatnonzero(removed)
+    if len(shifting):
+        full, removed = full[shifting], removed[shifting]
+        # cleared rows sort first, kept rows keep their order
+        sources = np.zeros(full.shape, dtype=np.intp)
+        sources[:, 1:] = np.argsort(~full[:, 1:], axis=1, kind="stable") + 1
+        padding = np.arange(boards.shape[1] - 1) < removed[:, None]
+        sources[:, 1:][padding] = 1
+        boards[shifting] = np.take_along_axis(
+            boards[shifting], sources[:, :, None], axis=1
+        )
+    return lines
+
+
+class NumpyTetris(Tetris):
+    """Drop-in replacement for Tetris backed by a fixed-size NumPy array
+
+    The board is stored inside a larger array whose left, right and bottom
+    borders are walls so a collision is a single slice-and-mask operation.
+    `field` is a view on the playable area so anything indexing
+    `game.field[i][j]` keeps working.
+    """
+
+    def __init__(self, height, width, pieces=None):
+        self.height = height
+        self.width = width
+        self.pieces = pieces
+        self.state = "start"
+        self.score = 0
+        self.figure = None
+        self.board = np.full(
+            (height + PADDING, width + 2 * PADDING), WALL, dtype=np.int8
+        )
+        self.field = self.board[:height, PADDING : PADDING + width]
+        self.field[:] = 0
+        self._init_row_features()
+
+    def _window(self):
+        x = self.figure.x + PADDING
+        y = self.figure.y
+        return self.board[y : y + 4, x : x + 4]
+
+    def _mask(self):
+        return MASKS[self.figure.type][self.figure.rotation]
+
+    def _row_features(self, i):
+        return row_features(self.field[i].tolist())
+
+    def _row_hash(self, i):
+        return row_hash(self.field[i].tolist(), self.cell_keys[i])
+
+    def _board_snapshot(self):
+        return self.field.tobytes()
+
+    def _restore_board(self, board):
+        self.field[:] = np.frombuffer(board, dtype=np.int8).reshape(self.field.shape)
+
+    def intersects(self):
+        return bool(self._window()[self._mask()].any())
+
+    def break_lines(self):
+        full = self.field.all(axis=1)
+        # the first row is never checked
+        full[0] = False
+        lines = int(full.sum())
+        self.score = lines
+        if lines == 0:
+            return
+        # the second row counts as a line but is never shifted out, the rows
+        # above the cleared ones are filled with copies of it
+        full[1] = False
+        removed = int(full.sum())
+        if removed:
+            kept = self.field[1:][~full[1:]]
+            self.field[removed + 1 :] = kept
+            self.field[1 : removed + 1] = kept[0]
+            self._clear_row_features(set(np.flatnonzero(full).tolist()))
+        self._log_lines(lines)
+
+    def freeze(self):
+        self._window()[self._mask()] = self.figure.color
+        self._update_rows({self.figure.y + dy for dy in self.figure.geometry().rows})
+        self.break_lines()
+        self.new_figure()
+        if self.intersects():
+            self.gameover()
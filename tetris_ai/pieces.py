@@ -0,0 +1,77 @@
+import numpy as np
+from tetris_ai.game import Figure, colors
+
+# how the figure types are drawn: independently or by shuffled bags holding
+# every type once
+MODES = ("uniform", "bag")
+
+
+class PieceGenerator(object):
+    """Draw the type and color of the next figures from its own generator
+
+    Pieces are drawn by blocks of `block_size` so drawing a piece is an index
+    in an array, and the upcoming ones can be looked at without drawing them.
+    """
+
+    def __init__(self, seed=None, mode="uniform", block_size=256):
+        if mode not in MODES:
+            raise ValueError(f"unknown piece mode {mode}")
+        self.mode = mode
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        # state of the generator after the last block was drawn
+        self.rng_state = self.rng.bit_generator.state
+        self.types = np.empty(0, dtype=np.intp)
+        self.colors = np.empty(0, dtype=np.intp)
+        self.position = 0
+        # number of pieces handed out so far
+        self.drawn = 0
+
+    def _refill(self, needed):
+        nb_types = len(Figure.figures)
+        while len(self.types) - self.position < needed:
+            if self.mode == "bag":
+                nb_bags = -(-self.block_size // nb_types)
+                types = np.concatenate(
+                    [self.rng.permutation(nb_types) for _ in range(nb_bags)]
+                )
+            else:
+                types = self.rng.integers(0, nb_types, self.block_size)
+            self.types = np.concatenate([self.types[self.position :], types])
+            self.colors = np.concatenate(
+                [
+                    self.colors[self.position :],
+                    self.rng.integers(1, len(colors), len(types)),
+                ]
+            )
+            self.position = 0
+            self.rng_state = self.rng.bit_generator.state
+
+    def snapshot(self):
+        """Immutable copy of where the generator is, the blocks are never
+        modified in place so they are shared and not copied
+        """
+        return self.rng_state, self.types, self.colors, self.position, self.drawn
+
+    def restore(self, snapshot):
+        rng_state, self.types, self.colors, self.position, self.drawn = snapshot
+        if rng_state is not self.rng_state:
+            self.rng.bit_generator.state = rng_state
+            self.rng_state = rng_state
+
+    def next(self):
+        """(type, color) of the next figure"""
+        if self.position >= len(self.types):
+            self._refill(1)
+        piece = int(self.types[self.position]), int(self.colors[self.position])
+        self.position += 1
+        self.drawn += 1
+        return piece
+
+    def preview(self, count):
+        """Types of the `count` figures coming after the current one"""
+        self._refill(count)
+        return self.types[self.position : self.position + count]
@@ -0,0 +1,110 @@
+import numpy as np
+from tetris_ai.game import Actions
+from tetris_ai.numpy_game import CELLS, NB_ROTATIONS, break_lines_batch
+
+
+def _collisions(game):
+    """Rotations of the current figure of `game` in the order Tetris.rotate
+    turns it, and collides[turn, x + 3, y - figure.y] for every rotation at
+    every column and row it could be at
+    """
+    figure = game.figure
+    occupied = np.not_equal(game.field, 0)
+    height, width = occupied.shape
+    # walls on the sides and a floor so every cell of every candidate indexes
+    # inside the array
+    padded = np.ones((height + 4, width + 8), dtype=bool)
+    padded[:height, 4 : 4 + width] = occupied
+    nb_rotations = NB_ROTATIONS[figure.type]
+    rotations = (figure.rotation + np.arange(nb_rotations)) % nb_rotations
+    cells = CELLS[figure.type, rotations]
+    xs = np.arange(-3, width)
+    ys = np.arange(figure.y, height + 1)
+    collides = padded[
+        ys[None, None, :, None] + cells[:, None, None, :, 0],
+        xs[None, :, None, None] + cells[:, None, None, :, 1] + 4,
+    ].any(axis=3)
+    return rotations, collides
+
+
+def reachable_placements(game):
+    """(rotation, x, y) of every position the current figure of `game` can be
+    locked in by rotating it where it is, sliding it sideways and hard dropping
+    it
+    """
+    figure = game.figure
+    rotations, collides = _collisions(game)
+    fits = ~collides[:, :, 0]
+    start = figure.x + 3
+    # the figure stops turning at the first rotation that doesn't fit and
+    # stops sliding at the first column that doesn't fit
+    turns = np.logical_and.accumulate(fits[:, start])
+    left = np.logical_and.accumulate(fits[:, start::-1], axis=1)
+    right = np.logical_and.accumulate(fits[:, start + 1 :], axis=1)
+    landing = figure.y + collides.argmax(axis=2) - 1
+    placements = []
+    for turn in range(int(turns.sum())):
+        rotation = int(rotations[turn])
+        for index in np.flatnonzero(left[turn]).tolist():
+            x = start - index
+            placements.append((rotation, x - 3, int(landing[turn, x])))
+        for index in np.flatnonzero(right[turn]).tolist():
+            x = start + 1 + index
+            placements.append((rotation, x - 3, int(landing[turn, x])))
+    return placements
+
+
+def stepped_placements(game, moves):
+    """(rotation, x, y) of every position the current figure of `game` can be
+    locked in when each of `moves` (Actions.ROTATE, LEFT or RIGHT) is followed
+    by going down one row, the way TetrisEnv steps in move mode, mapped to the
+    first move leading there
+    """
+    figure = game.figure
+    rotations, collides = _collisions(game)
+    nb_turns, nb_xs, nb_ys = collides.shape
+    fits = (~collides).tolist()
+    locks = {}
+    frontier = {(0, figure.x + 3): None}
+    for y in range(nb_ys - 1):
+        next_frontier = {}
+        for (turn, x), first in frontier.items():
+            for move in moves:
+                new_turn, new_x = turn, x
+                if move == Actions.ROTATE:
+                    new_turn = (turn + 1) % nb_turns
+                elif move == Actions.LEFT:
+                    new_x = x - 1
+                elif move == Actions.RIGHT:
+                    new_x = x + 1
+                # moves into something are undone
+                if not (0 <= new_x < nb_xs and fits[new_turn][new_x][y]):
+                    new_turn, new_x = turn, x
+                position = (new_turn, new_x)
+                first_move = move if first is None else first
+                if fits[new_turn][new_x][y + 1]:
+                    next_frontier.setdefault(position, first_move)
+                else:
+                    placement = (int(rotations[new_turn]), new_x - 3, figure.y + y)
+                    locks.setdefault(placement, first_move)
+        frontier = next_frontier
+    return locks
+
+
+def afterstates(game, placements):
+    """Boards of the game once the current figure is locked in every one of
+    `placements` and the full lines are broken, along with the number of lines
+    """
+    figure = game.figure
+    boards = np.repeat(
+        np.asarray(game.field, dtype=np.int8)[None], len(placements), axis=0
+    )
+    rotations, xs, ys = np.array(placements, dtype=np.intp).reshape(-1, 3).T
+    cells = CELLS[figure.type, rotations]
+    boards[
+        np.arange(len(placements))[:, None],
+        ys[:, None] + cells[..., 0],
+        xs[:, None] + cells[..., 1],
+    ] = figure.color
+    lines = break_lines_batch(boards)
+    return boards, lines
@@ -2,17 +2,29 @@ import gym
 import sys
 import os
 from tetris_ai.train import *
+from tetris_ai.cache import LRUCache
 
 
 if __name__ == "__main__":
+    flusher = MetricsFlusher(metrics, sink_for(None))
+    flusher.start()
     env = gym.make("tetris_ai:tetris_gym-v0")
     agent, model = get_agent(env)
     agent.load_weights(os.path.abspath(sys.argv[1]))
+    # the same boards come back over and over and the weights are fixed
+    q_cache = cache_q_values(agent, LRUCache())
+    callbacks = [EpisodeRewardsCallback(), ActionRecorderCallback(env)]
+    # record the episodes in this directory instead of showing them
+    video_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    if video_dir is not None:
+        callbacks.append(VideoRecorderCallback(video_dir))
     # Finally, evaluate our algorithm for 5 episodes.
     agent.test(
         env,
         nb_episodes=20,
-        visualize=True,
+        visualize=video_dir is None,
         verbose=0,
-        callbacks=[EpisodeRewardsCallback(), ActionRecorderCallback(env),],
+        callbacks=callbacks,
     )
+    train_metrics.event("q_cache", **q_cache.stats())
+    flusher.close()
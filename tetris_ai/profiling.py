@@ -0,0 +1,181 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from sys import stderr
+from tetris_ai.bitboard_game import BitboardTetris
+from tetris_ai.envs.tetris import TetrisEnv
+from tetris_ai.game import ActionApplier, Tetris
+from tetris_ai.metrics import metrics
+from tetris_ai.numpy_game import NumpyTetris
+
+profile_metrics = metrics.component("profile")
+
+# (owner, method, phase) timed by Profiler.enable(), the engines only where
+# they define the method themselves
+PHASES = [
+    (TetrisEnv, "step", "env.step"),
+    (TetrisEnv, "_reward", "env.step.reward"),
+    (TetrisEnv, "_game_to_observation", "env.step.observation"),
+    (ActionApplier, "apply_actions", "game.apply_actions"),
+    (Tetris, "new_figure", "game.new_figure"),
+    (Tetris, "go_down", "game.go_down"),
+]
+for engine in (Tetris, NumpyTetris, BitboardTetris):
+    PHASES.append((engine, "freeze", "game.freeze"))
+    PHASES.append((engine, "break_lines", "game.break_lines"))
+
+
+class Profiler(object):
+    """Wall time of the phases of a run
+
+    Phases are timed by wrapping methods with perf_counter() calls when the
+    profiler is enabled and put back when it is disabled, so the code runs
+    untouched until then. Every call is recorded in a "profile" histogram
+    and summed up for summary(), with `trace` its span is kept as well (up to
+    `max_spans`) for write_chrome_trace(). Times are inclusive: game.freeze
+    holds the game.break_lines it calls.
+    """
+
+    def __init__(self, trace=False, max_spans=1000000):
+        self.trace = trace
+        self.max_spans = max_spans
+        self.enabled = False
+        # nesting of paused() blocks, nothing is timed inside them
+        self.pause_depth = 0
+        self.patched = []
+        self.histograms = {}
+        self.totals = {}
+        self.spans = []
+        self.dropped_spans = 0
+        self.start = time.perf_counter()
+
+    def record(self, phase, start, end=None):
+        """Time a phase from `start` to `end`, now by default"""
+        if end is None:
+            end = time.perf_counter()
+        elapsed = end - start
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = profile_metrics.histogram(phase)
+            self.totals[phase] = [0, 0.0, 0.0]
+        histogram.record(elapsed)
+        totals = self.totals[phase]
+        totals[0] += 1
+        totals[1] += elapsed
+        if elapsed > totals[2]:
+            totals[2] = elapsed
+        if self.trace:
+            if len(self.spans) < self.max_spans:
+                self.spans.append((phase, threading.get_ident(), start, elapsed))
+            else:
+                self.dropped_spans += 1
+
+    def instrument(self, owner, method, phase=None):
+        """Time every call of `owner.method`, a class or an instance, as
+        `phase` until disable()
+        """
+        phase = phase or f"{getattr(owner, '__name__', type(owner).__name__)}.{method}"
+        original = getattr(owner, method)
+        # an instance method set on the instance goes back there, one from
+        # its class is only shadowed
+        own = method in vars(owner)
+        raw = vars(owner)[method] if own else original
+        record = self.record
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            if self.pause_depth:
+                return original(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                record(phase, start)
+
+        setattr(owner, method, timed)
+        self.patched.append((owner, method, own, raw))
+        return timed
+
+    def enable(self, phases=PHASES):
+        """Start timing `phases`, the env and game ones by default"""
+        if not self.enabled:
+            self.enabled = True
+            self.start = time.perf_counter()
+        for owner, method, phase in phases:
+            # engines inheriting the method already go through the wrapper
+            if not isinstance(owner, type) or method in vars(owner):
+                self.instrument(owner, method, phase)
+        return self
+
+    def disable(self):
+        """Put every instrumented method back"""
+        for owner, method, own, raw in reversed(self.patched):
+            if own:
+                setattr(owner, method, raw)
+            else:
+                delattr(owner, method)
+        self.patched = []
+        self.enabled = False
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Leave out what runs in a with block, like simulated moves"""
+        self.pause_depth += 1
+        try:
+            yield
+        finally:
+            self.pause_depth -= 1
+
+    def summary(self):
+        """(phase, calls, total seconds, mean seconds, max seconds, share of
+        the wall time) of every phase, the most expensive first
+        """
+        wall = time.perf_counter() - self.start
+        rows = [
+            (phase, calls, total, total / calls, longest, total / wall)
+            for phase, (calls, total, longest) in self.totals.items()
+        ]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def report(self, file=stderr):
+        lines = [
+            f"{'phase':28} {'calls':>9} {'total s':>9} {'mean us':>9} "
+            f"{'max us':>9} {'wall %':>7}"
+        ]
+        for phase, calls, total, mean, longest, share in self.summary():
+            lines.append(
+                f"{phase:28} {calls:9d} {total:9.3f} {mean * 1e6:9.1f} "
+                f"{longest * 1e6:9.1f} {share * 100:7.2f}"
+            )
+        print("\n".join(lines), file=file)
+
+    def write_chrome_trace(self, path):
+        """Spans in the Chrome trace event format, to open in
+        chrome://tracing or Perfetto
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": phase,
+                "ph": "X",
+                "ts": (start - self.start) * 1e6,
+                "dur": elapsed * 1e6,
+                "pid": pid,
+                "tid": tid,
+            }
+            for phase, tid, start, elapsed in self.spans
+        ]
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_spans": self.dropped_spans},
+        }
+        with open(path, "w") as output:
+            json.dump(trace, output)
+
+
+# shared by the whole process, disabled until enable()
+profiler = Profiler()
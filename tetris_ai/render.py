@@ -0,0 +1,222 @@
+import pygame
+from tetris_ai.game import colors
+
+
+class TetrisDrawer(object):
+    """Hold all the logic to render a game of Tetris
+
+    With `incremental`, the grid is drawn once on a cached background and
+    each frame only redraws the cells that changed: locked cells when the
+    board changed and the cells the falling figure left or entered, with
+    `pygame.display.update` on their rects. The info text is only rendered
+    again when it changes. The frames are the same as full redraws.
+    """
+
+    INITIALIZED = None
+    FPS = 25
+    BLACK = (0, 0, 0)
+    WHITE = (255, 255, 255)
+    GRAY = (128, 128, 128)
+    RED = (255, 128, 128)
+    GREEN = (128, 255, 128)
+
+    size = (400, 500)
+    screen = None
+    score_font = None
+    game_over_font = None
+    clock = None
+
+    def __init__(self, incremental=True):
+        self.screen = None
+        self.clock = None
+        self.score_font = None
+        self.game_over_font = None
+        self.incremental = incremental
+        self.background = None
+        self.game_over_text = None
+        self._forget()
+
+    def _forget(self):
+        """Force a full redraw on the next frame"""
+        self.game = None
+        self.board_version = None
+        self.drawn_field = None
+        self.figure_cells = set()
+        self.info = None
+        self.info_rect = None
+        self.game_over_shown = False
+
+    def _setup(self):
+        self.screen = pygame.display.set_mode(self.size)
+        self.clock = pygame.time.Clock()
+        self.score_font = pygame.font.SysFont("Calibri", 25, True, False)
+        self.game_over_font = pygame.font.SysFont("Calibri", 65, True, False)
+
+    def _load_pygame(self):
+        pygame.init()
+        pygame.display.set_caption("Tetris-Now With AI!")
+
+    def close(self):
+        pygame.quit()
+        self.background = None
+        self.game_over_text = None
+        self._forget()
+
+    def render(self, game, info=None):
+        if TetrisDrawer.INITIALIZED is None:
+            self._load_pygame()
+            TetrisDrawer.INITIALIZED = True
+        if self.screen is None:
+            self._setup()
+        if self.incremental:
+            self._render_incremental(game, info or "")
+            self.clock.tick(TetrisDrawer.FPS)
+            return
+        self.clear_screen()
+        self.render_grid_and_pieces(game)
+        self.render_current_piece(game)
+        self.render_info(info or "")
+        if game.is_done():
+            self.render_game_over()
+        pygame.display.flip()
+        self.clock.tick(TetrisDrawer.FPS)
+
+    def clear_screen(self):
+        self.screen.fill(TetrisDrawer.WHITE)
+
+    def render_grid_and_pieces(self, game):
+        for i in range(game.height):
+            for j in range(game.width):
+                self.render_cell_outline(self.screen, game, i, j)
+                if game.field[i][j] > 0:
+                    self.render_locked_cell(game, i, j, game.field[i][j])
+
+    def render_cell_outline(self, surface, game, i, j):
+        color = TetrisDrawer.GRAY
+        # draw the lower third as red since this is where we want the
+        # tetrominoes to be
+        if i >= 2 * (game.height // 3 + 1):
+            color = TetrisDrawer.GREEN
+        if i < (game.height // 3 + 1):
+            color = TetrisDrawer.RED
+        pygame.draw.rect(surface, color, self.cell_rect(game, i, j), 1)
+
+    def render_locked_cell(self, game, i, j, color):
+        pygame.draw.rect(
+            self.screen,
+            colors[color],
+            [
+                game.x + game.zoom * j + 1,
+                game.y + game.zoom * i + 1,
+                game.zoom - 2,
+                game.zoom - 1,
+            ],
+        )
+
+    def render_figure_cell(self, game, i, j, color):
+        pygame.draw.rect(
+            self.screen,
+            colors[color],
+            [
+                game.x + game.zoom * j + 1,
+                game.y + game.zoom * i + 1,
+                game.zoom - 2,
+                game.zoom - 2,
+            ],
+        )
+
+    @staticmethod
+    def cell_rect(game, i, j):
+        return pygame.Rect(
+            game.x + game.zoom * j, game.y + game.zoom * i, game.zoom, game.zoom
+        )
+
+    def render_current_piece(self, game):
+        figure = game.figure
+        if figure is not None:
+            for dy, dx in figure.cells():
+                self.render_figure_cell(
+                    game, figure.y + dy, figure.x + dx, figure.color
+                )
+
+    def render_info(self, info):
+        text = self.score_font.render(info, True, TetrisDrawer.BLACK)
+        self.screen.blit(text, [0, 0])
+
+    def render_game_over(self):
+        text_game_over = self.game_over_font.render("Game Over :( ", True, (255, 0, 0))
+        return self.screen.blit(text_game_over, [10, 200])
+
+    def _render_background(self, game):
+        """White screen with the grid, cells are restored from it"""
+        self.background = pygame.Surface(self.size)
+        self.background.fill(TetrisDrawer.WHITE)
+        for i in range(game.height):
+            for j in range(game.width):
+                self.render_cell_outline(self.background, game, i, j)
+        self.background_key = (game.height, game.width, game.x, game.y, game.zoom)
+
+    def _figure_cells(self, game):
+        figure = game.figure
+        if figure is None:
+            return {}
+        return {
+            (figure.y + dy, figure.x + dx): figure.color for dy, dx in figure.cells()
+        }
+
+    def _render_incremental(self, game, info):
+        key = (game.height, game.width, game.x, game.y, game.zoom)
+        if self.background is None or self.background_key != key:
+            self._render_background(game)
+            self._forget()
+        if self.game_over_shown and not game.is_done():
+            # the text is over the grid
+            self._forget()
+        full = self.drawn_field is None
+        dirty = []
+        cells = set()
+        if full:
+            self.screen.blit(self.background, (0, 0))
+            self.drawn_field = [[0] * game.width for _ in range(game.height)]
+            self.board_version = None
+        if game is not self.game or game.board_version != self.board_version:
+            self.game = game
+            self.board_version = game.board_version
+            for i, row in enumerate(game.field):
+                drawn = self.drawn_field[i]
+                for j, cell in enumerate(row):
+                    if cell != drawn[j]:
+                        drawn[j] = int(cell)
+                        cells.add((i, j))
+        figure_cells = self._figure_cells(game)
+        cells.update(self.figure_cells)
+        cells.update(figure_cells)
+        self.figure_cells = set(figure_cells)
+        for i, j in cells:
+            rect = self.cell_rect(game, i, j)
+            self.screen.blit(self.background, rect, rect)
+            if self.drawn_field[i][j] > 0:
+                self.render_locked_cell(game, i, j, self.drawn_field[i][j])
+            if (i, j) in figure_cells:
+                self.render_figure_cell(game, i, j, figure_cells[i, j])
+            dirty.append(rect)
+        if info != self.info:
+            if self.info_rect is not None:
+                self.screen.blit(self.background, self.info_rect, self.info_rect)
+                dirty.append(self.info_rect)
+            self.info = info
+            text = self.score_font.render(info, True, TetrisDrawer.BLACK)
+            self.info_rect = self.screen.blit(text, [0, 0])
+            dirty.append(self.info_rect)
+        # drawn over whatever was redrawn under it
+        if game.is_done() and (dirty or not self.game_over_shown):
+            self.game_over_shown = True
+            if self.game_over_text is None:
+                self.game_over_text = self.game_over_font.render(
+                    "Game Over :( ", True, (255, 0, 0)
+                )
+            dirty.append(self.screen.blit(self.game_over_text, [10, 200]))
+        if full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
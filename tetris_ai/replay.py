@@ -0,0 +1,144 @@
+import numpy as np
+from tetris_ai.trajectories import pack_observation, unpack_observations
+
+
+class SumTree(object):
+    """Priorities of `capacity` slots in a flat array binary tree, every node
+    holds the sum of its children and the leaves are the priorities, so a
+    batch is updated and sampled with a few vectorized passes over the
+    log2(capacity) levels
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 1 << max(int(np.ceil(np.log2(capacity))), 0)
+        self.depth = self.size.bit_length() - 1
+        self.tree = np.zeros(2 * self.size)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, indices):
+        return self.tree[self.size + np.asarray(indices)]
+
+    def set(self, index, priority):
+        """Single slot update, a plain loop beats numpy calls on one node"""
+        tree = self.tree
+        node = self.size + index
+        tree[node] = priority
+        node //= 2
+        while node:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+
+    def update(self, indices, priorities):
+        nodes = self.size + np.asarray(indices, dtype=np.intp)
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            # siblings share a parent, writing its sum twice is harmless
+            nodes //= 2
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Slot of the leaf every value in [0, total) falls in when the
+        priorities are laid end to end, never one of priority 0: a value
+        rounded past the end of a subtree stays in its last positive leaf
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.intp)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            right = (values >= self.tree[left]) & (self.tree[left + 1] > 0)
+            values -= self.tree[left] * right
+            nodes = left + right
+        return nodes - self.size
+
+
+class PrioritizedReplayBuffer(object):
+    """Ring buffer of the last `capacity` frames sampled in proportion to
+    priority ** `alpha`
+
+    Frames are appended like SequentialMemory entries, the transition of
+    frame i goes to frame i + 1, and kept in preallocated arrays with the
+    observations packed to a bit per cell: a million 20x10 frames take
+    about 32 MB and no Python object per transition. A frame only gets a
+    priority, the highest one seen so far, once the next frame is appended,
+    and the last frame of an episode never gets one.
+    """
+
+    def __init__(self, capacity, observation_shape, alpha=0.6, epsilon=1e-6):
+        self.capacity = capacity
+        self.observation_shape = tuple(observation_shape)
+        frame_bytes = -(-int(np.prod(observation_shape)) // 8)
+        self.observations = np.zeros((capacity, frame_bytes), dtype=np.uint8)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.terminals = np.zeros(capacity, dtype=bool)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.next_index = 0
+        self.nb_frames = 0
+
+    def __len__(self):
+        return self.nb_frames
+
+    def append(self, observation, action, reward, terminal):
+        index = self.next_index
+        self.observations[index] = np.frombuffer(
+            pack_observation(observation), dtype=np.uint8
+        )
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.terminals[index] = terminal
+        # the transition overwritten is gone, this one has no next frame yet
+        self.tree.set(index, 0.0)
+        # the previous frame now has one, unless it ended an episode: then it
+        # is the last observation of that episode
+        before = (index - 2) % self.capacity
+        if self.nb_frames and not (self.nb_frames > 1 and self.terminals[before]):
+            self.tree.set((index - 1) % self.capacity, self.max_priority)
+        self.next_index = (index + 1) % self.capacity
+        self.nb_frames = min(self.nb_frames + 1, self.capacity)
+
+    def sample(self, batch_size, beta=0.4, rng=np.random):
+        """Slots, importance-sampling weights and (observations, actions,
+        rewards, next observations, terminals) of `batch_size` transitions
+        """
+        total = self.tree.total
+        if total <= 0:
+            raise ValueError("no transition to sample yet")
+        # one draw per equal segment of the priorities
+        bounds = np.arange(batch_size) * (total / batch_size)
+        values = bounds + rng.uniform(0, total / batch_size, batch_size)
+        values = np.minimum(values, np.nextafter(total, 0))
+        slots = self.tree.find(values)
+        # find() only lands on positive leaves, a weight is never inf or NaN
+        probabilities = np.maximum(self.tree[slots], np.finfo(np.float64).tiny)
+        probabilities /= total
+        weights = (len(self) * probabilities) ** -beta
+        weights /= weights.max()
+        next_slots = (slots + 1) % self.capacity
+        return (
+            slots,
+            weights.astype(np.float32),
+            (
+                unpack_observations(self.observations[slots], self.observation_shape),
+                self.actions[slots],
+                self.rewards[slots],
+                unpack_observations(
+                    self.observations[next_slots], self.observation_shape
+                ),
+                self.terminals[slots],
+            ),
+        )
+
+    def update_priorities(self, slots, errors):
+        """New priorities of sampled transitions from their TD errors, before
+        anything else is appended
+        """
+        priorities = (np.abs(errors) + self.epsilon) ** self.alpha
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(slots, priorities)
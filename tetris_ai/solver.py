@@ -0,0 +1,237 @@
+import multiprocessing
+import numpy as np
+from tetris_ai.cache import LRUCache, board_hashes
+from tetris_ai.game import ActionDecider, Actions, Figure
+from tetris_ai.metrics import metrics
+from tetris_ai.numpy_game import NB_ROTATIONS
+from tetris_ai.pieces import PieceGenerator
+from tetris_ai.profiling import profiler
+from tetris_ai.placements import (
+    afterstates,
+    reachable_placements,
+    stepped_placements,
+)
+
+# weights of the aggregate height, lines cleared, holes and bumpiness, the
+# usual hand tuned ones of Tetris placement agents
+WEIGHTS = (-0.510066, 0.760666, -0.35663, -0.184483)
+
+
+def board_features(boards):
+    """Aggregate height, number of holes and bumpiness of every board of a
+    (N, height, width) stack
+    """
+    occupied = boards != 0
+    # every cell at or below the highest occupied cell of its column
+    covered = np.logical_or.accumulate(occupied, axis=1)
+    heights = covered.sum(axis=1)
+    holes = covered.sum(axis=(1, 2)) - occupied.sum(axis=(1, 2))
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    return heights.sum(axis=1), holes, bumpiness
+
+
+def evaluate(boards, lines, weights=WEIGHTS):
+    """Score of every board of a stack, higher is better"""
+    height, holes, bumpiness = board_features(boards)
+    return (
+        weights[0] * height
+        + weights[1] * lines
+        + weights[2] * holes
+        + weights[3] * bumpiness
+    )
+
+
+class _Position(object):
+    """What placements need of a game: the cells and a figure to place"""
+
+    def __init__(self, field, figure_type):
+        self.field = field
+        self.figure = Figure(3, 0, figure_type, 1)
+
+
+def beam_search(board, lines, figure_types, beam_width, weights=WEIGHTS):
+    """Best score reachable from `board` placing `figure_types` one after the
+    other, only the `beam_width` best boards are expanded after each figure.
+    `lines` already broken count in the score
+    """
+    boards = board[None]
+    total_lines = np.array([lines])
+    scores = evaluate(boards, total_lines, weights)
+    for figure_type in figure_types:
+        children = []
+        children_lines = []
+        for board, lines in zip(boards, total_lines):
+            position = _Position(board, figure_type)
+            placements = reachable_placements(position)
+            # no placement means the figure can't even appear: game over
+            if placements:
+                afterboards, new_lines = afterstates(position, placements)
+                children.append(afterboards)
+                children_lines.append(lines + new_lines)
+        if not children:
+            return -np.inf
+        boards = np.concatenate(children)
+        total_lines = np.concatenate(children_lines)
+        scores = evaluate(boards, total_lines, weights)
+        if len(scores) > beam_width:
+            kept = np.argpartition(-scores, beam_width - 1)[:beam_width]
+            boards = boards[kept]
+            total_lines = total_lines[kept]
+            scores = scores[kept]
+    return scores.max()
+
+
+def _search_roots(args):
+    boards, figure_types, beam_width, weights = args
+    return [
+        beam_search(board, 0, figure_types, beam_width, weights) for board in boards
+    ]
+
+
+class HeuristicActionDecider(ActionDecider):
+    """Lock every figure where the board scores the best on aggregate height,
+    holes, bumpiness and lines cleared
+
+    With `lookahead`, the `beam_width` best placements are searched further
+    with the upcoming figures of the game's PieceGenerator, on `nb_workers`
+    processes if more than 0. Searched scores are kept in an LRU cache of
+    `cache_entries` boards as the same boards come back from one figure move
+    to the next.
+    """
+
+    def __init__(
+        self,
+        lookahead=0,
+        beam_width=4,
+        weights=WEIGHTS,
+        nb_workers=0,
+        start_method="spawn",
+        cache_entries=100000,
+    ):
+        super().__init__([Actions.ROTATE, Actions.LEFT, Actions.RIGHT, Actions.SPACE])
+        self.lookahead = lookahead
+        self.beam_width = beam_width
+        self.weights = weights
+        self.nb_workers = nb_workers
+        self.start_method = start_method
+        self.pool = None
+        self.cache = LRUCache(cache_entries)
+        # game the moves are tried on, see _scratch_game()
+        self.scratch = None
+
+    def _search_boards(self, boards, figure_types):
+        if not self.nb_workers:
+            return _search_roots((boards, figure_types, self.beam_width, self.weights))
+        if self.pool is None:
+            context = multiprocessing.get_context(self.start_method)
+            self.pool = context.Pool(self.nb_workers)
+        chunks = np.array_split(np.arange(len(boards)), self.nb_workers)
+        results = self.pool.map(
+            _search_roots,
+            [
+                (boards[c], figure_types, self.beam_width, self.weights)
+                for c in chunks
+                if len(c)
+            ],
+        )
+        return [score for chunk in results for score in chunk]
+
+    def _search(self, boards, lines, figure_types):
+        # lines only add to the score so boards are searched without them
+        figure_types = tuple(figure_types)
+        keys = [(hash_, figure_types) for hash_ in board_hashes(boards).tolist()]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            for i, score in zip(
+                missing, self._search_boards(boards[missing], figure_types)
+            ):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+        return np.array(scores) + self.weights[1] * lines
+
+    def _evaluate(self, game, placements):
+        """Score of the board every placement of the current figure leads to,
+        searched further with the upcoming figures for the best ones
+        """
+        boards, lines = afterstates(game, placements)
+        scores = evaluate(boards, lines, self.weights)
+        if not self.lookahead or game.pieces is None:
+            return scores
+        figure_types = game.pieces.preview(self.lookahead).tolist()
+        roots = np.argsort(-scores, kind="stable")[: self.beam_width]
+        searched = np.full(len(scores), -np.inf)
+        searched[roots] = self._search(boards[roots], lines[roots], figure_types)
+        if np.isneginf(searched).all():
+            # every search ends the game: at least lock the figure in the
+            # best board it can be locked in now
+            return scores
+        return searched
+
+    def best_placement(self, game):
+        """(rotation, x, y) to lock the current figure in, None when the game
+        is over
+        """
+        placements = reachable_placements(game)
+        if not placements:
+            return None
+        return placements[int(np.argmax(self._evaluate(game, placements)))]
+
+    def get_action(self, game):
+        """Turn and slide the figure to its best placement and hard drop it"""
+        placement = self.best_placement(game)
+        if placement is None:
+            return []
+        rotation, x, _ = placement
+        figure = game.figure
+        turns = (rotation - figure.rotation) % NB_ROTATIONS[figure.type]
+        side = Actions.RIGHT if x > figure.x else Actions.LEFT
+        return [Actions.ROTATE] * turns + [side] * abs(x - figure.x) + [Actions.SPACE]
+
+    def _scratch_game(self, game):
+        """Detached copy of `game` and its pieces to play ahead on, the same
+        one is reused from call to call
+        """
+        scratch = self.scratch
+        if (
+            type(scratch) is not type(game)
+            or (scratch.height, scratch.width) != (game.height, game.width)
+            or (scratch.pieces is None) != (game.pieces is None)
+        ):
+            pieces = None
+            if game.pieces is not None:
+                pieces = PieceGenerator(mode=game.pieces.mode)
+            scratch = self.scratch = type(game)(game.height, game.width, pieces)
+        scratch.restore(game.snapshot())
+        if game.pieces is not None:
+            scratch.pieces.restore(game.pieces.snapshot())
+        return scratch
+
+    def move_action(self, env):
+        """Index in TetrisEnv.ACTIONS of the move of a move mode env leading to
+        the best placement the figure can still be locked in while it goes
+        down a row every step
+        """
+        # play the start of the step on a copy to see the figure the move
+        # applies to, a lock there is no real one: keep it out of the game
+        # metrics and the profile
+        game = self._scratch_game(env.game)
+        with metrics.muted("game"), profiler.paused():
+            if game.figure is None:
+                game.new_figure()
+            game.go_down()
+        move = Actions.ROTATE
+        if not game.is_done():
+            locks = stepped_placements(
+                game, [Actions.ROTATE, Actions.LEFT, Actions.RIGHT]
+            )
+            placements = list(locks)
+            scores = self._evaluate(game, placements)
+            move = locks[placements[int(np.argmax(scores))]]
+        return env.ACTIONS.index(move)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
@@ -1,5 +1,8 @@
+import argparse
 import gym
+import multiprocessing
 import os
+import time
 from termcolor import colored
 from datetime import datetime
 from tetris_ai.game import *
@@ -14,10 +17,183 @@ from sys import stderr
 from rl.agents.dqn import DQNAgent
 from rl.callbacks import Callback
 from rl.policy import BoltzmannQPolicy
-from rl.memory import SequentialMemory
+from rl.memory import Experience, Memory, SequentialMemory
+from tetris_ai.checkpoints import CheckpointWriter, latest_checkpoint
+from tetris_ai.distributed import ActorClient, LearnerServer
+from tetris_ai.envs import SubprocTetrisEnv
+from tetris_ai.frames import VideoWriter
+from tetris_ai.inference import InferenceServer
+from tetris_ai.metrics import MetricsFlusher, metrics, sink_for
+from tetris_ai.profiling import profiler
+from tetris_ai.replay import PrioritizedReplayBuffer
+from tetris_ai.solver import HeuristicActionDecider
+from tetris_ai.trajectories import TrajectoryDataset, TrajectoryWriter
 
+train_metrics = metrics.component("train")
 
-def get_agent(env):
+
+class TrajectoryMemory(Memory):
+    """Replay memory writing the transitions to a trajectory directory and
+    sampling them back through memory maps, so it is only bounded by the disk
+    and can be reused by later runs or other machines
+    """
+
+    def __init__(self, directory, observation_shape, window_length=1, **kwargs):
+        if window_length != 1:
+            raise ValueError("TrajectoryMemory only supports a window_length of 1")
+        super().__init__(window_length)
+        self.directory = directory
+        self.writer = TrajectoryWriter(directory, observation_shape, **kwargs)
+        self.dataset = TrajectoryDataset(directory)
+        self.episode_ended = False
+        # writes of the writer the dataset was refreshed at
+        self.refreshed = self.writer.nb_flushes
+
+    def append(self, observation, action, reward, terminal, training=True):
+        super().append(observation, action, reward, terminal, training=training)
+        if not training:
+            return
+        if self.episode_ended:
+            # agent.fit stores the last observation of an episode with a
+            # dummy action
+            self.writer.end_episode(observation)
+        else:
+            self.writer.append(observation, action, reward, terminal)
+        self.episode_ended = terminal
+
+    def refresh(self):
+        """Map what the writer wrote since the last sample, the frames of
+        the current episode are only written once it ends
+        """
+        if not len(self.dataset):
+            # nothing to sample before the first episode ended
+            self.writer.flush()
+        if self.writer.nb_flushes != self.refreshed:
+            chunks = self.dataset.chunks
+            # only look for new files once the writer moved to another chunk
+            rescan = not chunks or chunks[-1].prefix != self.writer.prefix
+            self.dataset.refresh(rescan=rescan)
+            self.refreshed = self.writer.nb_flushes
+
+    def sample(self, batch_size, batch_idxs=None):
+        self.refresh()
+        return [
+            Experience(
+                state0=[observation],
+                action=int(action),
+                reward=float(reward),
+                state1=[next_observation],
+                terminal1=bool(done),
+            )
+            for observation, action, reward, next_observation, done in zip(
+                *self.dataset.sample(batch_size)
+            )
+        ]
+
+    @property
+    def nb_entries(self):
+        return len(self.dataset) + self.writer.pending
+
+    def close(self):
+        self.writer.close()
+
+    def get_config(self):
+        config = super().get_config()
+        config["directory"] = self.directory
+        return config
+
+
+class PrioritizedMemory(Memory):
+    """Replay memory of the last `limit` transitions sampled by priority,
+    see PrioritizedReplayBuffer
+
+    Importance-sampling weights go from `beta` to 1 over the first
+    `beta_steps` samples. The agent has to weight its loss with them and
+    feed the TD errors back, get_agent() hooks that up with prioritize().
+    """
+
+    def __init__(
+        self,
+        limit,
+        observation_shape,
+        window_length=1,
+        alpha=0.6,
+        beta=0.4,
+        beta_steps=100000,
+        **kwargs,
+    ):
+        if window_length != 1:
+            raise ValueError("PrioritizedMemory only supports a window_length of 1")
+        super().__init__(window_length, **kwargs)
+        self.limit = limit
+        self.buffer = PrioritizedReplayBuffer(limit, observation_shape, alpha)
+        self.beta = beta
+        self.beta_steps = beta_steps
+        self.nb_samples = 0
+        self.last_slots = None
+        self.last_weights = None
+
+    def append(self, observation, action, reward, terminal, training=True):
+        super().append(observation, action, reward, terminal, training=training)
+        if training:
+            self.buffer.append(observation, action, reward, terminal)
+
+    def sample(self, batch_size, batch_idxs=None):
+        progress = min(self.nb_samples / self.beta_steps, 1.0)
+        beta = self.beta + (1.0 - self.beta) * progress
+        self.nb_samples += 1
+        self.last_slots, self.last_weights, batch = self.buffer.sample(batch_size, beta)
+        return [
+            Experience(
+                state0=[observation],
+                action=int(action),
+                reward=float(reward),
+                state1=[next_observation],
+                terminal1=bool(done),
+            )
+            for observation, action, reward, next_observation, done in zip(*batch)
+        ]
+
+    def update_priorities(self, errors):
+        """Priorities of the last sampled transitions from their TD errors"""
+        self.buffer.update_priorities(self.last_slots, errors)
+
+    @property
+    def nb_entries(self):
+        return len(self.buffer)
+
+    def close(self):
+        pass
+
+    def get_config(self):
+        config = super().get_config()
+        config["limit"] = self.limit
+        config["alpha"] = self.buffer.alpha
+        config["beta"] = self.beta
+        return config
+
+
+def prioritize(agent, memory):
+    """Weight the loss of every training batch of `agent` with the
+    importance-sampling weights of `memory` and feed the TD errors of the
+    batch back as new priorities
+    """
+    model = agent.trainable_model
+    train_on_batch = model.train_on_batch
+
+    def prioritized_train_on_batch(ins, targets, **kwargs):
+        # DQNAgent.backward passes [states, targets, masks], [returns, targets]
+        states, _, masks = ins
+        returns = targets[0]
+        q_values = agent.model.predict_on_batch(states)
+        memory.update_priorities(returns - np.sum(q_values * masks, axis=1))
+        weights = memory.last_weights
+        return train_on_batch(ins, targets, sample_weight=[weights, weights])
+
+    model.train_on_batch = prioritized_train_on_batch
+
+
+def get_agent(env, memory=None):
     nb_actions = env.action_space.n
     model = Sequential()
     input_size = env.BOARD_HEIGHT * env.BOARD_WIDTH
@@ -31,7 +207,8 @@ def get_agent(env):
     print(model.summary())
 
     # still not understanding that part
-    memory = SequentialMemory(limit=500, window_length=1)
+    if memory is None:
+        memory = SequentialMemory(limit=500, window_length=1)
     policy = BoltzmannQPolicy()
     dqn = DQNAgent(
         model=model,
@@ -42,6 +219,8 @@ def get_agent(env):
         policy=policy,
     )
     dqn.compile(Adam(lr=0.1), metrics=["mae"])
+    if isinstance(memory, PrioritizedMemory):
+        prioritize(dqn, memory)
     return dqn, model
 
 
@@ -62,9 +241,7 @@ class LogStepCallback(Callback):
     def on_step_end(self, step, logs={}):
         self.current_step += 1
         if self.current_step % self.log_every == 0:
-            print(
-                colored(f"{self.current_step} / {self.nb_steps}", "blue"), file=stderr
-            )
+            train_metrics.event("progress", step=self.current_step, total=self.nb_steps)
 
 
 class EpisodeRewardsCallback(Callback):
@@ -75,7 +252,7 @@ class EpisodeRewardsCallback(Callback):
 
     def on_episode_end(self, episode, logs={}):
         self.max_reward = max(self.max_reward, logs["episode_reward"])
-        print(colored(f"max reward: {self.max_reward:.5f}", "red"), file=stderr)
+        train_metrics.event("max_reward", reward=self.max_reward)
 
 
 class ActionRecorderCallback(Callback):
@@ -84,9 +261,20 @@ class ActionRecorderCallback(Callback):
     TOTAL_ACTIONS = Counter()
 
     def __init__(self, env):
-        self.action_mapping = env.ACTIONS
+        # placement actions are no moves, they are told by rotation and column
+        self.columns = None
+        if getattr(env, "action_mode", "move") == "placement":
+            self.columns = env.BOARD_WIDTH
+        else:
+            self.action_mapping = env.ACTIONS
         self.episode_actions = []
 
+    def action_name(self, action):
+        if self.columns is not None:
+            rotation, column = divmod(int(action), self.columns)
+            return f"R{rotation}C{column}"
+        return Actions(self.action_mapping[action]).name
+
     def on_action_begin(self, action, logs={}):
         self.episode_actions.append(action)
 
@@ -95,41 +283,550 @@ class ActionRecorderCallback(Callback):
 
     def on_episode_end(self, episode, logs={}):
         ActionRecorderCallback.TOTAL_ACTIONS.update(
-            [Actions(self.action_mapping[a]) for a in self.episode_actions]
-        )
-        print(
-            colored(f"actions:{ActionRecorderCallback.TOTAL_ACTIONS}", "red"),
-            file=stderr,
+            [self.action_name(a) for a in self.episode_actions]
         )
+        train_metrics.event("actions", **ActionRecorderCallback.TOTAL_ACTIONS)
+
+
+def agent_weights(agent):
+    """Copies of the weights of the networks of `agent` and of its optimizer"""
+    return {
+        "model": agent.model.get_weights(),
+        "target_model": agent.target_model.get_weights(),
+        "optimizer": agent.trainable_model.optimizer.get_weights(),
+    }
+
+
+def restore_agent(agent, arrays):
+    """Load weights from agent_weights() back in `agent`"""
+    agent.model.set_weights(arrays["model"])
+    agent.target_model.set_weights(arrays["target_model"])
+    if arrays.get("optimizer"):
+        try:
+            agent.trainable_model.optimizer.set_weights(arrays["optimizer"])
+        except ValueError:
+            # the optimizer only has its slots once it made an update
+            train_metrics.event("optimizer_not_restored")
+
+
+class CheckpointCallback(Callback):
+    """Snapshot the weights of `agent`, its optimizer state and what its
+    replay memory holds every `every` steps and save them with `writer` in
+    the background, the training only waits for the weights to be copied.
+    Steps count from `start_step`, where a resumed run starts
+    """
+
+    def __init__(self, agent, writer, every=10000, start_step=0):
+        self.agent = agent
+        self.writer = writer
+        self.every = every
+        self.start_step = start_step
+        self.next_save = every
+
+    def save(self, steps):
+        """Checkpoint the agent as it is after `steps` steps"""
+        memory = self.agent.memory
+        meta = {
+            "memory": {
+                "type": type(memory).__name__,
+                "nb_entries": int(memory.nb_entries),
+                "config": memory.get_config(),
+            }
+        }
+        self.writer.save(self.start_step + int(steps), agent_weights(self.agent), meta)
+
+    def save_due(self, steps):
+        """Save if a checkpoint is due once `steps` steps are done, several
+        steps may have gone by since the last call
+        """
+        if steps >= self.next_save:
+            self.next_save = (steps // self.every + 1) * self.every
+            self.save(steps)
+
+    def on_step_end(self, step, logs={}):
+        # agent.fit only counts the step in agent.step after the callbacks
+        self.save_due(self.agent.step + 1)
+
+
+class VideoRecorderCallback(Callback):
+    """Write every episode to `directory`/episode-<n>.rgb.gz with the
+    rgb_array render mode, see tetris_ai.frames.read_video(). Frames are
+    compressed in a background thread, so it works on headless machines
+    without slowing down `agent.test`
+    """
+
+    def __init__(self, directory, fps=25):
+        self.directory = directory
+        self.fps = fps
+        self.episode = 0
+        self.writers = []
+        os.makedirs(directory, exist_ok=True)
+
+    def _write_frame(self):
+        self.writers[-1].write(self.env.render(mode="rgb_array"))
+
+    def on_episode_begin(self, episode, logs={}):
+        self.episode = episode
+
+    def on_step_begin(self, step, logs={}):
+        if step == 0:
+            # the first frame is the one the env was reset to
+            frame = self.env.render(mode="rgb_array")
+            path = os.path.join(self.directory, f"episode-{self.episode:05d}.rgb.gz")
+            self.writers.append(VideoWriter(path, frame.shape, self.fps))
+            self.writers[-1].write(frame)
+
+    def on_step_end(self, step, logs={}):
+        self._write_frame()
+
+    def on_episode_end(self, episode, logs={}):
+        self.writers[-1].close(wait=False)
+
+    def on_train_end(self, logs={}):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+
+# callback hooks timed by ProfileCallback
+CALLBACK_HOOKS = (
+    "on_episode_begin",
+    "on_episode_end",
+    "on_step_begin",
+    "on_step_end",
+    "on_action_begin",
+    "on_action_end",
+)
+
+
+def agent_phases(agent):
+    """Phases of `agent` for Profiler.enable(): the keras-rl forward (policy
+    and prediction) and backward (storing the transition, sampling the replay
+    memory and training on the batch)
+    """
+    return [
+        (agent, "forward", "agent.forward"),
+        (agent, "compute_q_values", "agent.forward.predict"),
+        (agent, "compute_batch_q_values", "agent.predict_batch"),
+        (agent, "backward", "agent.backward"),
+        (agent.memory, "sample", "agent.backward.replay_sample"),
+        (agent.trainable_model, "train_on_batch", "agent.backward.train"),
+    ]
+
+
+class ProfileCallback(Callback):
+    """Time the agent.fit steps and the phases of the agent with `profiler`,
+    along with the hooks of the other `callbacks` of the run
+
+    To be the last callback: a step is timed from the end of the previous
+    one, or the start of the episode, to its own end so it holds every hook
+    of the other callbacks once. The first step of an episode holds the
+    env.reset() of agent.fit.
+    """
+
+    def __init__(self, profiler, callbacks=()):
+        self.profiler = profiler
+        self.callbacks = callbacks
+        self.step_start = None
+
+    def set_model(self, model):
+        # keras-rl hands the agent over as the model
+        super().set_model(model)
+        phases = agent_phases(model)
+        for callback in self.callbacks:
+            name = type(callback).__name__
+            for hook in CALLBACK_HOOKS:
+                if hook in vars(type(callback)):
+                    phases.append((callback, hook, f"callbacks.{name}.{hook}"))
+        self.profiler.enable(phases)
+
+    def on_episode_begin(self, episode, logs={}):
+        self.step_start = time.perf_counter()
+
+    def on_step_end(self, step, logs={}):
+        end = time.perf_counter()
+        self.profiler.record("agent.fit_step", self.step_start, end)
+        self.step_start = end
+
+    def on_train_end(self, logs={}):
+        # the agent and the callbacks go back to their own methods
+        self.profiler.disable()
+
+
+def _replay_episode(agent, transitions, terminal_observation):
+    """Feed a finished episode to the agent the way `agent.fit` would have,
+    so the replay memory holds it contiguously and training/target updates
+    follow `agent.step`
+    """
+    for observation, action, reward, done in transitions:
+        agent.recent_observation = observation
+        agent.recent_action = action
+        agent.backward(reward, terminal=done)
+        agent.step += 1
+    # like agent.fit, the terminal observation is stored with a dummy action
+    agent.recent_observation = terminal_observation
+    agent.backward(0.0, terminal=False)
+
+
+def cache_q_values(agent, cache):
+    """Look the Q-values of `agent` up in `cache` before running the network,
+    only while the weights don't change: testing or playing
+    """
+    compute_q_values = agent.compute_q_values
+
+    def cached_q_values(state):
+        # the bytes themselves, a hash alone could mix up two states
+        key = np.asarray(state).tobytes()
+        q_values = cache.get(key)
+        if q_values is None:
+            q_values = compute_q_values(state)
+            cache.put(key, q_values)
+        return q_values
+
+    agent.compute_q_values = cached_q_values
+    return cache
+
+
+def serve_q_values(agent, nb_clients, **kwargs):
+    """InferenceServer answering worker processes with the Q-values of
+    `agent` for batches of their observations, see InferenceServer for the
+    batching `kwargs`
+    """
+    # (batch, window_length) + observation shape
+    observation_shape = agent.model.input_shape[2:]
+    server = InferenceServer(
+        lambda observations: agent.compute_batch_q_values(observations[:, None]),
+        observation_shape,
+        agent.nb_actions,
+        nb_clients,
+        **kwargs,
+    )
+    return server.start()
+
+
+def pretrain_on_demonstrations(agent, env, nb_steps, decider=None):
+    """Train `agent` on `nb_steps` steps of `env` played by the heuristic
+    solver so the replay memory starts with good games
+    """
+    decider = decider or HeuristicActionDecider()
+    agent.training = True
+    agent.step = 0
+    transitions = []
+    # the env reuses its observation array
+    observation = np.array(env.reset())
+    while agent.step < nb_steps:
+        action = decider.move_action(env)
+        next_observation, reward, done, _ = env.step(action)
+        transitions.append((observation, action, reward, done))
+        observation = np.array(next_observation)
+        if done or agent.step + len(transitions) >= nb_steps:
+            # a demonstration cut short ends there too, like agent.fit does
+            # with nb_max_episode_steps, so nothing is bootstrapped across
+            # into whatever the memory holds next
+            transitions[-1] = transitions[-1][:3] + (True,)
+            _replay_episode(agent, transitions, observation)
+            transitions = []
+        if done:
+            observation = np.array(env.reset())
+    env.reset()
+
+
+def fit_parallel(agent, env, nb_steps, log_every=1000, checkpoint=None):
+    """Train `agent` on the experience collected by all the games of a
+    SubprocTetrisEnv, actions for all the games are chosen with a single
+    batched forward pass. `checkpoint` is a CheckpointCallback
+    """
+    agent.training = True
+    agent.step = 0
+    episodes = [[] for _ in range(env.nb_envs)]
+    observations = env.reset()
+    next_log = log_every
+    while agent.step < nb_steps:
+        q_values = agent.compute_batch_q_values(observations[:, None])
+        actions = [agent.policy.select_action(q_values=q) for q in q_values]
+        next_observations, rewards, dones, info = env.step(actions)
+        terminal_observations = iter(info.get("terminal_observation", ()))
+        for i, episode in enumerate(episodes):
+            episode.append((observations[i], actions[i], rewards[i], dones[i]))
+            if dones[i]:
+                _replay_episode(agent, episode, next(terminal_observations))
+                episodes[i] = []
+        observations = next_observations
+        if checkpoint is not None:
+            checkpoint.save_due(agent.step)
+        if agent.step >= next_log:
+            next_log += log_every
+            train_metrics.event("progress", step=agent.step, total=nb_steps)
+
+
+def run_actor(address, actor_id, batch_frames=256, max_in_flight=4):
+    """Play episodes with the weights broadcast by the learner at `address`
+    and stream their transitions to it until it stops
+    """
+    np.random.seed(actor_id)
+    env = gym.make("tetris_ai:tetris_gym-v0")
+    env.seed(actor_id)
+    agent, model = get_agent(env)
+    agent.training = True
+    client = ActorClient(address, actor_id, batch_frames, max_in_flight)
+    # the learner sends its weights as soon as the actor connects
+    latest = client.latest_weights(wait=True)
+    observation = np.array(env.reset())
+    while not client.stopped.is_set():
+        if latest is not None:
+            model.set_weights(latest[0])
+        q_values = agent.compute_q_values([observation])
+        action = agent.policy.select_action(q_values=q_values)
+        next_observation, reward, done, _ = env.step(action)
+        client.append(observation, action, reward, done)
+        observation = np.array(next_observation)
+        if done:
+            client.end_episode(observation)
+            observation = np.array(env.reset())
+        latest = client.latest_weights()
+    client.close()
+
+
+def start_local_actors(address, nb_actors, start_method="spawn"):
+    """Actor processes on this machine, to run the learner without others"""
+    context = multiprocessing.get_context(start_method)
+    actors = [
+        context.Process(target=run_actor, args=(address, i), daemon=True)
+        for i in range(nb_actors)
+    ]
+    for actor in actors:
+        actor.start()
+    return actors
+
+
+def fit_distributed(
+    agent, server, nb_steps, weights_every=1000, log_every=1000, checkpoint=None
+):
+    """Train `agent` on the episodes the actors of a LearnerServer stream,
+    they get the new weights every `weights_every` steps
+    """
+    agent.training = True
+    agent.step = 0
+    server.broadcast_weights(agent.model.get_weights(), 0)
+    next_weights = weights_every
+    next_log = log_every
+    while agent.step < nb_steps:
+        received = server.receive(timeout=1.0)
+        if received is None:
+            continue
+        _, episodes = received
+        for transitions, terminal_observation in episodes:
+            _replay_episode(agent, transitions, terminal_observation)
+        if agent.step >= next_weights:
+            next_weights = (agent.step // weights_every + 1) * weights_every
+            server.broadcast_weights(agent.model.get_weights(), int(agent.step))
+        if checkpoint is not None:
+            checkpoint.save_due(agent.step)
+        if agent.step >= next_log:
+            next_log += log_every
+            train_metrics.event("progress", step=agent.step, total=nb_steps)
+            server.report()
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="number of worker processes collecting experience, 0 to train "
+        "on a single env in this process",
+    )
+    parser.add_argument(
+        "--envs", type=int, default=None, help="number of envs, defaults to workers"
+    )
+    parser.add_argument(
+        "--learner",
+        default=None,
+        help="host:port to train on the transitions of actors connecting there",
+    )
+    parser.add_argument(
+        "--local-actors",
+        type=int,
+        default=0,
+        help="number of actor processes started on this machine for the "
+        "learner, on a free local port without --learner",
+    )
+    parser.add_argument(
+        "--actor",
+        default=None,
+        help="host:port of a learner to play for instead of training",
+    )
+    parser.add_argument(
+        "--actor-id", type=int, default=0, help="id and seed of this actor"
+    )
+    parser.add_argument(
+        "--weights-every",
+        type=int,
+        default=1000,
+        help="steps between two broadcasts of the weights to the actors",
+    )
+    parser.add_argument(
+        "--demonstrations",
+        type=int,
+        default=0,
+        help="number of steps played by the heuristic solver to pretrain on",
+    )
+    parser.add_argument(
+        "--replay-dir",
+        default=None,
+        help="keep the replay memory in trajectory files in this directory "
+        "instead of 500 transitions in memory",
+    )
+    parser.add_argument(
+        "--prioritized",
+        type=int,
+        default=0,
+        help="sample the replay memory by priority and keep this many "
+        "transitions in it",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=10000,
+        help="steps between two checkpoints of the weights in nn_weights/",
+    )
+    parser.add_argument(
+        "--keep", type=int, default=3, help="number of checkpoints to keep"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="start from the newest checkpoint and train for the steps left",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=None,
+        help="time the phases of the training and print a summary, given a "
+        "path also write a Chrome trace of every call there. With --workers "
+        "the envs run in the workers and their phases are not timed",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="write the metrics to this .jsonl or .csv file instead of stderr",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=1.0,
+        help="seconds between two writes of the metrics",
+    )
+    args = parser.parse_args()
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+    flusher = MetricsFlusher(metrics, sink_for(args.metrics), args.metrics_interval)
+    flusher.start()
+
+    if args.actor:
+        run_actor(parse_address(args.actor), args.actor_id)
+        flusher.close()
+        raise SystemExit
+
     version = "0009"
     nb_steps = 100000
     env = gym.make("tetris_ai:tetris_gym-v0")
     base_folder = "nn_weights"
-    filename = "dqn_{}_{}.h5f".format(env.spec.id, version)
+    prefix = "dqn_{}_{}".format(env.spec.id, version)
+    filename = prefix + ".h5f"
     complete_path = os.path.abspath(os.path.join(base_folder, filename))
     np.random.seed(123)
     env.seed(123)
-    agent, model = get_agent(env)
+    memory = None
+    if args.replay_dir:
+        memory = TrajectoryMemory(args.replay_dir, env.observation_space.shape)
+    elif args.prioritized:
+        memory = PrioritizedMemory(args.prioritized, env.observation_space.shape)
+    agent, model = get_agent(env, memory)
 
-    if any(path.startswith(filename) for path in os.listdir(base_folder)):
+    start_step = 0
+    latest = latest_checkpoint(base_folder, prefix) if args.resume else None
+    if latest is not None:
+        arrays, meta = latest
+        restore_agent(agent, arrays)
+        start_step = meta["step"]
+        train_metrics.event("resumed", step=start_step)
+    elif any(path.startswith(filename) for path in os.listdir(base_folder)):
         # load existing weights
         agent.load_weights(complete_path)
-
-    agent.fit(
-        env,
-        nb_steps=nb_steps,
-        visualize=False,
-        verbose=0,
-        callbacks=[
-            ResetEnvCallback(env),
-            LogStepCallback(nb_steps),
-            EpisodeRewardsCallback(),
-            ActionRecorderCallback(env),
-        ],
+    checkpoints = CheckpointCallback(
+        agent,
+        CheckpointWriter(base_folder, prefix, args.keep),
+        args.checkpoint_every,
+        start_step,
     )
+    nb_steps -= start_step
+
+    if args.demonstrations:
+        pretrain_on_demonstrations(agent, env, args.demonstrations)
+
+    callbacks = [
+        ResetEnvCallback(env),
+        LogStepCallback(nb_steps),
+        EpisodeRewardsCallback(),
+        ActionRecorderCallback(env),
+        checkpoints,
+    ]
+    if args.profile is not None:
+        profiler.trace = bool(args.profile)
+        profiler.enable()
+        if args.learner or args.local_actors or args.workers:
+            # no agent.fit, and the envs of the workers aren't timed
+            profiler.enable(agent_phases(agent))
+        else:
+            # last, see ProfileCallback
+            callbacks.append(ProfileCallback(profiler, list(callbacks)))
+
+    if args.learner or args.local_actors:
+        server = LearnerServer(
+            env.observation_space.shape,
+            *parse_address(args.learner or "127.0.0.1:0"),
+        )
+        actors = start_local_actors(server.address, args.local_actors)
+        fit_distributed(
+            agent,
+            server,
+            nb_steps,
+            weights_every=args.weights_every,
+            checkpoint=checkpoints,
+        )
+        server.close()
+        for actor in actors:
+            actor.join()
+    elif args.workers:
+        vector_env = SubprocTetrisEnv(args.envs or args.workers, args.workers)
+        vector_env.seed(123)
+        fit_parallel(agent, vector_env, nb_steps, checkpoint=checkpoints)
+        vector_env.close()
+    else:
+        agent.fit(
+            env,
+            nb_steps=nb_steps,
+            visualize=False,
+            verbose=0,
+            callbacks=callbacks,
+        )
+    checkpoints.writer.close()
+    if args.profile is not None:
+        profiler.disable()
+        profiler.report()
+        if args.profile:
+            profiler.write_chrome_trace(args.profile)
+
+    if memory is not None:
+        memory.close()
 
     print(colored("Running Tests", "red"), file=stderr)
     # After training is done, we save the final weights to the same file
@@ -143,3 +840,4 @@ if __name__ == "__main__":
         verbose=0,
         callbacks=[EpisodeRewardsCallback(), ActionRecorderCallback(env)],
     )
+    flusher.close()
@@ -0,0 +1,276 @@
+import glob
+import json
+import os
+import uuid
+import gym
+import numpy as np
+
+# one file per array of a chunk, a frame is a row of each of them
+ARRAYS = {
+    "observations": np.uint8,
+    "actions": np.int16,
+    "rewards": np.float32,
+    "dones": np.uint8,
+}
+# action of the last frame of an episode, the observation it ended on
+FINAL_FRAME = -1
+
+
+def pack_observation(observation):
+    """0/1 observation as a bit per cell, a 20x10 board fits in 25 bytes"""
+    return np.packbits(np.asarray(observation).reshape(-1) != 0).tobytes()
+
+
+def unpack_observations(packed, shape):
+    """(N, bytes) packed observations back to (N,) + `shape` 0/1 arrays"""
+    size = int(np.prod(shape))
+    unpacked = np.unpackbits(packed, axis=1, count=size)
+    return unpacked.reshape((len(packed),) + tuple(shape))
+
+
+def _read_meta(directory):
+    with open(os.path.join(directory, "meta.json")) as meta:
+        return json.load(meta)
+
+
+class TrajectoryWriter(object):
+    """Append episodes to the chunk files of `directory`
+
+    Every frame is an observation, the action taken from it, the reward and
+    whether the episode ended, and every episode ends with a frame holding the
+    last observation. A writer always starts a new chunk and starts another
+    one once a chunk holds `chunk_frames` frames at the end of an episode, so
+    transitions never span two chunks and directories written on different
+    machines can be merged by copying the files.
+    """
+
+    def __init__(self, directory, observation_shape, chunk_frames=1 << 20):
+        self.directory = directory
+        self.observation_shape = tuple(observation_shape)
+        self.frame_bytes = -(-int(np.prod(observation_shape)) // 8)
+        self.chunk_frames = chunk_frames
+        os.makedirs(directory, exist_ok=True)
+        meta = {
+            "observation_shape": list(self.observation_shape),
+            "frame_bytes": self.frame_bytes,
+        }
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            if _read_meta(directory) != meta:
+                raise ValueError(f"{directory} holds trajectories of another shape")
+        else:
+            with open(meta_path, "w") as output:
+                json.dump(meta, output)
+        self.files = None
+        self.chunk_size = 0
+        # bumped on every write, for readers to know when to refresh
+        self.nb_flushes = 0
+        self.in_episode = False
+        self.buffers = {name: [] for name in ARRAYS}
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self.close_files()
+        index = len(glob.glob(os.path.join(self.directory, "*.dones")))
+        name = f"{index:06d}-{uuid.uuid4().hex[:12]}"
+        # path of the chunk files without their extension
+        self.prefix = os.path.join(self.directory, name)
+        self.files = {array: open(f"{self.prefix}.{array}", "ab") for array in ARRAYS}
+        self.chunk_size = 0
+
+    def _append(self, observation, action, reward, done):
+        self.buffers["observations"].append(pack_observation(observation))
+        self.buffers["actions"].append(action)
+        self.buffers["rewards"].append(reward)
+        self.buffers["dones"].append(done)
+        self.chunk_size += 1
+
+    def append(self, observation, action, reward, done):
+        """The step taking `action` from `observation`"""
+        self._append(observation, action, reward, done)
+        self.in_episode = True
+
+    def end_episode(self, observation):
+        """The observation the episode ended on"""
+        self._append(observation, FINAL_FRAME, 0.0, False)
+        self.in_episode = False
+        self.flush()
+        if self.chunk_size >= self.chunk_frames:
+            self._new_chunk()
+
+    @property
+    def pending(self):
+        return len(self.buffers["actions"])
+
+    def flush(self):
+        if not self.pending:
+            return
+        # in the order of ARRAYS so readers never see the dones of a frame
+        # before the rest of it
+        for array, dtype in ARRAYS.items():
+            buffer = self.buffers[array]
+            if array == "observations":
+                data = b"".join(buffer)
+            else:
+                data = np.array(buffer, dtype=dtype).tobytes()
+            self.files[array].write(data)
+            self.files[array].flush()
+            buffer.clear()
+        self.nb_flushes += 1
+
+    def close_files(self):
+        if self.files is None:
+            return
+        self.flush()
+        for output in self.files.values():
+            output.close()
+        self.files = None
+
+    def close(self):
+        self.close_files()
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """Write every step of the wrapped env to a TrajectoryWriter"""
+
+    def __init__(self, env, directory, **writer_kwargs):
+        super().__init__(env)
+        self.writer = TrajectoryWriter(
+            directory, env.observation_space.shape, **writer_kwargs
+        )
+        self.observation = None
+
+    def reset(self, **kwargs):
+        if self.writer.in_episode:
+            # cut short, its last observation is where it stopped
+            self.writer.end_episode(self.observation)
+        observation = self.env.reset(**kwargs)
+        # the env reuses its observation array
+        self.observation = np.array(observation)
+        return observation
+
+    def step(self, action):
+        observation, reward, done, info = self.env.step(action)
+        self.writer.append(self.observation, action, reward, done)
+        if done:
+            self.writer.end_episode(observation)
+        self.observation = np.array(observation)
+        return observation, reward, done, info
+
+    def close(self):
+        self.writer.close()
+        return super().close()
+
+
+class _Chunk(object):
+    """Memory maps of the frames of a chunk written so far"""
+
+    def __init__(self, prefix, frame_bytes):
+        self.prefix = prefix
+        self.size = _chunk_size(prefix)
+        for array, dtype in ARRAYS.items():
+            shape = (
+                (self.size, frame_bytes) if array == "observations" else (self.size,)
+            )
+            mapped = np.memmap(f"{prefix}.{array}", dtype=dtype, mode="r", shape=shape)
+            setattr(self, array, mapped)
+
+
+def _chunk_size(prefix):
+    # the dones are written last, a frame is complete once they are
+    return os.path.getsize(f"{prefix}.dones") // np.dtype(ARRAYS["dones"]).itemsize
+
+
+class TrajectoryDataset(object):
+    """Sample transitions of a trajectory directory through memory maps, only
+    the sampled frames are read from the disk
+    """
+
+    def __init__(self, directory, seed=None):
+        self.directory = directory
+        meta = _read_meta(directory)
+        self.observation_shape = tuple(meta["observation_shape"])
+        self.frame_bytes = meta["frame_bytes"]
+        self.rng = np.random.default_rng(seed)
+        self.chunks = []
+        self.refresh()
+
+    def refresh(self, rescan=True):
+        """Map the frames written since the last call, without `rescan` only
+        the last chunk is looked at: the one a writer appends to
+        """
+        if rescan or not self.chunks:
+            chunks = {chunk.prefix: chunk for chunk in self.chunks}
+            self.chunks = []
+            for path in sorted(glob.glob(os.path.join(self.directory, "*.dones"))):
+                prefix = path[: -len(".dones")]
+                chunk = chunks.get(prefix)
+                if chunk is None or chunk.size != _chunk_size(prefix):
+                    if _chunk_size(prefix) == 0:
+                        continue
+                    chunk = _Chunk(prefix, self.frame_bytes)
+                self.chunks.append(chunk)
+        else:
+            last = self.chunks[-1]
+            if last.size == _chunk_size(last.prefix):
+                return
+            self.chunks[-1] = _Chunk(last.prefix, self.frame_bytes)
+        # the last frame of a chunk has nothing after it
+        self.transitions = np.array(
+            [max(c.size - 1, 0) for c in self.chunks], dtype=np.intp
+        )
+        self.offsets = np.cumsum(self.transitions)
+
+    @property
+    def nb_frames(self):
+        return sum(chunk.size for chunk in self.chunks)
+
+    def __len__(self):
+        return int(self.offsets[-1]) if len(self.offsets) else 0
+
+    def _sample_frames(self, batch_size):
+        chunk_ids = np.empty(batch_size, dtype=np.intp)
+        frames = np.empty(batch_size, dtype=np.intp)
+        todo = np.arange(batch_size)
+        while len(todo):
+            drawn = self.rng.integers(0, len(self), len(todo))
+            chunk_ids[todo] = np.searchsorted(self.offsets, drawn, side="right")
+            starts = self.offsets[chunk_ids[todo]] - self.transitions[chunk_ids[todo]]
+            frames[todo] = drawn - starts
+            # the last frames of the episodes don't start a transition
+            final = np.zeros(len(todo), dtype=bool)
+            drawn_chunks = chunk_ids[todo]
+            for c in np.unique(drawn_chunks):
+                rows = np.flatnonzero(drawn_chunks == c)
+                final[rows] = self.chunks[c].actions[frames[todo[rows]]] == FINAL_FRAME
+            todo = todo[final]
+        return chunk_ids, frames
+
+    def sample(self, batch_size):
+        """observations, actions, rewards, next observations and dones of
+        `batch_size` transitions drawn uniformly
+        """
+        if not len(self):
+            raise ValueError(f"no transitions in {self.directory}")
+        chunk_ids, frames = self._sample_frames(batch_size)
+        packed = np.empty((batch_size, self.frame_bytes), dtype=np.uint8)
+        next_packed = np.empty_like(packed)
+        actions = np.empty(batch_size, dtype=ARRAYS["actions"])
+        rewards = np.empty(batch_size, dtype=ARRAYS["rewards"])
+        dones = np.empty(batch_size, dtype=bool)
+        for c in np.unique(chunk_ids):
+            chunk = self.chunks[c]
+            rows = np.flatnonzero(chunk_ids == c)
+            indices = frames[rows]
+            packed[rows] = chunk.observations[indices]
+            next_packed[rows] = chunk.observations[indices + 1]
+            actions[rows] = chunk.actions[indices]
+            rewards[rows] = chunk.rewards[indices]
+            dones[rows] = chunk.dones[indices] != 0
+        return (
+            unpack_observations(packed, self.observation_shape),
+            actions,
+            rewards,
+            unpack_observations(next_packed, self.observation_shape),
+            dones,
+        )